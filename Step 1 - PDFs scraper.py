@@ -1,18 +1,28 @@
-import os
 import yaml
-import requests
 from pathlib import Path
 from datetime import datetime
-import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from logger import ScraperLogger
+from http_pool import HostSessionPool
+from search_providers import create_search_provider
+from crawl_state import CrawlFrontier, ContentStore, DOWNLOADED
+from retry_policy import RetryPolicy, RetryLater, RetryScheduler, CircuitBreaker
+from link_filter import LinkFilter
+
+PDF_MAGIC = b'%PDF'
+HEAD_UNSUPPORTED_STATUSES = (403, 405, 501)
+UNINFORMATIVE_CONTENT_TYPES = ('', 'application/octet-stream', 'binary/octet-stream')
+
+
+class DownloadRejected(Exception):
+    """Raised while streaming a download that turns out not to be an acceptable PDF."""
+
 
 class PDFScraper:
-    def __init__(self, config_path="agent_config.yaml"):
+    def __init__(self, config_path="agent_config.yaml", search_provider=None):
         with open(config_path, 'r') as file:
             self.config = yaml.safe_load(file)
         
@@ -22,100 +32,330 @@ class PDFScraper:
             "queries_processed": 0,
             "pdfs_found": 0,
             "pdfs_downloaded": 0,
+            "pdfs_unchanged": 0,
+            "pdfs_duplicate": 0,
+            "queries_resumed": 0,
+            "links_filtered": 0,
+            "urls_skipped_quota": 0,
             "errors_encountered": 0
         }
+        self._stats_lock = threading.Lock()
+
+        download_settings = self.config['download_settings']
+        self.max_workers = max(1, int(download_settings.get('max_workers', 1)))
+        self.max_file_bytes = int(download_settings['max_file_size_mb'] * 1024 * 1024)
+        self.chunk_size = int(download_settings.get('chunk_size_kb', 64) * 1024)
+        self.validate_with_head = download_settings.get('validate_with_head', True)
+        self.max_files_per_query = download_settings.get('max_files_per_query')
+        self._query_quota = {}
+        self._quota_lock = threading.Lock()
+
+        link_filters = self.config.get('link_filters', {})
+        self.link_filter = LinkFilter(
+            allowed_domains=link_filters.get('allowed_domains'),
+            blocked_domains=link_filters.get('blocked_domains'),
+            require_pdf_extension=link_filters.get('require_pdf_extension', True),
+        )
+        self.http = HostSessionPool(download_settings.get('max_connections_per_host', 2))
+
+        self.retry_policy = RetryPolicy(
+            max_attempts=download_settings.get('retry_attempts', 3),
+            base_delay=download_settings.get('retry_base_delay', 2),
+            max_delay=download_settings.get('retry_max_delay', 60),
+        )
+        self.breaker = CircuitBreaker(
+            threshold=download_settings.get('circuit_breaker_threshold', 5),
+            cooldown=download_settings.get('circuit_breaker_cooldown', 300),
+        )
+
+        crawl_state = self.config.get('crawl_state', {})
+        self.frontier = CrawlFrontier(crawl_state.get('path', 'downloads/crawl_state.db'))
+        self.search_refresh_hours = crawl_state.get('search_refresh_hours', 24)
+        self.store = ContentStore(download_settings['base_path'], self.frontier)
+
+        self.search_provider = search_provider or create_search_provider(self.config)
 
     def setup_directories(self):
         base_path = Path(self.config['download_settings']['base_path'])
         for category in self.config['download_settings']['categories']:
             (base_path / category).mkdir(parents=True, exist_ok=True)
 
+    def increment_stat(self, key, amount=1):
+        """Update a counter in self.stats; safe to call from worker threads"""
+        with self._stats_lock:
+            self.stats[key] += amount
+
     def search_pdfs(self, query):
         self.logger.log_search_query(query)
-        urls = []
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')  # Run in headless mode
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        search_url = f"https://www.google.com/search?q={query.replace(' ', '+')}+filetype:pdf"
-        driver.get(search_url)
+        return self.search_provider.search(query)
+
+    def retry_or_fail(self, url, attempt, error, delay=None):
+        """Defer the URL to the retry queue, or mark it failed once its attempts are used up"""
+        if attempt + 1 < self.retry_policy.max_attempts:
+            raise RetryLater(error, delay)
+        self.frontier.mark_failed(url, error)
+        return False
+
+    def validate_pdf(self, url, attempt=0):
+        host = self.http.host_of(url)
+        if not self.breaker.allow(host):
+            return self.retry_or_fail(url, attempt, f"Circuit open for {host}", self.breaker.retry_after(host))
+        try:
+            with self.http.acquire(url) as session:
+                response = session.head(url, allow_redirects=True, timeout=10)
+        except Exception as e:
+            self.logger.log_error("Validation Error", str(e), {"url": url, "attempt": attempt + 1})
+            self.increment_stat("errors_encountered")
+            self.breaker.record_failure(host)
+            return self.retry_or_fail(url, attempt, e)
         
-        # Extract PDF links
-        links = driver.find_elements(By.TAG_NAME, 'a')
-        for link in links:
-            href = link.get_attribute('href')
-            if href and "pdf" in href:
-                urls.append(href)
-                self.stats["pdfs_found"] += 1
+        if response.status_code == 429 or response.status_code >= 500:
+            self.breaker.record_failure(host)
+            retry_after = response.headers.get('retry-after', '')
+            return self.retry_or_fail(url, attempt, f"HTTP {response.status_code}",
+                                      float(retry_after) if retry_after.isdigit() else None)
+        self.breaker.record_success(host)
         
-        driver.quit()  # Close the browser
-        return urls
-
-    def validate_pdf(self, url):
-        retries = 3
-        for attempt in range(retries):
-            try:
-                response = requests.head(url, allow_redirects=True, timeout=10)
-                if response.status_code == 200 and 'application/pdf' in response.headers.get('content-type', ''):
-                    file_size = int(response.headers.get('content-length', 0)) / (1024 * 1024)  # Convert to MB
-                    is_valid = file_size <= self.config['download_settings']['max_file_size_mb']
-                    self.logger.log_validation_result(url, is_valid, 
-                        None if is_valid else f"File size ({file_size}MB) exceeds limit")
-                    return is_valid
-                break  # Exit loop if successful
-            except Exception as e:
-                self.logger.log_error("Validation Error", str(e), {"url": url})
-                self.stats["errors_encountered"] += 1
-                if attempt < retries - 1:
-                    time.sleep(10)  # Wait before retrying
-                else:
-                    return False
+        content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+        if (response.status_code in HEAD_UNSUPPORTED_STATUSES
+                or (response.status_code == 200 and content_type in UNINFORMATIVE_CONTENT_TYPES)):
+            # The HEAD can't tell us anything; download_pdf sniffs the magic bytes and enforces the size
+            self.logger.log_validation_result(url, True)
+            self.frontier.mark_validated(url)
+            return True
+        
+        if response.status_code == 200 and content_type == 'application/pdf':
+            content_length = int(response.headers.get('content-length', 0))
+            file_size = content_length / (1024 * 1024)  # Convert to MB
+            is_valid = file_size <= self.config['download_settings']['max_file_size_mb']
+            reason = None if is_valid else f"File size ({file_size}MB) exceeds limit"
+            self.logger.log_validation_result(url, is_valid, reason)
+            if is_valid:
+                self.frontier.mark_validated(
+                    url,
+                    size=content_length or None,
+                    etag=response.headers.get('etag'),
+                    last_modified=response.headers.get('last-modified'),
+                )
+            else:
+                self.frontier.mark_failed(url, reason)
+            return is_valid
+        self.frontier.mark_failed(
+            url, f"Not a PDF (status {response.status_code}, "
+                 f"content-type {response.headers.get('content-type', '')!r})")
         return False
 
-    def download_pdf(self, url, category):
+    def download_pdf(self, url, category, previous=None):
         self.logger.log_download_attempt(url, category)
+        headers = {}
+        if previous:
+            # Conditional GET against the copy we already have
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
         try:
-            response = requests.get(url, stream=True)
-            if response.status_code == 200:
-                filename = url.split('/')[-1]
-                if not filename.lower().endswith('.pdf'):
-                    filename += '.pdf'
-                
-                save_path = Path(self.config['download_settings']['base_path']) / category / filename
-                
-                with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                self.logger.log_download_success(url, str(save_path))
-                self.stats["pdfs_downloaded"] += 1
-                return True
+            with self.http.acquire(url) as session:
+                # Closing the streamed response returns its pooled connection, whatever the status
+                with session.get(url, stream=True, timeout=30, headers=headers) as response:
+                    self.breaker.record_success(self.http.host_of(url))
+                    if response.status_code == 304 and previous:
+                        self.logger.log_download_skipped(url, "not modified since last crawl")
+                        self.increment_stat("pdfs_unchanged")
+                        return True
+                    if response.status_code == 200:
+                        filename = url.split('/')[-1]
+                        if not filename.lower().endswith('.pdf'):
+                            filename += '.pdf'
+                    
+                        # Hash while streaming into a temp file, then keep one copy per digest
+                        temp_path = self.store.temp_path()
+                        digest = hashlib.sha256()
+                        try:
+                            size = self.stream_to_file(response, temp_path, digest)
+                        except Exception:
+                            temp_path.unlink(missing_ok=True)
+                            raise
+                    
+                        save_path, is_new = self.store.commit(
+                            temp_path, digest.hexdigest(), size, category, filename)
+                        self.frontier.mark_downloaded(
+                            url, save_path, size, digest.hexdigest(),
+                            etag=response.headers.get('etag'),
+                            last_modified=response.headers.get('last-modified'),
+                        )
+                        if is_new:
+                            self.logger.log_download_success(url, str(save_path))
+                            self.increment_stat("pdfs_downloaded")
+                        else:
+                            self.logger.log_download_skipped(url, f"duplicate of {save_path}")
+                            self.increment_stat("pdfs_duplicate")
+                        return True
+                    self.frontier.mark_failed(url, f"HTTP {response.status_code}")
+        except DownloadRejected as e:
+            self.logger.log_validation_result(url, False, str(e))
+            self.frontier.mark_failed(url, e)
         except Exception as e:
             self.logger.log_download_error(url, e)
-            self.stats["errors_encountered"] += 1
+            self.breaker.record_failure(self.http.host_of(url))
+            self.frontier.mark_failed(url, e)
+            self.increment_stat("errors_encountered")
         return False
 
+    def stream_to_file(self, response, path, digest):
+        """
+        Stream a GET response to disk, enforcing max_file_size_mb and the %PDF magic bytes.
+
+        Raises DownloadRejected as soon as either check fails; the caller removes the partial file.
+        """
+        declared_size = response.headers.get('content-length', '')
+        if declared_size.isdigit() and int(declared_size) > self.max_file_bytes:
+            response.close()
+            raise DownloadRejected(f"File size ({int(declared_size) / (1024 * 1024):.1f}MB) exceeds limit")
+        
+        size = 0
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if not chunk:
+                    continue
+                if size == 0 and PDF_MAGIC not in chunk[:1024]:
+                    response.close()
+                    raise DownloadRejected("Missing %PDF header")
+                size += len(chunk)
+                if size > self.max_file_bytes:
+                    response.close()
+                    raise DownloadRejected(f"File exceeds {self.max_file_bytes / (1024 * 1024):.0f}MB while streaming")
+                f.write(chunk)
+                digest.update(chunk)
+        if size == 0:
+            raise DownloadRejected("Empty response body")
+        return size
+
+    def get_category(self, query):
+        return next(
+            (cat for cat in self.config['download_settings']['categories'] 
+             if cat in query.lower()),
+            'research'  # default category
+        )
+
+    def find_urls(self, query):
+        """Return the URLs for a query, reusing a recent search from the crawl state"""
+        if self.frontier.query_is_fresh(query, self.search_refresh_hours):
+            self.increment_stat("queries_resumed")
+            return self.link_filter.filter(self.frontier.urls_for_query(query))[0]
+        links = self.search_pdfs(query)
+        urls, rejected = self.link_filter.filter(links)
+        for url, reason in rejected:
+            self.logger.log_validation_result(url, False, f"Filtered before fetch: {reason}")
+        self.increment_stat("links_filtered", len(rejected))
+        self.increment_stat("pdfs_found", len(urls))
+        self.frontier.record_search(query, self.get_category(query), urls)
+        return urls
+
+    def claim_quota(self, query):
+        """
+        Reserve one of the query's max_files_per_query download slots.
+
+        Returns True when claimed, False once the quota has been met, and None
+        while the remaining slots are all held by downloads still in flight.
+        """
+        if not self.max_files_per_query:
+            return True
+        with self._quota_lock:
+            done, in_flight = self._query_quota.get(query, (0, 0))
+            if done >= self.max_files_per_query:
+                return False
+            if done + in_flight >= self.max_files_per_query:
+                return None
+            self._query_quota[query] = (done, in_flight + 1)
+            return True
+
+    def release_quota(self, query, success):
+        if not self.max_files_per_query:
+            return
+        with self._quota_lock:
+            done, in_flight = self._query_quota[query]
+            self._query_quota[query] = (done + int(bool(success)), in_flight - 1)
+
+    def process_url(self, url, query, category, attempt=0):
+        """Validate and download a single URL; runs on a worker thread"""
+        claimed = self.claim_quota(query)
+        if claimed is None:
+            # Wait for in-flight downloads of this query before deciding whether it still needs this URL
+            raise RetryLater("quota slots in flight", delay=1, consume_attempt=False)
+        if not claimed:
+            self.logger.log_download_skipped(url, f"max_files_per_query reached for {query!r}")
+            self.increment_stat("urls_skipped_quota")
+            return False
+        
+        success = False
+        try:
+            record = self.frontier.get(url)
+            if (record and record['status'] == DOWNLOADED
+                    and record['path'] and Path(record['path']).exists()):
+                # Already on disk: skip the HEAD and only refetch if the server copy changed
+                success = self.download_pdf(url, category, previous=record)
+            elif not self.validate_with_head or self.validate_pdf(url, attempt):
+                success = self.download_pdf(url, category)
+            return success
+        finally:
+            self.release_quota(query, success)
+
+    def log_worker_error(self, error):
+        self.logger.log_error("Worker Error", str(error))
+        self.increment_stat("errors_encountered")
+
     def run(self):
         start_time = datetime.now()
+        download_settings = self.config['download_settings']
         
         try:
-            for query in tqdm(self.config['search_queries'], desc="Processing queries"):
-                self.stats["queries_processed"] += 1
-                urls = self.search_pdfs(query)
+            # Queries are searched by the search provider, while the URLs found so far
+            # are validated and downloaded concurrently by the download workers.
+            self.search_provider.start()
+            url_progress = tqdm(total=0, desc="Processing URLs", leave=False)
+            with ThreadPoolExecutor(max_workers=self.search_provider.concurrency) as search_executor, \
+                    ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                scheduler = RetryScheduler(
+                    executor,
+                    self.retry_policy,
+                    on_done=lambda _: url_progress.update(1),
+                    on_error=self.log_worker_error,
+                )
+                searches = {
+                    search_executor.submit(self.find_urls, query): query
+                    for query in self.config['search_queries']
+                }
+                for search in tqdm(as_completed(searches), total=len(searches), desc="Processing queries"):
+                    query = searches[search]
+                    self.increment_stat("queries_processed")
+                    try:
+                        urls = search.result()
+                    except Exception as e:
+                        self.logger.log_error("Search Error", str(e), {"query": query})
+                        self.increment_stat("errors_encountered")
+                        continue
+                    category = self.get_category(query)
+                    url_progress.total += len(urls)
+                    url_progress.refresh()
+                    for url in urls:
+                        scheduler.submit(self.process_url, url, query, category)
                 
-                for url in tqdm(urls, desc="Processing URLs", leave=False):
-                    if self.validate_pdf(url):
-                        category = next(
-                            (cat for cat in self.config['download_settings']['categories'] 
-                             if cat in query.lower()),
-                            'research'  # default category
-                        )
-                        self.download_pdf(url, category)
+                # Wait for every URL, including the ones parked for a retry
+                scheduler.join()
+            url_progress.close()
         
         finally:
+            self.search_provider.close()
+            self.http.close()
             # Log final statistics
             self.stats["duration"] = str(datetime.now() - start_time)
+            self.stats["url_states"] = self.frontier.status_counts()
+            self.stats["open_circuits"] = self.breaker.open_hosts()
+            self.frontier.export_manifest(Path(download_settings['base_path']) / "manifest.json")
+            self.frontier.close()
             self.logger.log_stats(self.stats)
+            self.logger.close()
 
 if __name__ == "__main__":
     scraper = PDFScraper()
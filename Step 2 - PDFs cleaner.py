@@ -3,12 +3,19 @@ from pathlib import Path
 import PyPDF2
 import re
 import unicodedata
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterator
 import json
+import gzip
 from tqdm.notebook import tqdm
 import logging
 from dataclasses import dataclass
 from datetime import datetime
+import argparse
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pdf_extractors import (EXTRACTOR_CHOICES, ExtractedDocument, PDFExtractor,
+                            get_extractor, open_document)
 
 # Set up logging
 logging.basicConfig(
@@ -17,7 +24,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger('pdf_cleaner')
 
-@dataclass
+# Bump whenever a change to the cleaning logic should re-clean every PDF
+CLEANER_VERSION = "1"
+MANIFEST_NAME = "manifest.json"
+OUTPUT_FORMATS = ("jsonl", "jsonl.gz", "json")
+DEFAULT_OUTPUT_FORMAT = "jsonl"
+# Text-extraction backend, see pdf_extractors.py ("auto" = fastest installed)
+DEFAULT_EXTRACTOR = "auto"
+
+@dataclass(slots=True)
 class Paragraph:
     """Represents a cleaned paragraph from a PDF."""
     text: str
@@ -58,44 +73,76 @@ class PDFDocument:
         }
         
         
+# Dash and hyphen variants folded to '-' by normalize_text
+DASHES = '‐‑‒–—―'
+
+# Precompiled patterns for the per-paragraph cleaning and validation below
+PARAGRAPH_BREAK_RE = re.compile(r'\n\s*\n')
+WHITESPACE_RE = re.compile(r'\s+')
+STANDALONE_NUMBER_RE = re.compile(r'^\d+$')
+DATE_RE = re.compile(r'^\d{1,2}/\d{1,2}/\d{2,4}$')
+PAGE_MARKER_RE = re.compile(r'^\s*\[?Page \d+\]?\s*$')
+DASHED_PAGE_NUMBER_RE = re.compile(r'^\s*-\d+-\s*$')
+DECORATIVE_LINE_RE = re.compile(r'^\s*[-_=]{3,}\s*$')
+PAGE_LABEL_RE = re.compile(r'^\s*[Pp]age \d+\s*$')
+
+
+class _NormalizationTable(dict):
+    """
+    str.translate table that, in one pass, drops non-printable characters, folds
+    dashes to '-' and turns newlines/tabs into spaces. Entries are computed on
+    first sight of a code point and cached.
+    """
+    
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        if char in '\n\t':
+            value = ' '
+        elif char in DASHES:
+            value = '-'
+        elif not char.isprintable():
+            value = None
+        else:
+            value = codepoint
+        self[codepoint] = value
+        return value
+
+
+_NORMALIZATION_TABLE = _NormalizationTable()
+
+
 def normalize_text(text: str) -> str:
     """
     Normalize text by handling unicode characters and removing unwanted elements.
     """
-    # Normalize unicode characters
-    text = unicodedata.normalize('NFKD', text)
-    
-    # Remove non-printable characters except newlines and tabs
-    text = ''.join(char for char in text if char.isprintable() or char in '\n\t')
-    
-    # Replace various types of dashes and hyphens with standard hyphen
-    text = re.sub(r'[‐‑‒–—―]', '-', text)
+    # Normalize unicode characters (ASCII is already in NFKD form)
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
     
-    # Replace multiple spaces with single space
-    text = re.sub(r'\s+', ' ', text)
+    # Remove non-printable characters (null bytes included), fold dashes and
+    # turn newlines/tabs into spaces in a single translate pass
+    text = text.translate(_NORMALIZATION_TABLE)
     
-    # Remove null bytes
-    text = text.replace('\x00', '')
-    
-    return text.strip()
+    # Only plain spaces are left: collapse runs of them and trim the ends
+    return ' '.join(text.split())
 
 def clean_paragraph(text: str) -> str:
     """
     Clean a paragraph of text by removing common PDF artifacts and formatting issues.
     """
     # Remove header/footer patterns (e.g., page numbers, dates)
-    text = re.sub(r'^\d+$', '', text)  # Standalone numbers (likely page numbers)
-    text = re.sub(r'^\d{1,2}/\d{1,2}/\d{2,4}$', '', text)  # Dates
+    text = STANDALONE_NUMBER_RE.sub('', text)  # Standalone numbers (likely page numbers)
+    text = DATE_RE.sub('', text)  # Dates
     
     # Remove common PDF artifacts
-    text = re.sub(r'^\s*\[?Page \d+\]?\s*$', '', text)  # Page markers
-    text = re.sub(r'^\s*-\d+-\s*$', '', text)  # Page numbers with dashes
+    text = PAGE_MARKER_RE.sub('', text)  # Page markers
+    text = DASHED_PAGE_NUMBER_RE.sub('', text)  # Page numbers with dashes
     
     # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = WHITESPACE_RE.sub(' ', text)
     
     # Remove lines that are just decorative (e.g., "----", "____")
-    text = re.sub(r'^\s*[-_=]{3,}\s*$', '', text)
+    text = DECORATIVE_LINE_RE.sub('', text)
     
     return text.strip()
 
@@ -103,24 +150,28 @@ def is_valid_paragraph(text: str, min_words: int = 5, max_words: int = 1000) ->
     """
     Check if a paragraph is valid based on various criteria.
     """
-    # Skip if empty after cleaning
-    if not text.strip():
-        return False
-    
-    # Count words
+    return paragraph_word_count(text, min_words, max_words) is not None
+
+def paragraph_word_count(text: str, min_words: int = 5, max_words: int = 1000) -> Optional[int]:
+    """
+    Return the word count of a valid paragraph, or None if it is not valid.
+
+    Same checks as is_valid_paragraph, splitting the text only once.
+    """
+    # Count words (an empty paragraph has none)
     word_count = len(text.split())
-    if word_count < min_words or word_count > max_words:
-        return False
+    if word_count < min_words or word_count > max_words or word_count == 0:
+        return None
     
     # Skip if it's likely a header/footer
-    if re.match(r'^\d+$', text):  # Just numbers
-        return False
-    if re.match(r'^\d{1,2}/\d{1,2}/\d{2,4}$', text):  # Just a date
-        return False
-    if re.match(r'^\s*[Pp]age \d+\s*$', text):  # Just "Page X"
-        return False
+    if STANDALONE_NUMBER_RE.match(text):  # Just numbers
+        return None
+    if DATE_RE.match(text):  # Just a date
+        return None
+    if PAGE_LABEL_RE.match(text):  # Just "Page X"
+        return None
     
-    return True
+    return word_count
 
 
 def extract_pdf_metadata(reader: PyPDF2.PdfReader) -> Dict:
@@ -148,7 +199,7 @@ def extract_paragraphs_from_page(
     Extract valid paragraphs from a page of text.
     """
     # Split text into potential paragraphs
-    raw_paragraphs = [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+    raw_paragraphs = [p.strip() for p in PARAGRAPH_BREAK_RE.split(text) if p.strip()]
     
     paragraphs = []
     for pos, raw_text in enumerate(raw_paragraphs):
@@ -156,11 +207,11 @@ def extract_paragraphs_from_page(
         cleaned_text = clean_paragraph(normalize_text(raw_text))
         
         # Skip if not valid
-        if not is_valid_paragraph(cleaned_text, min_words=min_words):
+        word_count = paragraph_word_count(cleaned_text, min_words=min_words)
+        if word_count is None:
             continue
         
         # Create paragraph object
-        word_count = len(cleaned_text.split())
         paragraph = Paragraph(
             text=cleaned_text,
             page_number=page_number,
@@ -173,37 +224,59 @@ def extract_paragraphs_from_page(
     
     return paragraphs
 
-def process_pdf(pdf_path: Path) -> Optional[PDFDocument]:
+def iter_paragraphs(
+    document: ExtractedDocument,
+    pdf_path: Path,
+    start_page: int = 0,
+    end_page: Optional[int] = None
+) -> Iterator[Paragraph]:
+    """
+    Lazily yield clean paragraphs from pages [start_page, end_page) of an open PDF,
+    one page at a time.
+    """
+    for page_num, text, error in document.page_texts(start_page, end_page):
+        try:
+            if error:
+                raise error
+            if not text:
+                continue
+            
+            paragraphs = extract_paragraphs_from_page(
+                text,
+                page_number=page_num + 1,
+                source_file=str(pdf_path)
+            )
+            
+        except Exception as e:
+            logger.warning(f"Error processing page {page_num + 1} in {pdf_path}: {e}")
+            continue
+        
+        yield from paragraphs
+
+def extract_page_range(
+    document: ExtractedDocument,
+    pdf_path: Path,
+    start_page: int = 0,
+    end_page: Optional[int] = None
+) -> List[Paragraph]:
+    """
+    Extract clean paragraphs from pages [start_page, end_page) of an open PDF.
+    """
+    return list(iter_paragraphs(document, pdf_path, start_page, end_page))
+
+def process_pdf(pdf_path: Path, extractor: Optional[PDFExtractor] = None) -> Optional[PDFDocument]:
     """
     Process a PDF file and extract clean paragraphs.
     """
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            
+        with open_document(pdf_path, extractor or get_extractor(DEFAULT_EXTRACTOR)) as source:
             # Extract metadata
-            metadata = extract_pdf_metadata(reader)
+            metadata = source.metadata()
             
-            all_paragraphs = []
-            total_pages = len(reader.pages)
+            total_pages = source.page_count
             
             # Process each page
-            for page_num, page in enumerate(reader.pages):
-                try:
-                    text = page.extract_text()
-                    if not text:
-                        continue
-                    
-                    paragraphs = extract_paragraphs_from_page(
-                        text,
-                        page_number=page_num + 1,
-                        source_file=str(pdf_path)
-                    )
-                    all_paragraphs.extend(paragraphs)
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing page {page_num + 1} in {pdf_path}: {e}")
-                    continue
+            all_paragraphs = extract_page_range(source, pdf_path)
             
             # Create document object
             document = PDFDocument(
@@ -220,64 +293,614 @@ def process_pdf(pdf_path: Path) -> Optional[PDFDocument]:
     except Exception as e:
         logger.error(f"Failed to process PDF {pdf_path}: {e}")
         return None
+
+
+def clean_pdf_to_writer(
+    pdf_path: Path,
+    output_dir: Path,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    max_pages_per_shard: Optional[int] = None,
+    max_shard_mb: Optional[float] = None,
+    extractor: Optional[PDFExtractor] = None
+) -> Optional["DocumentWriter"]:
+    """
+    Clean a PDF page by page straight into a DocumentWriter, so at most one page
+    (plus one shard for the json format) of paragraphs is held in memory.
+
+    Returns the writer (not yet closed), or None if the PDF could not be read.
+    """
+    writer = None
+    try:
+        with open_document(pdf_path, extractor or get_extractor(DEFAULT_EXTRACTOR)) as source:
+            writer = DocumentWriter(
+                pdf_path,
+                output_dir,
+                output_format,
+                total_pages=source.page_count,
+                metadata=source.metadata(),
+                max_pages_per_shard=max_pages_per_shard,
+                max_shard_mb=max_shard_mb,
+                extractor_name=source.extractor_name
+            )
+            for paragraph in iter_paragraphs(source, pdf_path):
+                writer.write(paragraph)
+            return writer
+            
+    except Exception as e:
+        logger.error(f"Failed to process PDF {pdf_path}: {e}")
+        if writer is not None:
+            writer.abort()
+        return None
+
+
+def process_pdf_task(pdf_path: Path, start_page: int, end_page: int,
+                     extractor_name: str = DEFAULT_EXTRACTOR) -> Dict:
+    """
+    Worker entry point: extract one page range and return it serialized.
+
+    The result is a partial PDFDocument dict; metadata is only read for the
+    first range. Errors are returned rather than raised so the parent can log them.
+    """
+    try:
+        with open_document(pdf_path, get_extractor(extractor_name)) as source:
+            paragraphs = extract_page_range(source, pdf_path, start_page, end_page)
+            return {
+                'paragraphs': [p.to_dict() for p in paragraphs],
+                'total_pages': source.page_count,
+                'metadata': source.metadata() if start_page == 0 else {},
+                'extractor': source.extractor_name,
+                'error': None
+            }
+    except Exception as e:
+        return {'paragraphs': [], 'total_pages': 0, 'metadata': {}, 'extractor': None, 'error': str(e)}
+
+
+def follow_up_tasks(
+    task: Tuple[Path, int, int, str],
+    result: Dict,
+    pages_per_task: int
+) -> List[Tuple[Path, int, int, str]]:
+    """
+    The page-range tasks for the rest of a PDF, once its first range has been
+    extracted and so its page count is known.
+    """
+    pdf_path, start_page, _, extractor_name = task
+    if start_page != 0 or result['error']:
+        return []
+    total_pages = result['total_pages']
+    return [(pdf_path, start, min(start + pages_per_task, total_pages), extractor_name)
+            for start in range(pages_per_task, total_pages, pages_per_task)]
+
+
+def run_tasks_in_pool(
+    pdf_files: List[Path],
+    pages_per_task: int,
+    workers: int,
+    extractor_name: str = DEFAULT_EXTRACTOR
+) -> Iterator[Tuple[Tuple[Path, int, int, str], Dict]]:
+    """
+    Clean PDFs on a process pool in (path, start_page, end_page, extractor_name)
+    page-range tasks of at most pages_per_task pages, yielding (task, result) as
+    they finish.
+
+    Each PDF starts with a task for its first range, which also counts its pages;
+    the other ranges are queued once it returns, so this process never opens a PDF.
+
+    If a worker dies (e.g. a PDF crashes the parser natively), the pool is broken for
+    every task still queued. Those tasks are then re-run one per fresh single-worker
+    pool, so only the PDF that actually crashes is lost.
+    """
+    crashed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_pdf_task, pdf_path, 0, pages_per_task, extractor_name):
+                   (pdf_path, 0, pages_per_task, extractor_name) for pdf_path in pdf_files}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = futures.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    crashed.append(task)
+                    continue
+                for follow_up in follow_up_tasks(task, result, pages_per_task):
+                    try:
+                        futures[executor.submit(process_pdf_task, *follow_up)] = follow_up
+                    except BrokenProcessPool:
+                        crashed.append(follow_up)
+                yield task, result
     
-    
-def save_document(doc: PDFDocument, output_dir: Path) -> None:
-    """Save processed document to JSON file."""
+    crashed.sort(key=lambda task: (str(task[0]), task[1]))
+    while crashed:
+        task = crashed.pop(0)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            try:
+                result = executor.submit(process_pdf_task, *task).result()
+            except BrokenProcessPool:
+                result = {'paragraphs': [], 'total_pages': 0, 'metadata': {},
+                          'extractor': None, 'error': "worker process crashed"}
+        crashed.extend(follow_up_tasks(task, result, pages_per_task))
+        yield task, result
+
+
+def save_document(
+    doc: PDFDocument,
+    output_dir: Path,
+    output_format: str = DEFAULT_OUTPUT_FORMAT
+) -> Optional[Path]:
+    """
+    Save processed document; returns the file written, or None on failure.
+
+    "jsonl" (and gzip-compressed "jsonl.gz") writes a header record with the
+    document fields followed by one compact paragraph record per line, so Step 3
+    can stream it. "json" writes the whole document as one indented JSON object.
+    """
     try:
         # Create output directory if it doesn't exist
         output_dir.mkdir(parents=True, exist_ok=True)
         
         # Create output filename
-        output_file = output_dir / f"{doc.filename}.json"
+        output_file = output_dir / f"{doc.filename}.{output_format}"
         
-        # Save to JSON
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(doc.to_dict(), f, ensure_ascii=False, indent=2)
+        if output_format == "json":
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(doc.to_dict(), f, ensure_ascii=False, indent=2)
+        elif output_format in ("jsonl", "jsonl.gz"):
+            opener = gzip.open if output_format.endswith(".gz") else open
+            with opener(output_file, 'wt', encoding='utf-8') as f:
+                write_jsonl_document(doc, f)
+        else:
+            raise ValueError(f"Unknown output format: {output_format}")
+        
+        return output_file
             
     except Exception as e:
         logger.error(f"Failed to save document {doc.filename}: {e}")
+        return None
+
+
+def write_jsonl_document(doc: PDFDocument, f) -> None:
+    """Write the JSON Lines layout: one header record, then one record per paragraph."""
+    header = doc.to_dict()
+    del header['paragraphs']
+    header['record'] = 'document'
+    f.write(json.dumps(header, ensure_ascii=False, separators=(',', ':')) + '\n')
+    for paragraph in doc.paragraphs:
+        f.write(json.dumps(paragraph.to_dict(), ensure_ascii=False, separators=(',', ':')) + '\n')
+
+
+class DocumentWriter:
+    """
+    Streams one document's paragraphs to disk as they are extracted.
+
+    Output uses the same layouts as save_document. A document whose pages exceed
+    max_pages_per_shard, or whose current output file grows past max_shard_mb, is
+    split into shards ({filename}.part001.jsonl, ...), each a self-contained
+    document with its own header. For the "json" layout only the current shard's
+    paragraphs are buffered. Files are written under temporary names and only
+    moved into place by close(), so an aborted document leaves nothing behind.
+    """
+    
+    def __init__(
+        self,
+        pdf_path: Path,
+        output_dir: Path,
+        output_format: str = DEFAULT_OUTPUT_FORMAT,
+        total_pages: int = 0,
+        metadata: Optional[Dict] = None,
+        max_pages_per_shard: Optional[int] = None,
+        max_shard_mb: Optional[float] = None,
+        extractor_name: Optional[str] = None
+    ):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.pdf_path = pdf_path
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.total_pages = total_pages
+        self.metadata = metadata or {}
+        self.processed_date = datetime.now().isoformat()
+        self.max_pages_per_shard = max_pages_per_shard or None
+        self.max_shard_bytes = int(max_shard_mb * 1024 * 1024) if max_shard_mb else None
+        self.extractor_name = extractor_name
+        self.paragraph_count = 0
+        self._temp_files: List[Path] = []
+        self._file = None
+        self._buffer: List[Paragraph] = []
+        self._shard_first_page = 0
+        self._shard_bytes = 0
+        output_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _header(self) -> Dict:
+        return {
+            'filename': self.pdf_path.name,
+            'path': str(self.pdf_path),
+            'total_pages': self.total_pages,
+            'processed_date': self.processed_date,
+            'metadata': self.metadata
+        }
+    
+    def _needs_new_shard(self, paragraph: Paragraph) -> bool:
+        if not self._temp_files:
+            return True
+        if self.max_pages_per_shard and \
+                paragraph.page_number - self._shard_first_page >= self.max_pages_per_shard:
+            return True
+        return bool(self.max_shard_bytes) and self._shard_bytes >= self.max_shard_bytes
+    
+    def _open_shard(self, first_page: int) -> None:
+        self._finish_shard()
+        shard = len(self._temp_files)
+        temp_file = self.output_dir / f".{self.pdf_path.name}.{shard}.{self.output_format}.tmp"
+        self._temp_files.append(temp_file)
+        self._shard_first_page = first_page
+        self._shard_bytes = 0
+        if self.output_format == "json":
+            return
+        opener = gzip.open if self.output_format.endswith(".gz") else open
+        self._file = opener(temp_file, 'wt', encoding='utf-8')
+        header = self._header()
+        header['record'] = 'document'
+        header['shard'] = shard
+        self._file.write(json.dumps(header, ensure_ascii=False, separators=(',', ':')) + '\n')
+    
+    def _finish_shard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self.output_format == "json" and self._temp_files:
+            doc = self._header()
+            doc['paragraphs'] = [p.to_dict() for p in self._buffer]
+            with open(self._temp_files[-1], 'w', encoding='utf-8') as f:
+                json.dump(doc, f, ensure_ascii=False, indent=2)
+            self._buffer = []
+    
+    def write(self, paragraph: Paragraph) -> None:
+        if self._needs_new_shard(paragraph):
+            self._open_shard(paragraph.page_number)
+        if self._file is not None:
+            line = json.dumps(paragraph.to_dict(), ensure_ascii=False, separators=(',', ':')) + '\n'
+            self._file.write(line)
+            # Uncompressed size: the gzip stream doesn't expose its compressed position cheaply
+            self._shard_bytes += len(line)
+        else:
+            self._buffer.append(paragraph)
+            self._shard_bytes += len(paragraph.text) + 150
+        self.paragraph_count += 1
+    
+    def write_all(self, paragraphs) -> None:
+        for paragraph in paragraphs:
+            self.write(paragraph)
+    
+    def close(self) -> List[Path]:
+        """Move the shards into place and return their paths (empty if no paragraphs were written)."""
+        self._finish_shard()
+        if len(self._temp_files) == 1:
+            names = [f"{self.pdf_path.name}.{self.output_format}"]
+        else:
+            names = [f"{self.pdf_path.name}.part{i + 1:03d}.{self.output_format}"
+                     for i in range(len(self._temp_files))]
+        outputs = []
+        for temp_file, name in zip(self._temp_files, names):
+            output_file = self.output_dir / name
+            os.replace(temp_file, output_file)
+            outputs.append(output_file)
+        self._temp_files = []
+        return outputs
+    
+    def abort(self) -> None:
+        """Discard everything written so far."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for temp_file in self._temp_files:
+            temp_file.unlink(missing_ok=True)
+        self._temp_files = []
+        self._buffer = []
+
+
+class CleaningManifest:
+    """
+    Tracks which PDFs have up-to-date cleaned output, keyed by source path.
+
+    Each entry stores the source size, mtime and SHA-256, the output files (one
+    per shard), the CLEANER_VERSION, and both the requested text extractor and the
+    one that actually extracted it (they differ when a PDF fell back to PyPDF2).
+    A PDF is re-cleaned only when it is new, its content changed, or the cleaner
+    version or requested extractor changed.
+    """
+    
+    def __init__(self, path: Path, output_format: str = DEFAULT_OUTPUT_FORMAT,
+                 extractor_name: str = "pypdf2"):
+        self.path = path
+        self.output_format = output_format
+        self.extractor_name = extractor_name
+        self.entries: Dict[str, Dict] = {}
+        self._unsaved = 0
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+    
+    def is_current(self, pdf_path: Path) -> bool:
+        """Return True if the PDF's cleaned output is up to date."""
+        entry = self.entries.get(str(pdf_path))
+        if not entry or entry.get('cleaner_version') != CLEANER_VERSION:
+            return False
+        # Entries written before extractors were pluggable came from PyPDF2; a PDF that
+        # fell back to PyPDF2 is current for the extractor that was requested for it
+        if entry.get('requested_extractor', entry.get('extractor', 'pypdf2')) != self.extractor_name:
+            return False
+        for output in entry_outputs(entry):
+            if not Path(output).exists() or not output.endswith(f".{self.output_format}"):
+                return False
+        stat = pdf_path.stat()
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return True
+        # Touched but possibly unchanged: fall back to comparing content
+        if entry['size'] == stat.st_size and entry['sha256'] == file_sha256(pdf_path):
+            entry['mtime'] = stat.st_mtime
+            self._unsaved += 1
+            return True
+        return False
+    
+    def record(self, pdf_path: Path, output_files: List[Path], paragraphs: int,
+               extractor_name: Optional[str] = None) -> None:
+        """Record a cleaned PDF; extractor_name is the backend that extracted it, if not the requested one."""
+        outputs = [str(output_file) for output_file in output_files]
+        for previous in entry_outputs(self.entries.get(str(pdf_path), {})):
+            if previous not in outputs:
+                # Output moved (format change, different sharding): don't leave a stale copy for Step 3
+                Path(previous).unlink(missing_ok=True)
+        stat = pdf_path.stat()
+        self.entries[str(pdf_path)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': file_sha256(pdf_path),
+            'outputs': outputs,
+            'paragraphs': paragraphs,
+            'cleaner_version': CLEANER_VERSION,
+            'extractor': extractor_name or self.extractor_name,
+            'requested_extractor': self.extractor_name,
+            'processed_date': datetime.now().isoformat()
+        }
+        self._unsaved += 1
+        if self._unsaved >= 50:
+            self.save()
+    
+    def remove_missing(self, pdf_files: List[Path]) -> int:
+        """Drop entries (and their outputs) whose source PDF no longer exists."""
+        current = {str(p) for p in pdf_files}
+        removed = 0
+        for source in [s for s in self.entries if s not in current]:
+            for output in entry_outputs(self.entries.pop(source)):
+                Path(output).unlink(missing_ok=True)
+            logger.info(f"Removed cleaned output for vanished source {source}")
+            removed += 1
+        if removed:
+            self._unsaved += removed
+        return removed
+    
+    def save(self) -> None:
+        if not self._unsaved:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'cleaner_version': CLEANER_VERSION, 'files': self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+
+def entry_outputs(entry: Dict) -> List[str]:
+    """Output files of a manifest entry; older manifests stored a single 'output'."""
+    if 'outputs' in entry:
+        return entry['outputs']
+    return [entry['output']] if entry.get('output') else []
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 def process_directory(
     input_dir: Path,
     output_dir: Path,
-    recursive: bool = True
+    recursive: bool = True,
+    workers: int = 1,
+    pages_per_task: int = 200,
+    incremental: bool = True,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    max_pages_per_shard: Optional[int] = None,
+    max_shard_mb: Optional[float] = None,
+    extractor_name: str = DEFAULT_EXTRACTOR
 ) -> None:
     """
     Process all PDFs in a directory and its subdirectories.
+
+    Page text comes from the extractor_name backend (see pdf_extractors.py),
+    falling back to PyPDF2 when that backend is missing or can't parse a PDF.
+
+    Paragraphs are streamed page by page to a DocumentWriter instead of being
+    collected per document; max_pages_per_shard / max_shard_mb split very large
+    documents into several output files.
+
+    With workers > 1 the PDFs are cleaned on a process pool, large documents
+    split into ranges of pages_per_task pages; each document's ranges are written
+    in page order by this process as soon as they are contiguous.
+
+    With incremental=True, PDFs whose cleaned output is up to date according to
+    output_dir/manifest.json are skipped, and outputs of vanished PDFs are removed.
     """
     # Find all PDF files
     pattern = "**/*.pdf" if recursive else "*.pdf"
-    pdf_files = list(input_dir.glob(pattern))
+    pdf_files = sorted(input_dir.glob(pattern))
+    
+    extractor = get_extractor(extractor_name)
+    logger.info(f"Extracting text with {extractor.name}")
+    manifest = CleaningManifest(output_dir / MANIFEST_NAME, output_format, extractor.name)
+    if incremental:
+        manifest.remove_missing(pdf_files)
+        pdf_files_to_process = [p for p in pdf_files if not manifest.is_current(p)]
+        logger.info(f"{len(pdf_files) - len(pdf_files_to_process)} PDFs already up to date")
+        pdf_files = pdf_files_to_process
     
     if not pdf_files:
-        logger.warning(f"No PDF files found in {input_dir}")
+        logger.warning(f"No PDF files to process in {input_dir}")
+        manifest.save()
         return
     
     logger.info(f"Found {len(pdf_files)} PDF files to process")
+    shard_limits = {'max_pages_per_shard': max_pages_per_shard, 'max_shard_mb': max_shard_mb}
     
-    # Process each PDF
-    for pdf_path in tqdm(pdf_files, desc="Processing PDFs"):
-        try:
-            # Process the PDF
-            document = process_pdf(pdf_path)
-            if document and document.paragraphs:
-                # Save the processed document
-                save_document(document, output_dir)
-                logger.info(f"Successfully processed {pdf_path.name}: "
-                          f"{len(document.paragraphs)} paragraphs extracted")
-            else:
-                logger.warning(f"No valid paragraphs found in {pdf_path.name}")
+    try:
+        if workers > 1:
+            process_directory_parallel(pdf_files, output_dir, workers, pages_per_task, manifest,
+                                       output_format, extractor=extractor, **shard_limits)
+            return
+        
+        # Process each PDF
+        for pdf_path in tqdm(pdf_files, desc="Processing PDFs"):
+            try:
+                # Process the PDF
+                writer = clean_pdf_to_writer(pdf_path, output_dir, output_format,
+                                             extractor=extractor, **shard_limits)
+                if writer is not None:
+                    finish_document(writer, manifest)
+                    
+            except Exception as e:
+                logger.error(f"Error processing {pdf_path.name}: {e}")
+                continue
+    finally:
+        manifest.save()
+
+
+def finish_document(
+    writer: DocumentWriter,
+    manifest: Optional[CleaningManifest] = None
+) -> None:
+    """Move a streamed document's shards into place and record it in the manifest."""
+    pdf_path = writer.pdf_path
+    try:
+        output_files = writer.close()
+    except Exception as e:
+        writer.abort()
+        logger.error(f"Failed to save document {pdf_path.name}: {e}")
+        return
+    if output_files:
+        shards = f" in {len(output_files)} shards" if len(output_files) > 1 else ""
+        logger.info(f"Successfully processed {pdf_path.name}: "
+                  f"{writer.paragraph_count} paragraphs extracted{shards}")
+    else:
+        logger.warning(f"No valid paragraphs found in {pdf_path.name}")
+    if manifest is not None:
+        manifest.record(pdf_path, output_files, writer.paragraph_count, writer.extractor_name)
+
+
+def process_directory_parallel(
+    pdf_files: List[Path],
+    output_dir: Path,
+    workers: int,
+    pages_per_task: int,
+    manifest: Optional[CleaningManifest] = None,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    max_pages_per_shard: Optional[int] = None,
+    max_shard_mb: Optional[float] = None,
+    extractor: Optional[PDFExtractor] = None
+) -> None:
+    """
+    Clean PDFs on a process pool, streaming each document's page ranges to its
+    writer in page order; only ranges that arrive ahead of their turn are held.
+    """
+    extractor = extractor or get_extractor(DEFAULT_EXTRACTOR)
+    results: Dict[Tuple[Path, int], Dict] = {}
+    
+    # The next range to write per file, and its page count once its first range is in
+    next_start: Dict[Path, int] = {path: 0 for path in pdf_files}
+    total_pages: Dict[Path, int] = {}
+    writers: Dict[Path, DocumentWriter] = {}
+    errors: Dict[Path, List[str]] = {}
+    
+    try:
+        with tqdm(total=len(pdf_files), desc="Processing PDFs") as progress:
+            for (pdf_path, start_page, _, _), result in run_tasks_in_pool(pdf_files, pages_per_task, workers,
+                                                                         extractor.name):
+                results[(pdf_path, start_page)] = result
                 
-        except Exception as e:
-            logger.error(f"Error processing {pdf_path.name}: {e}")
-            continue
+                while (pdf_path, next_start[pdf_path]) in results:
+                    part = results.pop((pdf_path, next_start[pdf_path]))
+                    if next_start[pdf_path] == 0:
+                        total_pages[pdf_path] = part['total_pages']
+                    next_start[pdf_path] += pages_per_task
+                    if part['error']:
+                        errors.setdefault(pdf_path, []).append(part['error'])
+                        continue
+                    try:
+                        if pdf_path not in writers:
+                            writers[pdf_path] = DocumentWriter(
+                                pdf_path, output_dir, output_format,
+                                total_pages=part['total_pages'],
+                                metadata=part['metadata'],
+                                max_pages_per_shard=max_pages_per_shard,
+                                max_shard_mb=max_shard_mb,
+                                extractor_name=part['extractor']
+                            )
+                        elif part['extractor'] != extractor.name:
+                            # One fallen-back range makes PyPDF2 the document's extractor
+                            writers[pdf_path].extractor_name = part['extractor']
+                        writers[pdf_path].write_all(Paragraph(**p) for p in part['paragraphs'])
+                    except Exception as e:
+                        errors.setdefault(pdf_path, []).append(str(e))
+                
+                if pdf_path not in total_pages or next_start[pdf_path] < total_pages[pdf_path]:
+                    continue
+                
+                progress.update(1)
+                file_errors = errors.pop(pdf_path, [])
+                writer = writers.pop(pdf_path, None)
+                if file_errors:
+                    logger.error(f"Failed to process PDF {pdf_path}: {file_errors[0]}")
+                if writer is None:
+                    continue
+                # A partially failed document is saved but not marked current, so it is retried
+                finish_document(writer, None if file_errors else manifest)
+    finally:
+        for writer in writers.values():
+            writer.abort()
         
         
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract clean paragraphs from downloaded PDFs")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (1 = process in this process)")
+    parser.add_argument("--pages-per-task", type=int, default=200,
+                        help="split PDFs into page ranges of this size across workers")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=DEFAULT_OUTPUT_FORMAT,
+                        help="output layout: streaming JSON Lines (optionally gzipped) or indented JSON")
+    parser.add_argument("--full", action="store_true",
+                        help="re-clean every PDF instead of only new or changed ones")
+    parser.add_argument("--max-pages-per-shard", type=int, default=500,
+                        help="split documents with more pages into several output files (0 = never)")
+    parser.add_argument("--extractor", choices=EXTRACTOR_CHOICES, default=DEFAULT_EXTRACTOR,
+                        help="text-extraction backend; auto picks pdfium, then pdfminer, then PyPDF2")
+    parser.add_argument("--max-shard-mb", type=float, default=64,
+                        help="start a new output file once the current one exceeds this size (0 = no limit)")
+    args = parser.parse_args()
+    
     # Set up directories
     input_dir = Path("downloads")
     output_dir = Path("cleaned_pdfs")
     
     # Process PDFs
-    process_directory(input_dir, output_dir, recursive=True)
\ No newline at end of file
+    process_directory(input_dir, output_dir, recursive=True,
+                      workers=args.workers, pages_per_task=args.pages_per_task,
+                      incremental=not args.full, output_format=args.format,
+                      max_pages_per_shard=args.max_pages_per_shard,
+                      max_shard_mb=args.max_shard_mb,
+                      extractor_name=args.extractor)
@@ -1,4 +1,5 @@
 from langchain_community.vectorstores.utils import filter_complex_metadata
+import argparse
 import json
 from pathlib import Path
 import chromadb
@@ -6,9 +7,19 @@ from chromadb.utils import embedding_functions
 from tqdm.notebook import tqdm
 import logging
 from datetime import datetime
-import time
-from typing import List, Dict, Generator
-from uuid import uuid4
+from typing import Callable, List, Dict, Generator, Optional
+import hashlib
+from itertools import islice
+from cleaned_documents import (dropped_positions, find_document_files, load_dedup_drops,
+                               load_source_hashes, open_document_stream, source_hash)
+from chunker import Chunker
+from adaptive_batcher import AdaptiveBatcher
+from embedding_pipeline import EmbeddingPipeline
+from index_manifest import MANIFEST_NAME, IndexManifest, IndexRun
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+import embedding_models
+from embedding_models import COLLECTION_MODEL_KEY, load_embedder, normalize_spec, recorded_model
+from hnsw_settings import check_collection, hnsw_metadata
 
 # Set up logging
 logging.basicConfig(
@@ -17,55 +28,123 @@ logging.basicConfig(
 )
 logger = logging.getLogger('embeddings_generator')
 from langchain_core.documents import Document
-from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
 
 CLEANED_PDFS_DIR = Path("cleaned_pdfs")
 CHROMA_DB_DIR = Path("chroma_db")
 
-# Ollama Configuration
-OLLAMA_MODEL = "mistral-nemo:12b-instruct-2407-q2_K"
-OLLAMA_URL = "http://localhost:11434"
+# Embedding model (see embedding_models.py), independent of the chat model: set the
+# EMBEDDING_MODEL environment variable, e.g. to embedding_models.SMALL_EMBEDDING_MODEL,
+# and migrate an existing collection with reembed_collection.py
+EMBEDDING_MODEL = embedding_models.EMBEDDING_MODEL
+COLLECTION_NAME = "pdf_paragraphs"
 
-# Batch Processing
-BATCH_SIZE = 10
-DELAY_BETWEEN_BATCHES = 0.1  # seconds
+# Embedding cache (see embedding_cache.py), shared with the web app's TherapistBot:
+# text embedded before, by this model, isn't embedded again
+EMBEDDING_CACHE_PATH = DEFAULT_CACHE_PATH
+EMBEDDING_CACHE_MAX_MB = 1024
 
-def load_document(json_path: Path) -> Dict:
-    """Load a processed document from JSON."""
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Failed to load document {json_path}: {e}")
-        return None
-    
-def paragraph_generator(json_files: List[Path]) -> Generator[Dict, None, None]:
-    """Generate paragraphs from JSON files in batches."""
+# Chunking (see chunker.py); CHUNK_SIZE = 0 embeds Step 2's paragraphs as they are
+CHUNK_UNIT = "words"  # or "tokens"
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 40
+
+# Batch Processing: sizes adapt between MIN and MAX_BATCH_SIZE (see adaptive_batcher.py)
+BATCH_SIZE = 32  # Starting size
+MIN_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 512
+MAX_BATCH_SECONDS = 120  # Slower batches are treated like timeouts and shrink the size
+ID_PAGE_SIZE = 5000  # Ids fetched / deleted per vector store call
+
+# Pipelined embedding (see embedding_pipeline.py): with more than one worker, a reader
+# thread feeds this many concurrent embedding requests and a single writer commits to
+# Chroma. Ollama runs up to OLLAMA_NUM_PARALLEL requests at once on the server side.
+# Batch sizes adapt the same way on both paths.
+EMBEDDING_WORKERS = 4
+
+# Which document versions are in the collection (see index_manifest.py): only new and
+# changed documents are read and embedded, and removed ones are deleted
+INDEX_MANIFEST_FILE = CHROMA_DB_DIR / MANIFEST_NAME
+
+
+def content_id(file_hash: str, page_number: int, position: int, text: str,
+               sentence: Optional[int] = None) -> str:
+    """
+    Deterministic id from the source PDF's hash, the location and the text's hash, so
+    an unchanged paragraph gets the same id on every run and a changed one a new id.
+    """
+    location = f"p{page_number}-{position}" if sentence is None else f"p{page_number}-{position}-s{sentence}"
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+    return f"{file_hash[:16]}-{location}-{text_hash}"
+
+
+def paragraph_generator(
+    json_files: List[Path],
+    drops: Optional[Dict[str, Dict]] = None,
+    chunker: Optional[Chunker] = None,
+    source_hashes: Optional[Dict[str, str]] = None,
+    skip_document: Optional[Callable[[Dict, str], bool]] = None
+) -> Generator[Dict, None, None]:
+    """
+    Generate paragraphs from cleaned document files, streaming JSON Lines files.
+
+    Ids are content-derived (see content_id); source PDF hashes are taken from
+    `source_hashes` (see cleaned_documents.load_source_hashes) when known.
+
+    Paragraphs listed in `drops` (see cleaned_documents.load_dedup_drops) are skipped.
+    With a chunker, each document's paragraphs are regrouped into chunks first; the
+    chunk's first paragraph gives its page_number/position and the full provenance is
+    kept in its metadata.
+
+    Documents for which skip_document(header, source_hash) returns True are not read.
+    """
+    hashes = source_hashes if source_hashes is not None else {}
     for json_path in json_files:
-        doc = load_document(json_path)
-        if not doc:
+        opened = open_document_stream(json_path)
+        if not opened:
+            continue
+        doc, paragraphs = opened
+        file_hash = source_hash(doc, hashes)
+        if skip_document and skip_document(doc, file_hash):
             continue
+        skip = dropped_positions(drops, doc) if drops else set()
+        if skip:
+            paragraphs = (p for p in paragraphs if (p['page_number'], p['position']) not in skip)
 
-        for paragraph in doc['paragraphs']:
-            # Create a unique ID using source file and position
+        # Metadata shared by every paragraph of the document; document_file is the cleaned
+        # file (one shard of a large PDF) the vector belongs to, source_file the PDF
+        doc_metadata = {
+            'document_file': json_path.name,
+            'source_file': doc['filename'],
+            'total_pages': doc['total_pages'],
+            'processed_date': doc['processed_date']
+        }
 
-            para_id = f"{doc['filename']}_{paragraph['page_number']}_{paragraph['position']}"
+        # Add document metadata if available
+        if doc.get('metadata'):
+            doc_metadata['doc_metadata'] = json.dumps(doc['metadata'])
+
+        if chunker:
+            for chunk in chunker.chunk(paragraphs):
+                yield Document(
+                    page_content=chunk.text,
+                    metadata={**doc_metadata, **chunk.to_metadata()},
+                    id=content_id(file_hash, chunk.page_number, chunk.position, chunk.text, chunk.sentence),
+                )
+            continue
+
+        for paragraph in paragraphs:
+            # Create a unique ID from the source file, position and text
+            para_id = content_id(file_hash, paragraph['page_number'], paragraph['position'], paragraph['text'])
 
             # Create metadata
             metadata = {
-                'source_file': doc['filename'],
+                **doc_metadata,
                 'page_number': paragraph['page_number'],
                 'position': paragraph['position'],
                 'word_count': paragraph['word_count'],
-                'total_pages': doc['total_pages'],
-                'processed_date': doc['processed_date']
             }
 
-            # Add document metadata if available
-            if doc.get('metadata'):
-                metadata['doc_metadata'] = json.dumps(doc['metadata'])
-
             d = Document(
                 page_content=paragraph['text'],
                 metadata=metadata,
@@ -81,17 +160,32 @@ def setup_chroma_client() -> chromadb.PersistentClient:
         # Ensure the directory exists
         CHROMA_DB_DIR.mkdir(parents=True, exist_ok=True)
 
-        # Create embedding function
-        embeddings = OllamaEmbeddings(
-            model="mistral-nemo:12b-instruct-2407-q2_K")
+        # Vectors from different models can't share a collection
+        client = chromadb.PersistentClient(path=str(CHROMA_DB_DIR))
+        indexed_with = recorded_model(client, COLLECTION_NAME)
+        if indexed_with and indexed_with != normalize_spec(EMBEDDING_MODEL):
+            raise ValueError(f"Collection {COLLECTION_NAME} was embedded with {indexed_with}, not "
+                             f"{EMBEDDING_MODEL}; migrate it with: python reembed_collection.py "
+                             f"--model {EMBEDDING_MODEL}")
 
-        # Create persistent client
+        # Create embedding function, answered from the embedding cache when possible
+        embeddings = load_embedder(
+            EMBEDDING_MODEL,
+            EmbeddingCache(EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+        )
+
+        # Create persistent client; a new collection records its embedding model and
+        # is built with the HNSW settings shared with the web app (hnsw_settings.py)
         vector_store = Chroma(
-            collection_name="pdf_paragraphs",
+            client=client,
+            collection_name=COLLECTION_NAME,
             embedding_function=embeddings,
-            # Where to save data locally, remove if not necessary
-            persist_directory=str(CHROMA_DB_DIR),
+            collection_metadata=None if indexed_with else {
+                **hnsw_metadata(), COLLECTION_MODEL_KEY: normalize_spec(EMBEDDING_MODEL)
+            },
         )
+        if indexed_with:
+            check_collection(vector_store._collection)
 
         return vector_store
 
@@ -101,56 +195,248 @@ def setup_chroma_client() -> chromadb.PersistentClient:
     
 
 def process_paragraphs(vector_store, paragraphs: List[Dict]) -> None:
-    """Process a batch of paragraphs and add to vector_store."""
+    """Upsert a batch of paragraphs into vector_store; errors are re-raised so the batcher can back off."""
     try:
-        uuids = [str(uuid4()) for _ in range(len(paragraphs))]
-
-        vector_store.add_documents(documents=paragraphs, ids=uuids)
+        vector_store.add_documents(documents=paragraphs, ids=[paragraph.id for paragraph in paragraphs])
 
     except Exception as e:
         logger.error(f"Failed to process batch: {e}")
         # Log the problematic batch for debugging
         logger.debug(f"Problematic batch: {paragraphs}")
+        raise
         
         
-def embed_all_paragraphs() -> None:
-    """Main function to embed all paragraphs."""
+def upsert_embedded(vector_store, documents: List[Document], embeddings: List[List[float]]) -> None:
+    """Write already-embedded documents, bypassing the store's own embedding call."""
+    vector_store._collection.upsert(
+        ids=[document.id for document in documents],
+        embeddings=embeddings,
+        metadatas=[document.metadata for document in documents],
+        documents=[document.page_content for document in documents],
+    )
+
+
+def fetch_existing_ids(vector_store, where: Optional[Dict] = None) -> set:
+    """Ids in the collection (or those matching `where`), fetched page by page without embeddings."""
+    ids = set()
+    offset = 0
+    while True:
+        page = vector_store.get(limit=ID_PAGE_SIZE, offset=offset, where=where, include=[])['ids']
+        ids.update(page)
+        if len(page) < ID_PAGE_SIZE:
+            return ids
+        offset += len(page)
+
+
+def existing_among(vector_store, ids: List[str]) -> set:
+    """The given ids that are already in the collection"""
+    found = set()
+    for start in range(0, len(ids), ID_PAGE_SIZE):
+        found.update(vector_store.get(ids=ids[start:start + ID_PAGE_SIZE], include=[])['ids'])
+    return found
+
+
+def delete_ids(vector_store, ids) -> None:
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_PAGE_SIZE):
+        vector_store.delete(ids=ids[start:start + ID_PAGE_SIZE])
+
+
+def set_document_file(vector_store, ids, document_file: str) -> None:
+    """Record existing vectors as belonging to `document_file`, without embedding them again."""
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_PAGE_SIZE):
+        page = ids[start:start + ID_PAGE_SIZE]
+        vector_store._collection.update(ids=page, metadatas=[{'document_file': document_file}] * len(page))
+
+
+class CollectionIds:
+    """The collection as IndexRun sees it: ids, and the document file each vector belongs to."""
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+
+    def ids_of(self, document_file: str) -> set:
+        return fetch_existing_ids(self.vector_store, {'document_file': document_file})
+
+    def all_ids(self) -> set:
+        return fetch_existing_ids(self.vector_store)
+
+    def existing_among(self, ids: List[str]) -> set:
+        return existing_among(self.vector_store, ids)
+
+    def delete(self, ids) -> None:
+        delete_ids(self.vector_store, ids)
+
+    def set_document_file(self, ids, document_file: str) -> None:
+        set_document_file(self.vector_store, ids, document_file)
+
+
+def index_settings() -> Dict:
+    """Settings every vector depends on: changing one re-indexes every document."""
+    return {
+        'embedding_model': normalize_spec(EMBEDDING_MODEL),
+        'chunk_unit': CHUNK_UNIT,
+        'chunk_size': CHUNK_SIZE,
+        'chunk_overlap': CHUNK_OVERLAP,
+    }
+
+
+def embed_all_paragraphs(dry_run: bool = False) -> None:
+    """
+    Main function to embed all paragraphs.
+
+    Only documents the index manifest doesn't list at their current version are read.
+    With dry_run, log how much a run would embed and delete without changing anything.
+    """
     try:
         # Check if input directory exists
         if not CLEANED_PDFS_DIR.exists():
             raise FileNotFoundError(f"Directory not found: {CLEANED_PDFS_DIR}")
 
         # Get all JSON files
-        json_files = list(CLEANED_PDFS_DIR.glob("*.json"))
+        json_files = find_document_files(CLEANED_PDFS_DIR)
         if not json_files:
-            logger.warning(f"No JSON files found in {CLEANED_PDFS_DIR}")
+            logger.warning(f"No document files found in {CLEANED_PDFS_DIR}")
             return
 
-        logger.info(f"Found {len(json_files)} JSON files to process")
+        logger.info(f"Found {len(json_files)} document files to process")
+
+        # Duplicates and boilerplate found by corpus_dedup.py, if it was run
+        drops = load_dedup_drops(CLEANED_PDFS_DIR)
+        if drops:
+            logger.info(f"Skipping {sum(len(d['dropped']) for d in drops.values())} "
+                        f"duplicate/boilerplate paragraphs")
+
+        chunker = Chunker(CHUNK_SIZE, CHUNK_OVERLAP, unit=CHUNK_UNIT) if CHUNK_SIZE else None
 
         # Setup Chroma
         collection = setup_chroma_client()
 
-        # Process paragraphs in batches
-        current_batch = []
-        total_processed = 0
+        # What changed since the last run
+        manifest = IndexManifest(INDEX_MANIFEST_FILE, index_settings())
+        plan = manifest.plan(json_files, drops)
+        if plan.rebuild_reason:
+            logger.info(f"Re-indexing every document: {plan.rebuild_reason}")
+        logger.info(f"Documents: {json.dumps(plan.summary())}")
+
+        run = IndexRun(manifest, plan, CollectionIds(collection))
+        if run.sweep:
+            logger.info(f"{len(run.existing_ids)} paragraphs already in the collection")
+
+        def changed_paragraphs():
+            """(document file, paragraph) pairs to embed, then (document file, None) once it is read."""
+            source_hashes = load_source_hashes(CLEANED_PDFS_DIR)
+            for json_path in run.to_index:
+                key = json_path.name
+                run.start_document(key)
+                documents = run.unseen(paragraph_generator(
+                    [json_path], drops, chunker, source_hashes,
+                    lambda doc, file_hash: run.set_source_hash(key, file_hash)))
+                # Streamed, and checked against the collection ID_PAGE_SIZE paragraphs at a time
+                while True:
+                    batch = list(islice(documents, ID_PAGE_SIZE))
+                    if not batch:
+                        break
+                    for document in run.to_embed(key, batch):
+                        yield key, document
+                yield key, None
+
+        if dry_run:
+            to_embed = sum(1 for _, document in changed_paragraphs() if document is not None)
+            report = {
+                **plan.summary(),
+                'documents_to_read': len(run.to_index),
+                'paragraphs_to_embed': to_embed,
+                'paragraphs_unchanged': run.skipped,
+                'paragraphs_to_delete': run.pending_deletions(),
+            }
+            rate = manifest.last_run.get('items_per_second')
+            if rate:
+                report['estimated_minutes'] = round(to_embed / rate / 60, 1)
+            logger.info("Dry run, nothing was changed:")
+            for name, value in report.items():
+                logger.info(f"  {name}: {value}")
+            return
+
+        pipelined = EMBEDDING_WORKERS > 1
+        # Process paragraphs in adaptively sized batches
+        batcher = AdaptiveBatcher(
+            initial_size=BATCH_SIZE,
+            min_size=MIN_BATCH_SIZE,
+            max_size=MAX_BATCH_SIZE,
+            max_batch_seconds=MAX_BATCH_SECONDS
+        )
+        try:
+            with tqdm(desc="Processing paragraphs", unit="para") as progress:
+                # A document is finished as soon as all of its paragraphs are written, so an
+                # interrupted run resumes after the documents it finished; a document with a
+                # failed batch isn't, and is read again on the next run
+                if pipelined:
+                    pipeline = EmbeddingPipeline(
+                        embed=lambda batch: collection.embeddings.embed_documents(
+                            [document.page_content for document in batch]),
+                        write=lambda batch, embeddings: upsert_embedded(collection, batch, embeddings),
+                        workers=EMBEDDING_WORKERS,
+                        batcher=batcher
+                    )
+                    stats = pipeline.run(changed_paragraphs(), on_key_done=run.finish_document, progress=progress)
+                else:
+                    uncommitted: Dict[str, int] = {}  # Paragraphs handed to the batcher, not yet written
+                    read_keys = set()
+
+                    def paragraphs():
+                        for key, document in changed_paragraphs():
+                            if document is not None:
+                                uncommitted[key] = uncommitted.get(key, 0) + 1
+                                yield document
+                            elif uncommitted.get(key):
+                                read_keys.add(key)
+                            else:
+                                uncommitted.pop(key, None)
+                                run.finish_document(key)
+
+                    def process_batch(batch: List[Document]) -> None:
+                        process_paragraphs(collection, batch)
+                        for document in batch:
+                            key = document.metadata['document_file']
+                            uncommitted[key] -= 1
+                            if not uncommitted[key] and key in read_keys:
+                                del uncommitted[key]
+                                read_keys.discard(key)
+                                run.finish_document(key)
 
-        # Process paragraphs
-        for paragraph in tqdm(paragraph_generator(json_files), desc="Processing paragraphs", unit="para"):
-            current_batch.append(paragraph)
+                    stats = batcher.run(paragraphs(), process_batch, progress)
+        finally:
+            # Keep what was committed, so an interrupted run resumes after it
+            manifest.save()
 
-            if len(current_batch) >= BATCH_SIZE:
-                process_paragraphs(collection, current_batch)
-                total_processed += len(current_batch)
-                current_batch = []
-                time.sleep(DELAY_BETWEEN_BATCHES)
+        total_processed = stats['items']
+        if stats['failed_items']:
+            logger.warning(f"{stats['failed_items']} paragraphs could not be embedded; "
+                           f"their documents are retried on the next run")
+        logger.info(f"Throughput: {stats['items_per_second']} paragraphs/s")
+        cache = getattr(collection.embeddings, 'cache', None)
+        if cache:
+            logger.info(f"Embedding cache: {json.dumps(cache.summary())}")
 
-        # Process remaining paragraphs
-        if current_batch:
-            process_paragraphs(collection, current_batch)
-            total_processed += len(current_batch)
+        # Documents whose cleaned file is gone
+        run.delete_removed()
+
+        if not stats['failed_items']:
+            # Paragraphs no current document produces
+            run.delete_unseen()
+            manifest.save(last_run={
+                'finished': datetime.now().isoformat(),
+                'embedded': total_processed,
+                'items_per_second': stats['items_per_second'],
+            })
+        else:
+            manifest.save()
 
         # Log completion
+        logger.info(f"Deleted {run.deleted} stale paragraphs")
+        logger.info(f"Skipped {run.skipped} unchanged paragraphs")
         logger.info(f"Successfully embedded {total_processed} paragraphs")
         logger.info(f"Vector database saved to: {CHROMA_DB_DIR}")
 
@@ -160,4 +446,13 @@ def embed_all_paragraphs() -> None:
     
 
 def main():
-    embed_all_paragraphs()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Embed the cleaned documents into the Chroma collection")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report how much would be embedded and deleted, without changing anything")
+    # parse_known_args: tolerate the arguments a notebook kernel passes
+    args, _ = parser.parse_known_args()
+    embed_all_paragraphs(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import logging
+import time
+from collections import deque
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger('adaptive_batcher')
+
+
+class AdaptiveBatcher:
+    """
+    Picks the batch size for a batched call (e.g. embedding + vector store insert).
+
+    The size is multiplied by `growth` while the per-item latency keeps improving by at
+    least `min_gain`; once it stops improving it settles on the best size seen, and
+    re-probes a larger size every `probe_every` batches in case conditions changed.
+    A failed batch, or one slower than `max_batch_seconds`, halves the size.
+    """
+
+    def __init__(self, initial_size: int = 32, min_size: int = 1, max_size: int = 512,
+                 growth: float = 2.0, min_gain: float = 0.05, max_batch_seconds: float = 120.0,
+                 probe_every: int = 50):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.growth = growth
+        self.min_gain = min_gain
+        self.max_batch_seconds = max_batch_seconds
+        self.probe_every = probe_every
+        self.growing = True
+        self._latency: Dict[int, float] = {}  # Smoothed seconds per item by batch size
+        self._since_probe = 0
+        self.stats = {'batches': 0, 'items': 0, 'failed_batches': 0, 'failed_items': 0, 'seconds': 0.0}
+
+    def _best_size(self) -> int:
+        return min(self._latency, key=self._latency.get)
+
+    def _grown(self, size: int) -> int:
+        return min(self.max_size, max(size + 1, int(size * self.growth)))
+
+    def record_success(self, items: int, seconds: float) -> None:
+        self.stats['batches'] += 1
+        self.stats['items'] += items
+        if seconds > self.max_batch_seconds and self.size > self.min_size:
+            logger.info(f"Batch of {items} took {seconds:.1f}s; shrinking batch size")
+            self._shrink()
+            return
+        if items != self.size:
+            # A short final batch says nothing about the current size, nor does one cut
+            # (by a concurrent caller) before the size last changed
+            return
+        per_item = seconds / max(items, 1)
+        previous = self._latency.get(self.size)
+        self._latency[self.size] = per_item if previous is None else 0.5 * (previous + per_item)
+        best = self._best_size()
+
+        if self.growing:
+            smaller = [s for s in self._latency if s < self.size]
+            improved = not smaller or self._latency[self.size] < \
+                (1 - self.min_gain) * min(self._latency[s] for s in smaller)
+            if improved and self.size < self.max_size:
+                self.size = self._grown(self.size)
+            else:
+                self.growing = False
+                self.size = best
+                logger.info(f"Settled on batch size {self.size} "
+                            f"({1 / self._latency[self.size]:.1f} items/s)")
+            return
+
+        self._since_probe += 1
+        if self._since_probe >= self.probe_every and self.size < self.max_size:
+            self._since_probe = 0
+            self.growing = True
+            self.size = self._grown(best)
+        else:
+            self.size = best
+
+    def record_failure(self) -> None:
+        self.stats['failed_batches'] += 1
+        self._shrink()
+
+    def _shrink(self) -> None:
+        self.size = max(self.min_size, self.size // 2)
+        self.growing = False
+        # Latencies measured before the trouble are no longer trustworthy
+        self._latency = {s: l for s, l in self._latency.items() if s <= self.size}
+        self._since_probe = 0
+
+    def run(self, items: Iterable, process_batch: Callable[[List], None],
+            progress=None) -> Dict:
+        """
+        Feed items to process_batch in adaptively sized batches.
+
+        A failing batch is retried in smaller batches; at min_size it is dropped and
+        counted in stats['failed_items']. `progress` (e.g. a tqdm bar) is advanced per
+        item. Returns the stats, including throughput in items per second.
+        """
+        iterator = iter(items)
+        retry: deque = deque()
+        start = time.perf_counter()
+        while True:
+            batch = [retry.popleft() for _ in range(min(self.size, len(retry)))]
+            if len(batch) < self.size:
+                batch.extend(islice(iterator, self.size - len(batch)))
+            if not batch:
+                break
+
+            batch_start = time.perf_counter()
+            try:
+                process_batch(batch)
+            except Exception as e:
+                self.record_failure()
+                if len(batch) > self.min_size:
+                    logger.warning(f"Batch of {len(batch)} failed ({e}); retrying with batch size {self.size}")
+                    retry.extendleft(reversed(batch))
+                else:
+                    logger.error(f"Dropping batch of {len(batch)} after repeated failures: {e}")
+                    self.stats['failed_items'] += len(batch)
+                    if progress is not None:
+                        progress.update(len(batch))
+                continue
+
+            self.record_success(len(batch), time.perf_counter() - batch_start)
+            if progress is not None:
+                progress.update(len(batch))
+                progress.set_postfix(batch=self.size, per_s=f"{self.throughput(start):.1f}")
+
+        self.stats['seconds'] = round(time.perf_counter() - start, 3)
+        self.stats['items_per_second'] = round(self.throughput(start), 2)
+        self.stats['batch_size'] = self.size
+        return self.stats
+
+    def throughput(self, start: Optional[float] = None) -> float:
+        elapsed = time.perf_counter() - start if start is not None else self.stats['seconds']
+        return self.stats['items'] / elapsed if elapsed else 0.0
@@ -0,0 +1,198 @@
+"""
+Micro-benchmark for the Step 2 text pipeline (normalize_text -> clean_paragraph ->
+validation) on the page texts of a real PDF corpus.
+
+The original multi-pass implementation is kept below as the reference; every
+paragraph is checked to produce identical output before timings are reported.
+
+With --extractors, compares the text-extraction backends of pdf_extractors.py
+instead: pages per second and paragraph yield on the same pages.
+
+    python benchmark_cleaner.py --input downloads --max-pages 2000 --repeat 5
+    python benchmark_cleaner.py --input downloads --extractors pypdf2 pdfminer pdfium
+"""
+import argparse
+import importlib.util
+import re
+import time
+import unicodedata
+from pathlib import Path
+
+import PyPDF2
+
+from pdf_extractors import EXTRACTORS, EXTRACTOR_PREFERENCE
+
+
+def load_cleaner_module():
+    """Import "Step 2 - PDFs cleaner.py", whose name isn't a valid module name"""
+    path = Path(__file__).parent / "Step 2 - PDFs cleaner.py"
+    spec = importlib.util.spec_from_file_location("pdf_cleaner", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def reference_normalize_text(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if char.isprintable() or char in '\n\t')
+    text = re.sub(r'[‐‑‒–—―]', '-', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = text.replace('\x00', '')
+    return text.strip()
+
+
+def reference_clean_paragraph(text):
+    text = re.sub(r'^\d+$', '', text)
+    text = re.sub(r'^\d{1,2}/\d{1,2}/\d{2,4}$', '', text)
+    text = re.sub(r'^\s*\[?Page \d+\]?\s*$', '', text)
+    text = re.sub(r'^\s*-\d+-\s*$', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'^\s*[-_=]{3,}\s*$', '', text)
+    return text.strip()
+
+
+def reference_is_valid_paragraph(text, min_words=5, max_words=1000):
+    if not text.strip():
+        return False
+    word_count = len(text.split())
+    if word_count < min_words or word_count > max_words:
+        return False
+    if re.match(r'^\d+$', text):
+        return False
+    if re.match(r'^\d{1,2}/\d{1,2}/\d{2,4}$', text):
+        return False
+    if re.match(r'^\s*[Pp]age \d+\s*$', text):
+        return False
+    return True
+
+
+def reference_pipeline(raw_paragraphs):
+    out = []
+    for raw in raw_paragraphs:
+        cleaned = reference_clean_paragraph(reference_normalize_text(raw))
+        if reference_is_valid_paragraph(cleaned):
+            out.append((cleaned, len(cleaned.split())))
+    return out
+
+
+def fused_pipeline(cleaner, raw_paragraphs):
+    out = []
+    for raw in raw_paragraphs:
+        cleaned = cleaner.clean_paragraph(cleaner.normalize_text(raw))
+        word_count = cleaner.paragraph_word_count(cleaned)
+        if word_count is not None:
+            out.append((cleaned, word_count))
+    return out
+
+
+def load_corpus(input_dir, max_pages):
+    """Extract raw paragraphs from up to max_pages pages of the PDFs under input_dir"""
+    raw_paragraphs, pages = [], 0
+    for pdf_path in sorted(input_dir.glob("**/*.pdf")):
+        try:
+            reader = PyPDF2.PdfReader(str(pdf_path))
+            for page in reader.pages:
+                text = page.extract_text() or ''
+                raw_paragraphs.extend(p.strip() for p in re.split(r'\n\s*\n', text) if p.strip())
+                pages += 1
+                if pages >= max_pages:
+                    return raw_paragraphs, pages
+        except Exception as e:
+            print(f"skipping {pdf_path}: {e}")
+    return raw_paragraphs, pages
+
+
+def benchmark_extractor(cleaner, extractor, input_dir, max_pages):
+    """Extract and clean up to max_pages pages with one backend; returns a result row"""
+    pages = raw_paragraphs = paragraphs = words = failed_pages = 0
+    elapsed = 0.0
+    for pdf_path in sorted(input_dir.glob("**/*.pdf")):
+        start = time.perf_counter()
+        try:
+            document = extractor.open(pdf_path)
+        except Exception:
+            continue
+        texts = []
+        with document:
+            for _, text, error in document.page_texts(0, max_pages - pages):
+                texts.append(text or '')
+                failed_pages += error is not None
+        elapsed += time.perf_counter() - start
+        pages += len(texts)
+        for page_number, text in enumerate(texts, 1):
+            raw_paragraphs += sum(1 for p in cleaner.PARAGRAPH_BREAK_RE.split(text) if p.strip())
+            for paragraph in cleaner.extract_paragraphs_from_page(text, page_number, str(pdf_path)):
+                paragraphs += 1
+                words += paragraph.word_count
+        if pages >= max_pages:
+            break
+    return {
+        "extractor": extractor.name,
+        "pages": pages,
+        "failed_pages": failed_pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 1) if elapsed else None,
+        "raw_paragraphs_per_page": round(raw_paragraphs / pages, 2) if pages else None,
+        "paragraphs_per_page": round(paragraphs / pages, 2) if pages else None,
+        "words_per_paragraph": round(words / paragraphs, 1) if paragraphs else None,
+    }
+
+
+def compare_extractors(cleaner, names, input_dir, max_pages):
+    for name in names or EXTRACTOR_PREFERENCE:
+        extractor_class = EXTRACTORS[name]
+        if not extractor_class.is_available():
+            print(f"{name:9s} not installed ({extractor_class.module})")
+            continue
+        row = benchmark_extractor(cleaner, extractor_class(), input_dir, max_pages)
+        print(f"{row['extractor']:9s} {row['pages']:6d} pages  {row['pages_per_second'] or 0:8.1f} pages/s  "
+              f"{row['raw_paragraphs_per_page'] or 0:6.2f} raw / {row['paragraphs_per_page'] or 0:6.2f} valid "
+              f"paragraphs per page  {row['words_per_paragraph'] or 0:6.1f} words/paragraph  "
+              f"({row['failed_pages']} failed pages)")
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, default=Path("downloads"))
+    parser.add_argument("--max-pages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--extractors", nargs="*", choices=EXTRACTOR_PREFERENCE,
+                        help="compare these extraction backends (none listed = all) instead")
+    args = parser.parse_args()
+
+    cleaner = load_cleaner_module()
+    if args.extractors is not None:
+        compare_extractors(cleaner, args.extractors, args.input, args.max_pages)
+        return
+    raw_paragraphs, pages = load_corpus(args.input, args.max_pages)
+    if not raw_paragraphs:
+        raise SystemExit(f"No extractable text found under {args.input}")
+    chars = sum(len(p) for p in raw_paragraphs)
+    print(f"Corpus: {pages} pages, {len(raw_paragraphs)} raw paragraphs, {chars / 1e6:.2f}M chars")
+
+    expected = reference_pipeline(raw_paragraphs)
+    actual = fused_pipeline(cleaner, raw_paragraphs)
+    if expected != actual:
+        mismatch = next(i for i, (a, b) in enumerate(zip(expected, actual)) if a != b) \
+            if len(expected) == len(actual) else min(len(expected), len(actual))
+        raise SystemExit(f"Output differs from the reference implementation at paragraph {mismatch}")
+    print(f"Outputs identical ({len(actual)} valid paragraphs)")
+
+    reference = best_of(args.repeat, lambda: reference_pipeline(raw_paragraphs))
+    fused = best_of(args.repeat, lambda: fused_pipeline(cleaner, raw_paragraphs))
+    print(f"reference: {reference * 1000:9.1f} ms  ({chars / reference / 1e6:6.1f} M chars/s)")
+    print(f"fused:     {fused * 1000:9.1f} ms  ({chars / fused / 1e6:6.1f} M chars/s)")
+    print(f"speedup:   {reference / fused:9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Recall and memory benchmark of the compact index (compact_index.py) against the
+Chroma collection it is built from.
+
+Queries are vectors sampled from the collection (each query's own vector is left
+out of its results), or the lines of --query-file embedded with the collection's
+model. Ground truth is the exact cosine top k over the full-precision vectors. For
+Chroma's HNSW index, exact float32 search, and int8 / PQ with and without exact
+re-ranking, the script reports recall@k, p50/p95 query latency, the memory the
+index keeps resident and its size on disk.
+
+    python benchmark_compact_index.py --chroma-dir chroma_db --queries 200 -k 5
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import chromadb
+import numpy as np
+
+from compact_index import (COMPACT_INDEX_DIR, PQ_SUBSPACES, QUANTIZATIONS, RERANK_FACTOR, CompactIndex,
+                           normalize_rows, read_collection_vectors)
+from embedding_models import collection_model, load_embedder
+
+QUERIES = 200
+TOP_K = 5
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def hnsw_bytes(chroma_dir: Path) -> int:
+    """Size of Chroma's HNSW segment files, which it keeps resident while serving queries"""
+    return sum(f.stat().st_size for f in chroma_dir.rglob('*.bin') if COMPACT_INDEX_DIR not in f.parts)
+
+
+def recall(results: List[List[str]], truth: List[List[str]]) -> float:
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+def summarize(name: str, results, truth, latencies, memory: int, disk: int) -> Dict:
+    return {
+        'index': name,
+        'recall': round(recall(results, truth), 3),
+        'query_ms_p50': round(float(np.percentile(latencies, 50)) * 1000, 2),
+        'query_ms_p95': round(float(np.percentile(latencies, 95)) * 1000, 2),
+        'memory_mb': round(memory / 1024 / 1024, 2),
+        'disk_mb': round(disk / 1024 / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chroma-dir", type=Path, default=Path("chroma_db"))
+    parser.add_argument("--collection", default="pdf_paragraphs")
+    parser.add_argument("--queries", type=int, default=QUERIES, help="collection vectors sampled as queries")
+    parser.add_argument("--query-file", type=Path, help="text queries, one per line, instead of sampled vectors")
+    parser.add_argument("-k", type=int, default=TOP_K)
+    parser.add_argument("--quantizations", nargs="+", choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument("--subspaces", type=int, default=PQ_SUBSPACES)
+    parser.add_argument("--rerank", type=int, default=RERANK_FACTOR, help="candidates re-ranked per result")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=str(args.chroma_dir)).get_collection(args.collection)
+    k = args.k
+    with tempfile.TemporaryDirectory() as tmp:
+        ids, vectors = read_collection_vectors(collection, Path(tmp) / "vectors.npy")
+        print(f"{len(ids)} vectors of dimension {vectors.shape[1]}")
+
+        # Queries, and the id each one must not find (its own vector), if any
+        if args.query_file:
+            texts = [line.strip() for line in args.query_file.read_text(encoding='utf-8').splitlines() if line.strip()]
+            embedder = load_embedder(collection_model(collection.metadata))
+            queries = normalize_rows(embedder.embed_documents(texts))
+            own = [None] * len(queries)
+        else:
+            rows = np.random.RandomState(args.seed).choice(len(ids), min(args.queries, len(ids)), replace=False)
+            queries = np.asarray(vectors[rows])
+            own = [ids[row] for row in rows]
+
+        def without_own(found: List[str], own_id: Optional[str]) -> List[str]:
+            return [i for i in found if i != own_id][:k]
+
+        truth, latencies = [], []
+        candidates = min(k + 1, len(ids))
+        for query, own_id in zip(queries, own):
+            start = time.perf_counter()
+            scores = np.asarray(vectors) @ query
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+            latencies.append(time.perf_counter() - start)
+            truth.append(without_own([ids[i] for i in top[np.argsort(-scores[top])]], own_id))
+        rows_out = [summarize("exact float32", truth, truth, latencies, vectors.nbytes, vectors.nbytes)]
+
+        results, latencies = [], []
+        for query, own_id in zip(queries, own):
+            start = time.perf_counter()
+            found = collection.query(query_embeddings=[query.tolist()], n_results=k + 1, include=[])['ids'][0]
+            latencies.append(time.perf_counter() - start)
+            results.append(without_own(found, own_id))
+        rows_out.append(summarize("chroma hnsw", results, truth, latencies,
+                                  hnsw_bytes(args.chroma_dir), hnsw_bytes(args.chroma_dir)))
+
+        for quantization in args.quantizations:
+            build_start = time.perf_counter()
+            index = CompactIndex.build(ids, vectors, quantization, args.subspaces)
+            index_dir = Path(tmp) / quantization
+            index.save(index_dir)
+            index = CompactIndex.load(index_dir)
+            print(f"{quantization}: built in {time.perf_counter() - build_start:.1f}s")
+            for rerank in (0, args.rerank * (k + 1)):
+                results, latencies = [], []
+                for query, own_id in zip(queries, own):
+                    start = time.perf_counter()
+                    found = [i for i, _ in index.search(query, k + 1, rerank=rerank)]
+                    latencies.append(time.perf_counter() - start)
+                    results.append(without_own(found, own_id))
+                name = f"{quantization} + rerank {rerank}" if rerank else quantization
+                # Without re-ranking the exact vectors needn't be kept
+                disk = directory_bytes(index_dir) - (0 if rerank else (index_dir / "vectors.npy").stat().st_size)
+                rows_out.append(summarize(name, results, truth, latencies, index.memory_bytes(), disk))
+            del index
+
+    print(f"recall@{k} against exact search over {len(queries)} queries")
+    columns = list(rows_out[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows_out)) for c in columns}
+    print('  '.join(c.ljust(widths[c]) for c in columns))
+    for row in rows_out:
+        print('  '.join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Offline throughput benchmark for the crawl -> validate -> download path of Step 1.
+
+Replays recorded Google result pages (saved by setting search_settings.record_dir to
+<fixtures>/results) and serves the PDFs they link to from <fixtures>/pdfs/<host>/<path>
+through a local HTTP stand-in. Without recorded fixtures, --synthetic generates a
+reproducible corpus instead.
+
+    python benchmark_scraper.py --synthetic 20 --workers 1 4 8 --latency-ms 50
+"""
+import argparse
+import copy
+import importlib.util
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from search_providers import FixtureSearchProvider, query_slug
+
+
+def load_scraper_module():
+    """Import "Step 1 - PDFs scraper.py", whose name isn't a valid module name"""
+    path = Path(__file__).parent / "Step 1 - PDFs scraper.py"
+    spec = importlib.util.spec_from_file_location("pdf_scraper", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_synthetic_fixtures(fixtures_dir, queries, per_query, size_kb, seed=0):
+    """Write one result page per query plus the PDFs it links to"""
+    rng = random.Random(seed)
+    results_dir = fixtures_dir / "results"
+    results_dir.mkdir(parents=True, exist_ok=True)
+    for q, query in enumerate(queries):
+        links = ['<a href="https://www.google.com/preferences">Settings</a>']
+        for i in range(per_query):
+            host = f"host{rng.randrange(8)}.example.edu"
+            rel_path = f"papers/q{q}_doc{i}.pdf"
+            pdf_path = fixtures_dir / "pdfs" / host / rel_path
+            pdf_path.parent.mkdir(parents=True, exist_ok=True)
+            body = rng.randbytes(size_kb * 1024)
+            pdf_path.write_bytes(b"%PDF-1.4\n" + body + b"\n%%EOF\n")
+            links.append(f'<a href="https://{host}/{rel_path}">Result {i}</a>')
+        (results_dir / f"{query_slug(query)}.html").write_text(
+            "<html><body>" + "\n".join(links) + "</body></html>", encoding="utf-8")
+
+
+def run_once(scraper_module, base_config, fixtures_dir, workers, latency_ms, work_dir):
+    config = copy.deepcopy(base_config)
+    config['download_settings']['base_path'] = str(work_dir / "downloads")
+    config['download_settings']['max_workers'] = workers
+    config['crawl_state'] = {'path': str(work_dir / "crawl_state.db"), 'search_refresh_hours': 0}
+    # Fixture links point at 127.0.0.1, so a configured domain allow-list can't apply
+    config['link_filters']['allowed_domains'] = []
+    config_path = work_dir / "config.yaml"
+    config_path.write_text(yaml.safe_dump(config), encoding="utf-8")
+
+    provider = FixtureSearchProvider(fixtures_dir, latency_ms=latency_ms)
+    scraper = scraper_module.PDFScraper(str(config_path), search_provider=provider)
+    start = time.perf_counter()
+    scraper.run()
+    elapsed = time.perf_counter() - start
+
+    downloaded_bytes = sum(p.stat().st_size for p in (work_dir / "downloads").rglob("*.pdf"))
+    return {
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "urls_found": scraper.stats["pdfs_found"],
+        "pdfs_downloaded": scraper.stats["pdfs_downloaded"],
+        "errors": scraper.stats["errors_encountered"],
+        "urls_per_second": round(scraper.stats["pdfs_found"] / elapsed, 2) if elapsed else None,
+        "mb_per_second": round(downloaded_bytes / (1024 * 1024) / elapsed, 2) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="agent_config.yaml")
+    parser.add_argument("--fixtures", type=Path, help="directory with results/ and pdfs/ (default: synthetic)")
+    parser.add_argument("--synthetic", type=int, default=10, help="PDFs per query when generating fixtures")
+    parser.add_argument("--size-kb", type=int, default=256, help="size of each synthetic PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency-ms", type=int, default=50, help="simulated per-request server latency")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as file:
+        base_config = yaml.safe_load(file)
+    base_config['download_settings']['max_files_per_query'] = None
+
+    scraper_module = load_scraper_module()
+    with tempfile.TemporaryDirectory(prefix="scraper_bench_") as tmp:
+        tmp = Path(tmp)
+        fixtures_dir = args.fixtures
+        if fixtures_dir is None:
+            fixtures_dir = tmp / "fixtures"
+            make_synthetic_fixtures(fixtures_dir, base_config['search_queries'], args.synthetic, args.size_kb)
+
+        results = []
+        for workers in args.workers:
+            work_dir = tmp / f"run_{workers}"
+            work_dir.mkdir()
+            results.append(run_once(scraper_module, base_config, fixtures_dir, workers, args.latency_ms, work_dir))
+            print(json.dumps(results[-1]))
+
+
+if __name__ == "__main__":
+    main()
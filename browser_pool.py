@@ -0,0 +1,109 @@
+import queue
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+
+@lru_cache(maxsize=1)
+def chromedriver_path():
+    """Resolve (and download if needed) the chromedriver binary once per process"""
+    return ChromeDriverManager().install()
+
+
+class BrowserPool:
+    """Keeps a few long-lived headless Chrome drivers and lends them out to searches."""
+
+    def __init__(self, size=1, max_uses=25, headless=True):
+        self.size = max(1, int(size))
+        self.max_uses = max(1, int(max_uses))
+        self.headless = headless
+        self._idle = queue.Queue()
+        self._uses = {}
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_driver(self):
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless')  # Run in headless mode
+        driver = webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+        self._uses[id(driver)] = 0
+        return driver
+
+    def _retire(self, driver):
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def start(self):
+        """Launch every driver up front instead of on first use"""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                driver = self._create_driver()
+            except Exception:
+                # A failed launch mustn't keep its slot, or checkout waits for it forever
+                with self._lock:
+                    self._created -= 1
+                raise
+            self._idle.put(driver)
+
+    def _checkout(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self._create_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            # Every driver is busy; wait for one to come back or be retired
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    @contextmanager
+    def driver(self):
+        """Borrow a driver; it is recycled after max_uses or if the caller fails with it"""
+        driver = self._checkout()
+        healthy = False
+        try:
+            yield driver
+            healthy = True
+        finally:
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            if healthy and self._uses[id(driver)] < self.max_uses:
+                self._idle.put(driver)
+            else:
+                self._retire(driver)
+                with self._lock:
+                    self._created -= 1
+
+    def close(self):
+        """Quit all idle drivers"""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(driver)
+            with self._lock:
+                self._created -= 1
@@ -0,0 +1,181 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+CHUNK_UNITS = ("words", "tokens")
+
+# Sentence ends: ., ! or ? (optionally closed by a quote/bracket) followed by whitespace
+SENTENCE_END_RE = re.compile(r'[.!?]["\')\]]*\s+')
+# Rough sub-word token count (words, numbers and punctuation marks), close to what
+# BPE tokenizers produce for English prose without needing a model vocabulary
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Tokens before a period that don't end a sentence
+ABBREVIATIONS = frozenset({
+    'al', 'cf', 'dr', 'e.g', 'eg', 'et', 'etc', 'fig', 'i.e', 'ie', 'mr', 'mrs', 'ms',
+    'no', 'p', 'pp', 'prof', 'st', 'vol', 'vs',
+})
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping abbreviations and decimals inside their sentence."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END_RE.finditer(text):
+        before = text[start:match.start()].rsplit(None, 1)
+        last_word = before[-1].lower().lstrip('("\'[') if before else ''
+        if last_word in ABBREVIATIONS or len(last_word) == 1 and last_word.isalpha():
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    if text[start:].strip():
+        sentences.append(text[start:].strip())
+    return sentences
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN_RE.findall(text))
+
+
+@dataclass
+class _Piece:
+    """A sentence (or a slice of an over-long one) and the paragraph it came from."""
+    text: str
+    size: int
+    page_number: int
+    position: int
+    sentence: int
+    new_paragraph: bool
+
+
+@dataclass
+class Chunk:
+    """A retrieval unit: consecutive sentences from one or more paragraphs of a document."""
+    text: str
+    page_number: int
+    position: int
+    sentence: int  # Index of the first sentence (or sentence slice) within its paragraph
+    end_page_number: int
+    end_position: int
+    word_count: int
+    size: int  # In the chunker's unit
+    paragraphs: List[Tuple[int, int]] = field(default_factory=list)
+
+    def to_metadata(self) -> Dict:
+        """Provenance as flat values the vector store accepts"""
+        return {
+            'page_number': self.page_number,
+            'position': self.position,
+            'sentence': self.sentence,
+            'end_page_number': self.end_page_number,
+            'end_position': self.end_position,
+            'word_count': self.word_count,
+            'paragraphs': json.dumps(self.paragraphs),
+        }
+
+
+class Chunker:
+    """
+    Regroups a document's paragraphs into chunks of about `chunk_size` words or tokens.
+
+    Chunks end on sentence boundaries, preferring paragraph boundaries once they hold
+    at least `min_chunk_size`; short paragraphs are merged, across page breaks too.
+    Each chunk starts with up to `overlap` units of the previous chunk's trailing
+    sentences. Sentences longer than `chunk_size` are cut into word windows.
+    """
+
+    def __init__(self, chunk_size: int = 200, overlap: int = 40, min_chunk_size: int = None,
+                 unit: str = "words"):
+        if unit not in CHUNK_UNITS:
+            raise ValueError(f"Unknown chunk unit: {unit}")
+        if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+            raise ValueError("chunk_size must be positive and overlap smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.min_chunk_size = chunk_size // 2 if min_chunk_size is None else min_chunk_size
+        self.unit = unit
+        self.measure = count_words if unit == "words" else count_tokens
+
+    def _pieces(self, paragraph: Dict) -> Iterator[_Piece]:
+        index = 0
+        for sentence in split_sentences(paragraph['text']):
+            size = self.measure(sentence)
+            if size <= self.chunk_size:
+                slices = [(sentence, size)]
+            else:
+                # Cut an over-long sentence into windows that each fit in a chunk
+                words = sentence.split()
+                step = max(1, len(words) * self.chunk_size // size)
+                slices = [(' '.join(words[i:i + step]), None) for i in range(0, len(words), step)]
+            for text, size in slices:
+                yield _Piece(text, size if size is not None else self.measure(text),
+                             paragraph['page_number'], paragraph['position'], index, index == 0)
+                index += 1
+
+    def _make_chunk(self, pieces: List[_Piece]) -> Chunk:
+        parts = []
+        paragraphs = []
+        for i, piece in enumerate(pieces):
+            if i:
+                parts.append('\n\n' if piece.new_paragraph else ' ')
+            parts.append(piece.text)
+            if not paragraphs or paragraphs[-1] != [piece.page_number, piece.position]:
+                paragraphs.append([piece.page_number, piece.position])
+        text = ''.join(parts)
+        return Chunk(
+            text=text,
+            page_number=pieces[0].page_number,
+            position=pieces[0].position,
+            sentence=pieces[0].sentence,
+            end_page_number=pieces[-1].page_number,
+            end_position=pieces[-1].position,
+            word_count=count_words(text),
+            size=sum(piece.size for piece in pieces),
+            paragraphs=paragraphs,
+        )
+
+    def _overlap_tail(self, pieces: List[_Piece]) -> List[_Piece]:
+        tail, size = [], 0
+        for piece in reversed(pieces):
+            if size + piece.size > self.overlap:
+                break
+            tail.insert(0, piece)
+            size += piece.size
+        if len(tail) == len(pieces):
+            # Never carry a whole chunk over, or the next one would only repeat it
+            tail = tail[1:]
+        return tail
+
+    def chunk(self, paragraphs: Iterable[Dict]) -> Iterator[Chunk]:
+        """Chunk one document's paragraphs (dicts with text, page_number and position), in order."""
+        current: List[_Piece] = []
+        size = 0
+        fresh = 0  # Units in `current` that aren't overlap from the previous chunk
+
+        for paragraph in paragraphs:
+            paragraph_size = self.measure(paragraph['text'])
+            if fresh and fresh >= self.min_chunk_size and size + paragraph_size > self.chunk_size:
+                # Break at the paragraph boundary rather than mid-paragraph
+                yield self._make_chunk(current)
+                current = self._overlap_tail(current)
+                size = sum(piece.size for piece in current)
+                fresh = 0
+
+            for piece in self._pieces(paragraph):
+                if fresh and size + piece.size > self.chunk_size:
+                    yield self._make_chunk(current)
+                    current = self._overlap_tail(current)
+                    size = sum(p.size for p in current)
+                    fresh = 0
+                    if size + piece.size > self.chunk_size:
+                        current, size = [], 0
+                current.append(piece)
+                size += piece.size
+                fresh += piece.size
+
+        if fresh:
+            yield self._make_chunk(current)
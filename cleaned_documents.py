@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger('cleaned_documents')
+
+CLEANING_MANIFEST = "manifest.json"  # Written by Step 2 next to the documents
+DEDUP_FILE = "dedup.json"  # Written by corpus_dedup.py next to the documents
+NON_DOCUMENT_FILES = (CLEANING_MANIFEST, DEDUP_FILE)
+DOCUMENT_PATTERNS = ("*.jsonl", "*.jsonl.gz", "*.json")
+
+
+def load_document(json_path: Path) -> Dict:
+    """Load a processed document from JSON."""
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Failed to load document {json_path}: {e}")
+        return None
+
+
+def open_document_stream(doc_path: Path) -> Optional[Tuple[Dict, Iterator[Dict]]]:
+    """
+    Open a cleaned document as (header, paragraph iterator).
+
+    JSON Lines files (.jsonl / .jsonl.gz) are read one paragraph at a time;
+    legacy indented .json files are loaded whole.
+    """
+    name = doc_path.name
+    if not (name.endswith(".jsonl") or name.endswith(".jsonl.gz")):
+        doc = load_document(doc_path)
+        if not doc:
+            return None
+        return doc, iter(doc.get('paragraphs', []))
+
+    opener = gzip.open if name.endswith(".gz") else open
+    try:
+        f = opener(doc_path, 'rt', encoding='utf-8')
+        header = json.loads(f.readline())
+    except Exception as e:
+        logger.error(f"Failed to load document {doc_path}: {e}")
+        return None
+
+    def paragraphs() -> Iterator[Dict]:
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, paragraphs()
+
+
+def read_header(doc_path: Path) -> Optional[Dict]:
+    """A cleaned document's header (filename, processed_date, ...) without reading its paragraphs."""
+    name = doc_path.name
+    if not (name.endswith(".jsonl") or name.endswith(".jsonl.gz")):
+        doc = load_document(doc_path)
+        return {key: value for key, value in doc.items() if key != 'paragraphs'} if doc else None
+    opener = gzip.open if name.endswith(".gz") else open
+    try:
+        with opener(doc_path, 'rt', encoding='utf-8') as f:
+            return json.loads(f.readline())
+    except Exception as e:
+        logger.error(f"Failed to load document {doc_path}: {e}")
+        return None
+
+
+def find_document_files(directory: Path) -> List[Path]:
+    """Return every cleaned document in the directory, skipping Step 2's manifest and the dedup list."""
+    files = []
+    for pattern in DOCUMENT_PATTERNS:
+        files.extend(p for p in directory.glob(pattern) if p.name not in NON_DOCUMENT_FILES)
+    return sorted(files)
+
+
+def load_dedup_drops(directory: Path) -> Dict[str, Dict]:
+    """
+    Load the paragraphs corpus_dedup.py marked for dropping, keyed by document filename.
+
+    Returns {} when the directory has no dedup list.
+    """
+    path = directory / DEDUP_FILE
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            documents = json.load(f).get('documents', {})
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable dedup list {path}: {e}")
+        return {}
+    return {
+        filename: {
+            'processed_date': entry.get('processed_date'),
+            'dropped': {(page, position) for page, position, _ in entry.get('dropped', [])}
+        }
+        for filename, entry in documents.items()
+    }
+
+
+def dropped_positions(drops: Dict[str, Dict], header: Dict) -> Set[Tuple[int, int]]:
+    """(page_number, position) pairs to skip in a document, or none if its drop list is stale."""
+    entry = drops.get(header.get('filename'))
+    if not entry:
+        return set()
+    if entry['processed_date'] != header.get('processed_date'):
+        logger.warning(f"Dedup list is older than {header.get('filename')}; "
+                       f"re-run corpus_dedup.py to drop its duplicates")
+        return set()
+    return entry['dropped']
+
+
+def load_source_hashes(directory: Path) -> Dict[str, str]:
+    """SHA-256 of each source PDF, keyed by its path, from Step 2's cleaning manifest."""
+    path = directory / CLEANING_MANIFEST
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            files = json.load(f).get('files', {})
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+    return {source: entry['sha256'] for source, entry in files.items() if entry.get('sha256')}
+
+
+def source_hash(header: Dict, hashes: Dict[str, str]) -> str:
+    """
+    SHA-256 identifying a document's source PDF: from the manifest, else hashed from
+    the PDF itself, else (source gone) from its filename.
+    """
+    key = header.get('path') or header['filename']
+    if key in hashes:
+        return hashes[key]
+    digest = hashlib.sha256()
+    source = Path(header.get('path') or '')
+    if source.is_file():
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    else:
+        digest.update(header['filename'].encode('utf-8'))
+    hashes[key] = digest.hexdigest()
+    return hashes[key]
@@ -0,0 +1,364 @@
+"""
+Compact retrieval index for the pdf_paragraphs collection.
+
+Keeps only quantized vectors in memory (int8 scalar quantization, 4x smaller than
+float32, or product quantization, one byte per subspace), scores every vector
+against the query with them, and re-ranks the best candidates exactly with the
+full-precision vectors, which stay on disk in a memory-mapped file. The web app's
+TherapistBot uses it instead of Chroma's in-memory HNSW index when one is built
+for the current collection contents:
+
+    python compact_index.py --chroma-dir web_app/data/chroma [--quantization pq]
+
+Re-run it after Step 3 changes the collection; a stale index is ignored. The index
+records when Step 3 last saved its index manifest and the collection's size, so
+checking it doesn't read the collection's ids.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from index_manifest import MANIFEST_NAME
+
+logger = logging.getLogger('compact_index')
+
+QUANTIZATIONS = ("int8", "pq")
+COMPACT_INDEX_DIR = "compact_index"  # Inside the Chroma directory
+PQ_SUBSPACES = 64
+PQ_CENTROIDS = 256
+PQ_TRAINING_SAMPLE = 20000
+PQ_ITERATIONS = 15
+RERANK_FACTOR = 10  # Candidates re-ranked exactly per requested result
+SCORE_CHUNK_BYTES = 16 * 1024 * 1024  # Bounds the temporary float32 copies made while scoring
+PAGE_SIZE = 1000  # Vectors read from the collection per call
+
+
+def ids_fingerprint(ids) -> str:
+    """Identifies a collection's contents: ids are content-derived, so equal ids mean equal vectors."""
+    digest = hashlib.sha256()
+    for i in sorted(ids):
+        digest.update(i.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def chunk_rows(dim: int) -> int:
+    return max(1, SCORE_CHUNK_BYTES // (4 * dim))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+def train_codebooks(vectors: np.ndarray, subspaces: int, centroids: int = PQ_CENTROIDS,
+                    iterations: int = PQ_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """k-means codebooks per subspace: (subspaces, centroids, dim // subspaces)"""
+    rng = np.random.RandomState(seed)
+    n, dim = vectors.shape
+    sub_dim = dim // subspaces
+    centroids = min(centroids, n)
+    codebooks = np.empty((subspaces, centroids, sub_dim), dtype=np.float32)
+    for m in range(subspaces):
+        data = vectors[:, m * sub_dim:(m + 1) * sub_dim]
+        book = data[rng.choice(n, centroids, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = _nearest(data, book)
+            counts = np.bincount(assignment, minlength=centroids)
+            sums = np.zeros_like(book)
+            np.add.at(sums, assignment, data)
+            filled = counts > 0
+            book[filled] = sums[filled] / counts[filled, None]
+            # Re-seed empty clusters with random points
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                book[empty] = data[rng.choice(n, len(empty), replace=False)]
+        codebooks[m] = book
+    return codebooks
+
+
+def _nearest(data: np.ndarray, book: np.ndarray) -> np.ndarray:
+    distances = (data ** 2).sum(axis=1)[:, None] - 2 * data @ book.T + (book ** 2).sum(axis=1)[None, :]
+    return distances.argmin(axis=1)
+
+
+class CompactIndex:
+    """
+    Quantized vectors in memory plus memory-mapped float32 vectors for re-ranking.
+
+    Vectors are L2-normalized, so scores are cosine similarities.
+    """
+
+    def __init__(self, ids: List[str], quantization: str, codes: np.ndarray, vectors: Optional[np.ndarray],
+                 scale: Optional[np.ndarray] = None, codebooks: Optional[np.ndarray] = None,
+                 meta: Optional[Dict] = None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.ids = ids
+        self.quantization = quantization
+        self.codes = codes
+        self.vectors = vectors
+        self.scale = scale
+        self.codebooks = codebooks
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, ids: List[str], vectors: np.ndarray, quantization: str = "int8",
+              subspaces: int = PQ_SUBSPACES, meta: Optional[Dict] = None) -> "CompactIndex":
+        """Quantize (normalized) vectors; `vectors` may be a memory-mapped array."""
+        dim = vectors.shape[1]
+        step = chunk_rows(dim)
+        scale = codebooks = None
+        if quantization == "int8":
+            # Symmetric per-dimension scale, so the largest component maps to 127
+            max_abs = np.zeros(dim, dtype=np.float32)
+            for start in range(0, len(ids), step):
+                max_abs = np.maximum(max_abs, np.abs(vectors[start:start + step]).max(axis=0))
+            scale = np.maximum(max_abs, 1e-12) / 127
+            codes = np.empty((len(ids), dim), dtype=np.int8)
+            for start in range(0, len(ids), step):
+                codes[start:start + step] = np.round(vectors[start:start + step] / scale)
+        elif quantization == "pq":
+            if dim % subspaces:
+                raise ValueError(f"Dimension {dim} isn't divisible into {subspaces} subspaces")
+            rng = np.random.RandomState(0)
+            sample = rng.choice(len(ids), min(len(ids), PQ_TRAINING_SAMPLE), replace=False)
+            codebooks = train_codebooks(np.asarray(vectors[np.sort(sample)]), subspaces)
+            sub_dim = dim // subspaces
+            codes = np.empty((len(ids), subspaces), dtype=np.uint8)
+            for start in range(0, len(ids), step):
+                block = np.asarray(vectors[start:start + step])
+                for m in range(subspaces):
+                    codes[start:start + step, m] = _nearest(block[:, m * sub_dim:(m + 1) * sub_dim],
+                                                                   codebooks[m])
+        else:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        return cls(list(ids), quantization, codes, vectors, scale, codebooks, meta)
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of the (normalized) query to every vector"""
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        step = chunk_rows(self.codes.shape[1])
+        if self.quantization == "int8":
+            scaled = query * self.scale
+            for start in range(0, len(self.ids), step):
+                scores[start:start + step] = self.codes[start:start + step].astype(np.float32) @ scaled
+        else:
+            subspaces, _, sub_dim = self.codebooks.shape
+            # Asymmetric distance: the query's similarity to every centroid, summed per code
+            table = np.einsum('mcd,md->mc', self.codebooks, query.reshape(subspaces, sub_dim))
+            for start in range(0, len(self.ids), step):
+                block = self.codes[start:start + step]
+                scores[start:start + step] = table[np.arange(subspaces), block].sum(axis=1)
+        return scores
+
+    def search(self, query, k: int, rerank: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        The k (id, score) pairs closest to the query. The best `rerank` candidates
+        (RERANK_FACTOR * k by default; 0 to skip) are re-scored with the exact vectors.
+        """
+        query = normalize_rows(query)
+        k = min(k, len(self.ids))
+        if not k:
+            return []
+        scores = self.approximate_scores(query)
+        if rerank is None:
+            rerank = RERANK_FACTOR * k
+        exact = self.vectors is not None and rerank > 0
+        candidates = min(max(k, rerank), len(self.ids)) if exact else k
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        if exact:
+            rows = np.sort(top)  # Sequential reads from the memory map
+            exact_scores = np.asarray(self.vectors[rows]) @ query
+            return [(self.ids[rows[i]], float(exact_scores[i])) for i in np.argsort(-exact_scores)[:k]]
+        return [(self.ids[row], float(scores[row])) for row in top[np.argsort(-scores[top])]]
+
+    def memory_bytes(self) -> int:
+        """Bytes held in RAM: the codes and quantizer (the exact vectors are memory-mapped)"""
+        size = self.codes.nbytes + sum(len(i) for i in self.ids)
+        for array in (self.scale, self.codebooks):
+            if array is not None:
+                size += array.nbytes
+        return size
+
+    def save(self, directory: Path) -> None:
+        """Write the index to `directory`, replacing a previous one atomically"""
+        tmp_dir = directory.with_name(directory.name + ".tmp")
+        # build_from_collection streams the exact vectors straight into the new directory
+        vectors_file = getattr(self.vectors, 'filename', None)
+        in_place = vectors_file is not None and Path(vectors_file).resolve().parent == tmp_dir.resolve()
+        if not in_place:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        np.save(tmp_dir / "codes.npy", self.codes)
+        if self.scale is not None:
+            np.save(tmp_dir / "scale.npy", self.scale)
+        if self.codebooks is not None:
+            np.save(tmp_dir / "codebooks.npy", self.codebooks)
+        if in_place:
+            # Close the map before the directory is moved
+            self.vectors.flush()
+            self.vectors = None
+        elif self.vectors is not None:
+            np.save(tmp_dir / "vectors.npy", np.asarray(self.vectors, dtype=np.float32))
+        with open(tmp_dir / "ids.json", 'w', encoding='utf-8') as f:
+            json.dump(self.ids, f)
+        with open(tmp_dir / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump({**self.meta, 'quantization': self.quantization, 'count': len(self.ids)}, f, indent=2)
+        if directory.exists():
+            old_dir = directory.with_name(directory.name + ".old")
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(directory, old_dir)
+            os.replace(tmp_dir, directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, directory)
+        if in_place:
+            self.vectors = np.load(directory / "vectors.npy", mmap_mode='r')
+
+    @classmethod
+    def load(cls, directory: Path) -> "CompactIndex":
+        with open(directory / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(directory / "ids.json", 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+        optional = {name: np.load(directory / f"{name}.npy") for name in ("scale", "codebooks")
+                    if (directory / f"{name}.npy").exists()}
+        vectors_path = directory / "vectors.npy"
+        vectors = np.load(vectors_path, mmap_mode='r') if vectors_path.exists() else None
+        return cls(ids, meta['quantization'], np.load(directory / "codes.npy"), vectors, meta=meta, **optional)
+
+
+def read_collection_vectors(collection, path: Path, normalize: bool = True) -> Tuple[List[str], np.ndarray]:
+    """Stream a Chroma collection's (normalized) vectors into a memory-mapped .npy file."""
+    count = collection.count()
+    ids: List[str] = []
+    vectors = None
+    offset = 0
+    while offset < count:
+        page = collection.get(limit=PAGE_SIZE, offset=offset, include=['embeddings'])
+        if not len(page['ids']):
+            break
+        block = normalize_rows(page['embeddings']) if normalize else np.asarray(page['embeddings'], dtype=np.float32)
+        if vectors is None:
+            vectors = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(count, block.shape[1]))
+        vectors[len(ids):len(ids) + len(block)] = block
+        ids.extend(page['ids'])
+        offset += len(page['ids'])
+    if vectors is None:
+        raise ValueError("The collection is empty")
+    if len(ids) != count:
+        raise RuntimeError(f"Collection changed while reading it ({len(ids)} of {count} vectors read)")
+    return ids, vectors
+
+
+def collection_signature(collection, manifest_path: Path) -> Optional[Dict]:
+    """
+    A cheap stand-in for the collection's ids: when Step 3 last saved its index manifest
+    (kept next to the Chroma files) and the vector count. None without a manifest.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            updated = json.load(f).get('updated')
+    except (OSError, ValueError):
+        return None
+    if not updated:
+        return None
+    return {'index_manifest_updated': updated, 'count': collection.count()}
+
+
+def build_from_collection(collection, directory: Path, quantization: str = "int8",
+                          subspaces: int = PQ_SUBSPACES, embedding_model: Optional[str] = None) -> CompactIndex:
+    """Build and save the compact index of a Chroma collection"""
+    start = time.perf_counter()
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    # Read before the vectors: a Step 3 run while they are read leaves the index stale
+    signature = collection_signature(collection, directory.parent / MANIFEST_NAME)
+    ids, vectors = read_collection_vectors(collection, tmp_dir / "vectors.npy")
+    meta = {
+        'collection': collection.name,
+        'embedding_model': embedding_model,
+        'collection_signature': signature,
+        'ids_fingerprint': ids_fingerprint(ids),
+        'dimension': vectors.shape[1],
+        'built': datetime.now().isoformat(),
+    }
+    if quantization == "pq":
+        meta['subspaces'] = subspaces
+    index = CompactIndex.build(ids, vectors, quantization, subspaces, meta)
+    del vectors
+    index.save(directory)
+    logger.info(f"Built {quantization} index of {len(ids)} vectors in {time.perf_counter() - start:.1f}s "
+                f"({index.memory_bytes() / 1024 / 1024:.1f} MB in memory)")
+    return index
+
+
+def load_if_current(directory: Path, collection, embedding_model: Optional[str] = None) -> Optional[CompactIndex]:
+    """
+    The compact index in `directory` if it holds exactly the collection's vectors, else
+    None. A re-embedded collection keeps its ids, so the embedding model must match too.
+
+    An index built next to Step 3's index manifest is current while the manifest and the
+    collection's size are as they were when it was built; otherwise every id is compared.
+    """
+    if not (directory / "meta.json").exists():
+        return None
+    try:
+        index = CompactIndex.load(directory)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable compact index {directory}: {e}")
+        return None
+    if embedding_model and index.meta.get('embedding_model') != embedding_model:
+        logger.warning(f"Compact index {directory} was built from {index.meta.get('embedding_model')} vectors; "
+                       f"rebuild it with compact_index.py")
+        return None
+    recorded = index.meta.get('collection_signature')
+    if recorded is not None:
+        if collection_signature(collection, directory.parent / MANIFEST_NAME) != recorded:
+            logger.warning(f"Compact index {directory} is out of date; rebuild it with compact_index.py")
+            return None
+        return index
+    ids = []
+    offset = 0
+    while True:
+        page = collection.get(limit=PAGE_SIZE * 10, offset=offset, include=[])['ids']
+        ids.extend(page)
+        if len(page) < PAGE_SIZE * 10:
+            break
+        offset += len(page)
+    if index.meta.get('ids_fingerprint') != ids_fingerprint(ids):
+        logger.warning(f"Compact index {directory} is out of date; rebuild it with compact_index.py")
+        return None
+    return index
+
+
+def main():
+    import chromadb
+    from embedding_models import collection_model
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chroma-dir", type=Path, default=Path("chroma_db"))
+    parser.add_argument("--collection", default="pdf_paragraphs")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="int8")
+    parser.add_argument("--subspaces", type=int, default=PQ_SUBSPACES, help="product quantization subspaces")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    collection = chromadb.PersistentClient(path=str(args.chroma_dir)).get_collection(args.collection)
+    build_from_collection(collection, args.chroma_dir / COMPACT_INDEX_DIR, args.quantization, args.subspaces,
+                          collection_model(collection.metadata))
+
+
+if __name__ == "__main__":
+    main()
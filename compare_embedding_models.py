@@ -0,0 +1,148 @@
+"""
+Compare embedding models on retrieval quality and latency over the cleaned corpus.
+
+Samples paragraphs from the cleaned documents and takes one sentence out of each as
+a query; the rest of the paragraph is indexed, and it is the query's relevant hit.
+For every model the paragraphs are embedded, the queries are searched in an exact
+cosine index, and the script reports:
+
+- recall@1, recall@k and MRR of the held-out sentences;
+- overlap@k: the share of the first model's top k that the model also returns;
+- the vector dimension and the index size;
+- documents/s when embedding the paragraphs, and p50/p95 single-query latency.
+
+    python compare_embedding_models.py --models ollama:mistral-nemo:12b-instruct-2407-q2_K \\
+        sentence-transformers:all-MiniLM-L6-v2 --sample 1000
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from chunker import count_words, split_sentences
+from cleaned_documents import find_document_files, open_document_stream
+from embedding_models import LEGACY_EMBEDDING_MODEL, SMALL_EMBEDDING_MODEL, load_embedder, normalize_spec
+
+logger = logging.getLogger('compare_embedding_models')
+
+SAMPLE_SIZE = 1000
+TOP_K = 5
+MIN_QUERY_WORDS = 6
+BATCH_SIZE = 32
+
+
+def sample_queries(directory: Path, sample_size: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """(query sentence, paragraph without it) pairs, reservoir-sampled over the corpus."""
+    rng = random.Random(seed)
+    sample: List[Tuple[str, str]] = []
+    seen = 0
+    for doc_path in find_document_files(directory):
+        opened = open_document_stream(doc_path)
+        if not opened:
+            continue
+        for paragraph in opened[1]:
+            sentences = split_sentences(paragraph['text'])
+            candidates = [i for i, s in enumerate(sentences) if count_words(s) >= MIN_QUERY_WORDS]
+            if len(sentences) < 3 or not candidates:
+                continue
+            seen += 1
+            slot = len(sample) if len(sample) < sample_size else rng.randrange(seen)
+            if slot < sample_size:
+                i = rng.choice(candidates)
+                pair = (sentences[i], ' '.join(sentences[:i] + sentences[i + 1:]))
+                if slot == len(sample):
+                    sample.append(pair)
+                else:
+                    sample[slot] = pair
+    return sample
+
+
+def normalized(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def evaluate(spec: str, queries: List[str], documents: List[str], k: int,
+             reference: np.ndarray = None) -> Tuple[Dict, np.ndarray]:
+    """Metrics for one model, and its top-k document indices per query."""
+    embedder = load_embedder(spec)
+    embedder.embed_documents(documents[:1])  # Load the model before timing
+
+    start = time.perf_counter()
+    doc_vectors = []
+    for i in range(0, len(documents), BATCH_SIZE):
+        doc_vectors.extend(embedder.embed_documents(documents[i:i + BATCH_SIZE]))
+    embed_seconds = time.perf_counter() - start
+    doc_matrix = normalized(doc_vectors)
+
+    query_vectors, latencies = [], []
+    for query in queries:
+        query_start = time.perf_counter()
+        query_vectors.append(embedder.embed_query(query))
+        latencies.append(time.perf_counter() - query_start)
+    order = np.argsort(-(normalized(query_vectors) @ doc_matrix.T), axis=1)
+    top = order[:, :k]
+
+    # Query i was taken out of document i
+    relevant = np.arange(len(queries))[:, None]
+    ranks = np.argmax(order == relevant, axis=1) + 1
+    metrics = {
+        'model': spec,
+        'dimension': doc_matrix.shape[1],
+        'index_mb': round(doc_matrix.nbytes / 1024 / 1024, 2),
+        'recall@1': round(float(np.mean(top[:, 0] == relevant[:, 0])), 3),
+        f'recall@{k}': round(float(np.mean((top == relevant).any(axis=1))), 3),
+        'mrr': round(float(np.mean(1.0 / ranks)), 3),
+        'docs_per_second': round(len(documents) / embed_seconds, 1),
+        'query_ms_p50': round(float(np.percentile(latencies, 50)) * 1000, 1),
+        'query_ms_p95': round(float(np.percentile(latencies, 95)) * 1000, 1),
+    }
+    if reference is not None:
+        overlap = [len(set(a) & set(b)) / k for a, b in zip(top, reference)]
+        metrics[f'overlap@{k}'] = round(float(np.mean(overlap)), 3)
+    return metrics, top
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, default=Path("cleaned_pdfs"))
+    parser.add_argument("--models", nargs="+", default=[LEGACY_EMBEDDING_MODEL, SMALL_EMBEDDING_MODEL],
+                        help="model specs; the first one is the reference for overlap@k")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE, help="paragraphs (and queries) to sample")
+    parser.add_argument("-k", type=int, default=TOP_K)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    pairs = sample_queries(args.input, args.sample, args.seed)
+    if not pairs:
+        raise SystemExit(f"No paragraphs with enough sentences found in {args.input}")
+    queries, documents = [q for q, _ in pairs], [d for _, d in pairs]
+    logger.info(f"Sampled {len(pairs)} paragraphs")
+
+    results, reference = [], None
+    for spec in args.models:
+        logger.info(f"Evaluating {normalize_spec(spec)}")
+        metrics, top = evaluate(normalize_spec(spec), queries, documents, args.k, reference)
+        if reference is None:
+            reference = top
+        results.append(metrics)
+
+    columns = list(dict.fromkeys(key for metrics in results for key in metrics))
+    widths = {c: max(len(c), *(len(str(m.get(c, ''))) for m in results)) for c in columns}
+    print('  '.join(c.ljust(widths[c]) for c in columns))
+    for metrics in results:
+        print('  '.join(str(metrics.get(c, '')).ljust(widths[c]) for c in columns))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'sample': len(pairs), 'k': args.k, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Corpus-level duplicate and boilerplate detection between Step 2 and Step 3.
+
+Reads every cleaned document, groups paragraphs that are exact duplicates (after
+folding case, punctuation and digits) or near duplicates (MinHash + LSH over word
+shingles), and writes <cleaned dir>/dedup.json listing the paragraphs Step 3
+should skip:
+
+- boilerplate: the group occurs in at least --boilerplate-min-documents documents
+  or on at least --boilerplate-min-pages pages (headers, footers, copyright and
+  disclaimer blocks) - every occurrence is dropped;
+- duplicate / near_duplicate: any other repeat - the first occurrence is kept.
+
+The cleaned documents themselves are not modified, so the stage can be re-run
+with different thresholds at any time.
+
+    python corpus_dedup.py --input cleaned_pdfs
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import zlib
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from cleaned_documents import DEDUP_FILE, find_document_files, open_document_stream
+
+logger = logging.getLogger('corpus_dedup')
+
+NUM_PERM = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 5
+NEAR_DUPLICATE_THRESHOLD = 0.8
+BOILERPLATE_MIN_DOCUMENTS = 5
+BOILERPLATE_MIN_PAGES = 5
+
+# Largest prime below 2**32: a * h + b stays below 2**64 for 32-bit a, b and h
+_MERSENNE_PRIME = np.uint64(4294967291)
+
+NON_WORD_RE = re.compile(r'[^\w]+')
+DIGITS_RE = re.compile(r'\d+')
+
+
+def normalized_words(text: str) -> List[str]:
+    """Lowercase words with digit runs folded to '0', so "Page 3 of 40" matches "Page 4 of 40"."""
+    return DIGITS_RE.sub('0', NON_WORD_RE.sub(' ', text.lower())).split()
+
+
+class MinHasher:
+    """MinHash signatures over word shingles, using num_perm universal hash functions."""
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.randint(1, 2 ** 32 - 5, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.randint(0, 2 ** 32 - 5, size=num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, words: List[str]) -> np.ndarray:
+        k = min(self.shingle_size, len(words)) or 1
+        shingles = {' '.join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))[None, :]
+        return ((self.a * hashes + self.b) % _MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+
+class LSHIndex:
+    """Banded locality-sensitive hashing: signatures sharing any band are candidate pairs."""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.rows = num_perm // bands
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+
+    def _bands(self, signature: np.ndarray):
+        for band, buckets in enumerate(self.buckets):
+            yield buckets, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature: np.ndarray) -> List[int]:
+        """Keys sharing at least one band with the signature"""
+        candidates = set()
+        for buckets, band_key in self._bands(signature):
+            candidates.update(buckets.get(band_key, ()))
+        return sorted(candidates)
+
+    def insert(self, key: int, signature: np.ndarray, represented=frozenset()) -> None:
+        """
+        Add a signature. Buckets that already hold a key from `represented` (the
+        key's own duplicate group) aren't extended, so large groups such as a
+        footer on every page don't make later queries quadratic.
+        """
+        for buckets, band_key in self._bands(signature):
+            bucket = buckets.setdefault(band_key, [])
+            if not represented or represented.isdisjoint(bucket):
+                bucket.append(key)
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent: List[int] = []
+
+    def add(self) -> int:
+        self.parent.append(len(self.parent))
+        return len(self.parent) - 1
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int) -> None:
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            # The earlier group keeps its root, so the first occurrence stays the representative
+            self.parent[max(x, y)] = min(x, y)
+
+
+def find_duplicates(
+    document_files: List[Path],
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    num_perm: int = NUM_PERM,
+    bands: int = LSH_BANDS,
+    shingle_size: int = SHINGLE_SIZE,
+    boilerplate_min_documents: int = BOILERPLATE_MIN_DOCUMENTS,
+    boilerplate_min_pages: int = BOILERPLATE_MIN_PAGES
+) -> Dict:
+    """
+    Scan the corpus and return the dedup list: {'documents': {filename: {...}}, 'stats': {...}}.
+
+    Paragraphs are streamed; only one signature per distinct normalized text is kept.
+    """
+    hasher = MinHasher(num_perm, shingle_size)
+    index = LSHIndex(num_perm, bands)
+    groups = _UnionFind()
+    text_ids: Dict[bytes, int] = {}
+    signatures: List[np.ndarray] = []
+    # One (document, page_number, position, text_id) row per paragraph, in corpus order
+    occurrences = []
+    documents: Dict[str, Dict] = {}
+
+    for doc_path in document_files:
+        opened = open_document_stream(doc_path)
+        if not opened:
+            continue
+        header, paragraphs = opened
+        filename = header['filename']
+        documents.setdefault(filename, {'processed_date': header.get('processed_date'), 'dropped': []})
+
+        for paragraph in paragraphs:
+            words = normalized_words(paragraph['text'])
+            key = hashlib.blake2b(' '.join(words).encode('utf-8'), digest_size=8).digest()
+            text_id = text_ids.get(key)
+            if text_id is None:
+                text_id = text_ids[key] = groups.add()
+                signature = hasher.signature(words)
+                signatures.append(signature)
+                candidates = index.query(signature)
+                for other in candidates:
+                    if groups.find(other) != groups.find(text_id) and \
+                            np.mean(signatures[other] == signature) >= threshold:
+                        groups.union(text_id, other)
+                root = groups.find(text_id)
+                index.insert(text_id, signature, {c for c in candidates if groups.find(c) == root})
+            occurrences.append((filename, paragraph['page_number'], paragraph['position'], text_id))
+
+    # How widely each group is spread over documents and pages
+    group_documents: Dict[int, set] = {}
+    group_pages: Dict[int, set] = {}
+    for filename, page_number, _, text_id in occurrences:
+        group = groups.find(text_id)
+        group_documents.setdefault(group, set()).add(filename)
+        group_pages.setdefault(group, set()).add((filename, page_number))
+    boilerplate = {group for group in group_documents
+                   if len(group_documents[group]) >= boilerplate_min_documents
+                   or len(group_pages[group]) >= boilerplate_min_pages}
+
+    kept_groups = {}
+    reasons = Counter()
+    for filename, page_number, position, text_id in occurrences:
+        group = groups.find(text_id)
+        if group in boilerplate:
+            reason = 'boilerplate'
+        elif group in kept_groups:
+            reason = 'duplicate' if kept_groups[group] == text_id else 'near_duplicate'
+        else:
+            kept_groups[group] = text_id
+            continue
+        reasons[reason] += 1
+        documents[filename]['dropped'].append([page_number, position, reason])
+
+    return {
+        'documents': {name: doc for name, doc in documents.items() if doc['dropped']},
+        'stats': {
+            'documents': len(documents),
+            'paragraphs': len(occurrences),
+            'distinct_texts': len(text_ids),
+            'kept': len(occurrences) - sum(reasons.values()),
+            'boilerplate_groups': len(boilerplate),
+            **{f'dropped_{reason}': count for reason, count in sorted(reasons.items())}
+        }
+    }
+
+
+def save_dedup_list(result: Dict, output_path: Path, settings: Optional[Dict] = None) -> None:
+    """Write the dedup list atomically"""
+    tmp_path = output_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'created': datetime.now().isoformat(), 'settings': settings or {}, **result}, f)
+    os.replace(tmp_path, output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, default=Path("cleaned_pdfs"))
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                        help="estimated Jaccard similarity above which paragraphs are near duplicates")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--bands", type=int, default=LSH_BANDS)
+    parser.add_argument("--shingle-size", type=int, default=SHINGLE_SIZE, help="words per shingle")
+    parser.add_argument("--boilerplate-min-documents", type=int, default=BOILERPLATE_MIN_DOCUMENTS)
+    parser.add_argument("--boilerplate-min-pages", type=int, default=BOILERPLATE_MIN_PAGES)
+    parser.add_argument("--dry-run", action="store_true", help="report the counts without writing the list")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    document_files = find_document_files(args.input)
+    if not document_files:
+        raise SystemExit(f"No cleaned documents found in {args.input}")
+
+    settings = {
+        'threshold': args.threshold,
+        'num_perm': args.num_perm,
+        'bands': args.bands,
+        'shingle_size': args.shingle_size,
+        'boilerplate_min_documents': args.boilerplate_min_documents,
+        'boilerplate_min_pages': args.boilerplate_min_pages,
+    }
+    result = find_duplicates(document_files, **settings)
+    logger.info(f"Dedup stats: {json.dumps(result['stats'])}")
+    if not args.dry_run:
+        save_dedup_list(result, args.input / DEDUP_FILE, settings)
+        logger.info(f"Dedup list written to {args.input / DEDUP_FILE}")
+
+
+if __name__ == "__main__":
+    main()
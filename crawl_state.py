@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+FOUND = "found"
+VALIDATED = "validated"
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+
+
+class CrawlFrontier:
+    """SQLite-backed record of searched queries and the status of every URL seen by the scraper."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            has_query_urls = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'query_urls'").fetchone()
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS queries (
+                    query TEXT PRIMARY KEY,
+                    searched_at TEXT NOT NULL,
+                    url_count INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    query TEXT,
+                    category TEXT,
+                    status TEXT NOT NULL,
+                    size INTEGER,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    path TEXT,
+                    error TEXT,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS urls_query ON urls (query);
+                -- Every query's results, in result order; urls.query only keeps the first query
+                CREATE TABLE IF NOT EXISTS query_urls (
+                    query TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (query, url)
+                );
+                CREATE INDEX IF NOT EXISTS urls_content_hash ON urls (content_hash);
+                CREATE TABLE IF NOT EXISTS documents (
+                    content_hash TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at TEXT NOT NULL
+                );
+                """
+            )
+            if not has_query_urls:
+                # Databases from before the table: each URL under the query that found it first
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO query_urls (query, url, position) "
+                    "SELECT query, url, rowid FROM urls WHERE query IS NOT NULL"
+                )
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _fetch(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat()
+
+    def query_is_fresh(self, query, max_age_hours):
+        """Return True if the query was searched less than max_age_hours ago"""
+        rows = self._fetch("SELECT searched_at FROM queries WHERE query = ?", (query,))
+        if not rows:
+            return False
+        searched_at = datetime.fromisoformat(rows[0]["searched_at"])
+        return datetime.now() - searched_at < timedelta(hours=max_age_hours)
+
+    def record_search(self, query, category, urls):
+        """Store the URLs returned by a search; existing URL records keep their status"""
+        now = self._now()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, query, category, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(url, query, category, FOUND, now) for url in urls],
+            )
+            # A repeated search replaces the query's results; other queries keep theirs
+            self._conn.execute("DELETE FROM query_urls WHERE query = ?", (query,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO query_urls (query, url, position) VALUES (?, ?, ?)",
+                [(query, url, position) for position, url in enumerate(urls)],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries (query, searched_at, url_count) VALUES (?, ?, ?)",
+                (query, now, len(urls)),
+            )
+
+    def urls_for_query(self, query):
+        """Return the URLs previously recorded for a query, in result order"""
+        rows = self._fetch("SELECT url FROM query_urls WHERE query = ? ORDER BY position", (query,))
+        return [row["url"] for row in rows]
+
+    def get(self, url):
+        """Return the stored record for a URL as a dict, or None"""
+        rows = self._fetch("SELECT * FROM urls WHERE url = ?", (url,))
+        return dict(rows[0]) if rows else None
+
+    def mark_validated(self, url, size=None, etag=None, last_modified=None):
+        self._execute(
+            "UPDATE urls SET status = ?, size = ?, etag = ?, last_modified = ?, error = NULL, "
+            "updated_at = ? WHERE url = ?",
+            (VALIDATED, size, etag, last_modified, self._now(), url),
+        )
+
+    def mark_downloaded(self, url, path, size, content_hash, etag=None, last_modified=None):
+        self._execute(
+            "UPDATE urls SET status = ?, path = ?, size = ?, content_hash = ?, etag = ?, "
+            "last_modified = ?, error = NULL, updated_at = ? WHERE url = ?",
+            (DOWNLOADED, str(path), size, content_hash, etag, last_modified, self._now(), url),
+        )
+
+    def mark_failed(self, url, error):
+        self._execute(
+            "UPDATE urls SET status = ?, error = ?, updated_at = ? WHERE url = ?",
+            (FAILED, str(error), self._now(), url),
+        )
+
+    def get_document(self, content_hash):
+        """Return the stored document for a digest as a dict, or None"""
+        rows = self._fetch("SELECT * FROM documents WHERE content_hash = ?", (content_hash,))
+        return dict(rows[0]) if rows else None
+
+    def add_document(self, content_hash, path, size):
+        self._execute(
+            "INSERT OR REPLACE INTO documents (content_hash, path, size, stored_at) VALUES (?, ?, ?, ?)",
+            (content_hash, str(path), size, self._now()),
+        )
+
+    def export_manifest(self, manifest_path):
+        """Write a JSON manifest mapping each stored digest to its file, URLs and categories"""
+        documents = {
+            row["content_hash"]: {"path": row["path"], "size": row["size"], "urls": [], "categories": []}
+            for row in self._fetch("SELECT * FROM documents")
+        }
+        for row in self._fetch(
+            "SELECT url, category, content_hash FROM urls WHERE status = ? AND content_hash IS NOT NULL",
+            (DOWNLOADED,),
+        ):
+            document = documents.get(row["content_hash"])
+            if document is None:
+                continue
+            document["urls"].append(row["url"])
+            if row["category"] and row["category"] not in document["categories"]:
+                document["categories"].append(row["category"])
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({"generated_at": self._now(), "documents": documents}, f, indent=2)
+
+    def status_counts(self):
+        """Return {status: count} over all recorded URLs"""
+        rows = self._fetch("SELECT status, COUNT(*) AS n FROM urls GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ContentStore:
+    """Content-addressed PDF store: one file per SHA-256 digest, whatever URL or category it came from."""
+
+    def __init__(self, base_path, frontier):
+        self.base_path = Path(base_path)
+        self.partial_dir = self.base_path / ".partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.frontier = frontier
+        self._lock = threading.Lock()
+
+    def temp_path(self):
+        """Return a unique path to stream a download into before its digest is known"""
+        return self.partial_dir / f"{uuid.uuid4().hex}.part"
+
+    def commit(self, temp_path, content_hash, size, category, filename):
+        """
+        Move a finished download into the store.
+
+        Returns (path, is_new); when the digest is already stored the temp file is
+        discarded and the existing path is returned.
+        """
+        with self._lock:
+            existing = self.frontier.get_document(content_hash)
+            if existing and Path(existing["path"]).exists():
+                Path(temp_path).unlink(missing_ok=True)
+                return Path(existing["path"]), False
+
+            # Prefix with the digest so different papers that share a name never collide
+            dest = self.base_path / category / f"{content_hash[:12]}_{filename}"
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_path, dest)
+            self.frontier.add_document(content_hash, dest, size)
+            return dest, True
@@ -0,0 +1,214 @@
+"""
+On-disk embedding cache shared by Step 3 and the web app's TherapistBot.
+
+Vectors are stored as float32 in a SQLite file, keyed by (model, sha256(text)), so
+re-indexing unchanged text, repeated chat queries and the fixed topic openers don't
+call the embedding model again. The least recently used entries are evicted once
+the cache grows past max_bytes (or max_entries).
+
+    python embedding_cache.py                          # entries and size per model
+    python embedding_cache.py --clear [--model MODEL]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger('embedding_cache')
+
+DEFAULT_CACHE_PATH = Path(os.environ.get(
+    "EMBEDDING_CACHE_PATH", Path.home() / ".cache" / "tsyp12" / "embeddings.sqlite3"))
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+EVICT_TO = 0.9  # Eviction frees space down to this fraction of the limits
+SQLITE_MAX_VARIABLES = 900  # Keys looked up per query, below SQLite's parameter limit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, text_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache of embedding vectors in a SQLite file.
+
+    Several processes (the indexer and the web app) can share the file; each keeps
+    its own hit/miss counters in `stats`.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_entries: Optional[int] = None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._entries, self._bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors for texts, None where missing; hits are marked as recently used."""
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), SQLITE_MAX_VARIABLES):
+                part = unique[start:start + SQLITE_MAX_VARIABLES]
+                rows = self._db.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(part))})", (model, *part))
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                                     [(now, model, key) for key in found])
+                self._db.commit()
+            hits = sum(1 for key in hashes if key in found)
+            self.stats['hits'] += hits
+            self.stats['misses'] += len(hashes) - hits
+        return [found.get(key) for key in hashes]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        now = time.time()
+        rows = {text_hash(text): array('f', vector).tobytes() for text, vector in zip(texts, vectors)}
+        with self._lock:
+            for key, blob in rows.items():
+                previous = self._db.execute("SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND text_hash = ?",
+                                            (model, key)).fetchone()
+                self._db.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", (model, key, blob, now))
+                if previous:
+                    self._bytes += len(blob) - previous[0]
+                else:
+                    self._entries += 1
+                    self._bytes += len(blob)
+            self._db.commit()
+            self.stats['writes'] += len(rows)
+            if self._over_limit(1.0):
+                self._evict()
+
+    def get_or_compute(self, model: str, texts: Sequence[str],
+                       compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Vectors for texts, calling compute(missing texts) once for the cache misses."""
+        vectors = self.get_many(model, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+            self.put_many(model, missing, [computed[text] for text in missing])
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def _over_limit(self, fraction: float) -> bool:
+        return (self.max_bytes is not None and self._bytes > self.max_bytes * fraction) or \
+            (self.max_entries is not None and self._entries > self.max_entries * fraction)
+
+    def _evict(self) -> None:
+        # Other processes may have written too: start from the file's real size
+        self._entries, self._bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        evicted = 0
+        while self._over_limit(EVICT_TO) and self._entries:
+            rows = self._db.execute("SELECT model, text_hash, LENGTH(vector) FROM embeddings "
+                                    "ORDER BY last_used LIMIT 500").fetchall()
+            for model, key, size in rows:
+                if not self._over_limit(EVICT_TO):
+                    break
+                self._db.execute("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, key))
+                self._entries -= 1
+                self._bytes -= size
+                evicted += 1
+        self._db.commit()
+        self.stats['evicted'] += evicted
+        logger.info(f"Evicted {evicted} least recently used embeddings from {self.path}")
+
+    def clear(self, model: Optional[str] = None) -> int:
+        """Remove every entry (or those of one model); returns how many were removed."""
+        with self._lock:
+            if model is None:
+                removed = self._db.execute("DELETE FROM embeddings").rowcount
+            else:
+                removed = self._db.execute("DELETE FROM embeddings WHERE model = ?", (model,)).rowcount
+            self._db.commit()
+            self._entries, self._bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        return removed
+
+    def summary(self) -> Dict:
+        """Counters for this process plus the cache's current size."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0,
+            'entries': self._entries,
+            'megabytes': round(self._bytes / 1024 / 1024, 2),
+        }
+
+    def models(self) -> Dict[str, Dict]:
+        """Entries and size per model in the file"""
+        rows = self._db.execute("SELECT model, COUNT(*), SUM(LENGTH(vector)) FROM embeddings GROUP BY model")
+        return {model: {'entries': count, 'megabytes': round(size / 1024 / 1024, 2)}
+                for model, count, size in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings object (embed_documents / embed_query) with an
+    EmbeddingCache, so it can be passed anywhere the wrapped object is used.
+    """
+
+    def __init__(self, embeddings, cache: EmbeddingCache, model: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.get_or_compute(self.model, texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cache.get_or_compute(self.model, [text],
+                                         lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", type=Path, default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--clear", action="store_true", help="remove cached embeddings")
+    parser.add_argument("--model", help="only clear this model's embeddings")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    cache = EmbeddingCache(args.path, max_bytes=None)
+    if args.clear:
+        logger.info(f"Removed {cache.clear(args.model)} embeddings from {args.path}")
+    for model, info in cache.models().items():
+        print(f"{model}: {info['entries']} embeddings, {info['megabytes']} MB")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Embedding model selection, shared by Step 3, the re-embed migration and the web app.
+
+A model is named by a spec, "<backend>:<model>":
+
+    ollama:mistral-nemo:12b-instruct-2407-q2_K     (served by the local Ollama server)
+    sentence-transformers:all-MiniLM-L6-v2         (runs in-process, CPU by default)
+
+A spec without a known backend prefix is an Ollama model. The embedding model is
+configured independently of the chat model with the EMBEDDING_MODEL environment
+variable, and every collection records the model its vectors came from in its
+metadata, so queries are always embedded with the model the index was built with.
+"""
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+BACKENDS = ("ollama", "sentence-transformers")
+
+# Collections created before the model was recorded were embedded with the chat model
+LEGACY_EMBEDDING_MODEL = "ollama:mistral-nemo:12b-instruct-2407-q2_K"
+# Small local model: 384-dimensional vectors instead of mistral-nemo's 5120
+SMALL_EMBEDDING_MODEL = "sentence-transformers:all-MiniLM-L6-v2"
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", LEGACY_EMBEDDING_MODEL)
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE", "cpu")
+
+COLLECTION_MODEL_KEY = "embedding_model"  # Collection metadata key holding the spec
+
+
+def parse_spec(spec: str):
+    """(backend, model name) for a model spec"""
+    backend, _, name = spec.partition(":")
+    if backend in BACKENDS and name:
+        return backend, name
+    return "ollama", spec
+
+
+def normalize_spec(spec: str) -> str:
+    return ":".join(parse_spec(spec))
+
+
+def unit_vector(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+class OllamaEmbedder:
+    """
+    Embeddings from the Ollama server, batched through its embed endpoint when available.
+    Vectors are L2-normalized, like the embed endpoint's.
+    """
+
+    def __init__(self, model: str):
+        import ollama
+        self.client = ollama
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if hasattr(self.client, 'embed'):
+            return list(self.client.embed(model=self.model, input=texts)['embeddings'])
+        # Older clients only have the one-text-per-call endpoint, which returns raw vectors
+        return [unit_vector(self.client.embeddings(model=self.model, prompt=text)['embedding']) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class SentenceTransformerEmbedder:
+    """
+    A sentence-transformers model running in-process. Vectors are L2-normalized;
+    encode calls are serialized, since the model already uses every core.
+    """
+
+    def __init__(self, model: str, device: str = EMBEDDING_DEVICE, batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("sentence-transformers models need `pip install sentence-transformers`") from e
+        self.model = SentenceTransformer(model, device=device)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            vectors = self.model.encode(list(texts), batch_size=self.batch_size,
+                                        normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def load_embedder(spec: str, cache: Optional[EmbeddingCache] = None):
+    """
+    An object with embed_documents(texts) and embed_query(text) for the model spec,
+    answered from `cache` when given.
+    """
+    backend, name = parse_spec(spec)
+    if backend == "sentence-transformers":
+        embedder = SentenceTransformerEmbedder(name)
+    else:
+        embedder = OllamaEmbedder(name)
+    if cache is not None:
+        embedder = CachedEmbeddings(embedder, cache, normalize_spec(spec))
+    return embedder
+
+
+def collection_model(metadata: Optional[Dict]) -> str:
+    """The model spec a collection's vectors came from, per its metadata"""
+    return normalize_spec((metadata or {}).get(COLLECTION_MODEL_KEY) or LEGACY_EMBEDDING_MODEL)
+
+
+def recorded_model(client, collection_name: str) -> Optional[str]:
+    """The model spec of an existing collection, or None if there is no such collection."""
+    try:
+        collection = client.get_collection(collection_name)
+    except Exception:
+        return None
+    return collection_model(collection.metadata)
@@ -0,0 +1,222 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('embedding_pipeline')
+
+_DONE = object()
+
+
+class _KeyRead:
+    """Sent by the reader through the write queue once every item of a key is read."""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+
+class EmbeddingPipeline:
+    """
+    Reader thread -> pool of embedding workers -> single writer (the calling thread).
+
+    The reader groups (key, item) pairs into batches of `batch_size`, or of the current
+    size of `batcher` (an AdaptiveBatcher, fed each batch's embedding time and failed
+    attempts, so slow or failing requests shrink the batches); an item of None marks
+    the end of its key's items. Workers call embed(batch) concurrently, retrying
+    with exponential backoff; the writer calls write(batch, embeddings) one batch at a
+    time. Both queues are bounded, so a slow model or store holds the reader back
+    instead of buffering the whole corpus. on_key_done(key) is called on the writer
+    thread, like write, once every batch holding one of that key's items has been
+    written; a key with a failed batch is never reported done.
+    """
+
+    def __init__(self, embed: Callable[[List], List], write: Callable[[List, List], None],
+                 workers: int = 4, batch_size: int = 32, queue_size: Optional[int] = None,
+                 max_attempts: int = 3, retry_delay: float = 1.0, batcher=None):
+        self.embed = embed
+        self.write = write
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size or 2 * self.workers
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.batcher = batcher
+        self._batcher_lock = threading.Lock()
+        self.stats = {'batches': 0, 'items': 0, 'failed_batches': 0, 'failed_items': 0, 'seconds': 0.0}
+
+    def current_batch_size(self) -> int:
+        if self.batcher is None:
+            return self.batch_size
+        with self._batcher_lock:
+            return self.batcher.size
+
+    def _record_attempt(self, items: int, seconds: float, failed: bool) -> None:
+        if self.batcher is None:
+            return
+        with self._batcher_lock:
+            if failed:
+                self.batcher.record_failure()
+            else:
+                self.batcher.record_success(items, seconds)
+
+    def run(self, items: Iterable[Tuple[Hashable, object]],
+            on_key_done: Optional[Callable[[Hashable], None]] = None, progress=None) -> Dict:
+        to_embed: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        to_write: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        # Uncommitted batches per key (counted by the reader as soon as a batch takes one of
+        # the key's items), and keys the writer knows are fully read; only the writer
+        # touches `finished`
+        pending: Dict[Hashable, int] = {}
+        finished = set()
+        lock = threading.Lock()
+        # Fatal errors (e.g. KeyboardInterrupt) from the threads, re-raised by the writer
+        errors: List[BaseException] = []
+
+        def released(keys) -> List[Hashable]:
+            """Keys among `keys` that are fully read and committed. Called by the writer with the lock held."""
+            done = [key for key in keys if key in finished and pending.get(key, 0) == 0]
+            for key in done:
+                pending.pop(key, None)
+                finished.discard(key)
+            return done
+
+        def report_done(keys) -> None:
+            # On the writer thread, after the lock is released
+            if on_key_done:
+                for key in keys:
+                    on_key_done(key)
+
+        def put(q, value):
+            while not stop.is_set():
+                try:
+                    q.put(value, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read():
+            batch, keys = [], set()
+            try:
+                for key, item in items:
+                    if stop.is_set():
+                        return
+                    if item is None:
+                        # Behind the key's batches: the writer finishes the key, not this thread
+                        if not put(to_write, _KeyRead(key)):
+                            return
+                        continue
+                    batch.append(item)
+                    if key not in keys:
+                        keys.add(key)
+                        with lock:
+                            pending[key] = pending.get(key, 0) + 1
+                    if len(batch) >= self.current_batch_size():
+                        if not put(to_embed, (batch, keys)):
+                            return
+                        batch, keys = [], set()
+                if batch:
+                    put(to_embed, (batch, keys))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                for _ in range(self.workers):
+                    put(to_embed, _DONE)
+
+        def embed_worker():
+            try:
+                while True:
+                    try:
+                        job = to_embed.get(timeout=0.5)
+                    except queue.Empty:
+                        if stop.is_set():
+                            break
+                        continue
+                    if job is _DONE:
+                        break
+                    batch, keys = job
+                    vectors, error = None, None
+                    for attempt in range(self.max_attempts):
+                        attempt_start = time.perf_counter()
+                        try:
+                            vectors = self.embed(batch)
+                            error = None
+                            self._record_attempt(len(batch), time.perf_counter() - attempt_start, False)
+                            break
+                        except Exception as e:
+                            error = e
+                            self._record_attempt(len(batch), time.perf_counter() - attempt_start, True)
+                            if attempt + 1 < self.max_attempts and not stop.is_set():
+                                time.sleep(self.retry_delay * (2 ** attempt))
+                    if not put(to_write, (batch, keys, vectors, error)):
+                        break
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(to_write, _DONE)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=read, name="embedding-reader", daemon=True)]
+        threads += [threading.Thread(target=embed_worker, name=f"embedding-worker-{i}", daemon=True)
+                    for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            workers_left = self.workers
+            while workers_left:
+                try:
+                    result = to_write.get(timeout=0.5)
+                except queue.Empty:
+                    if stop.is_set() and not any(thread.is_alive() for thread in threads[1:]):
+                        break
+                    continue
+                if result is _DONE:
+                    workers_left -= 1
+                    continue
+                if isinstance(result, _KeyRead):
+                    with lock:
+                        finished.add(result.key)
+                        done = released([result.key])
+                    report_done(done)
+                    continue
+                batch, keys, vectors, error = result
+                if error is None:
+                    try:
+                        self.write(batch, vectors)
+                    except Exception as e:
+                        error = e
+                if error is None:
+                    self.stats['batches'] += 1
+                    self.stats['items'] += len(batch)
+                    # Only a fully committed key is reported done, so it's safe to skip on resume
+                    with lock:
+                        for key in keys:
+                            pending[key] -= 1
+                        done = released(keys)
+                    report_done(done)
+                else:
+                    logger.error(f"Dropping batch of {len(batch)}: {error}")
+                    self.stats['failed_batches'] += 1
+                    self.stats['failed_items'] += len(batch)
+                if progress is not None:
+                    progress.update(len(batch))
+                    progress.set_postfix(batch=self.current_batch_size(),
+                                         per_s=f"{self.stats['items'] / (time.perf_counter() - start):.1f}")
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        if errors:
+            raise errors[0]
+        self.stats['seconds'] = round(time.perf_counter() - start, 3)
+        self.stats['items_per_second'] = round(self.stats['items'] / self.stats['seconds'], 2) \
+            if self.stats['seconds'] else 0.0
+        self.stats['batch_size'] = self.current_batch_size()
+        return self.stats
@@ -0,0 +1,63 @@
+"""
+HNSW index settings of the pdf_paragraphs collection, in one place for Step 3 (which
+creates the collection), the web app's TherapistBot, reembed_collection.py and the
+maintenance tools (rebuild_collection.py, sweep_search_ef.py).
+
+- HNSW_SPACE: distance function (cosine, l2 or ip).
+- HNSW_M: graph links per vector; more links raise recall, memory and build time.
+- HNSW_CONSTRUCTION_EF: candidates kept while inserting; higher builds a better graph, slower.
+- HNSW_SEARCH_EF: candidates kept per query; the recall / latency trade-off (see sweep_search_ef.py).
+
+Chroma fixes them when a collection is created; rebuild_collection.py applies changed
+values to an existing collection.
+"""
+import logging
+import os
+from typing import Dict, Optional
+
+logger = logging.getLogger('hnsw_settings')
+
+HNSW_SPACE = os.environ.get("HNSW_SPACE", "cosine")
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_CONSTRUCTION_EF = int(os.environ.get("HNSW_CONSTRUCTION_EF", 100))
+HNSW_SEARCH_EF = int(os.environ.get("HNSW_SEARCH_EF", 10))
+
+SPACES = ("cosine", "l2", "ip")
+# Chroma's values for the settings a collection's metadata leaves out
+CHROMA_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+
+
+def hnsw_metadata(space: Optional[str] = None, m: Optional[int] = None, construction_ef: Optional[int] = None,
+                  search_ef: Optional[int] = None) -> Dict:
+    """Collection metadata with the configured HNSW settings, or the given overrides."""
+    metadata = {
+        "hnsw:space": space or HNSW_SPACE,
+        "hnsw:M": m or HNSW_M,
+        "hnsw:construction_ef": construction_ef or HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": search_ef or HNSW_SEARCH_EF,
+    }
+    if metadata["hnsw:space"] not in SPACES:
+        raise ValueError(f"Unknown HNSW space {metadata['hnsw:space']!r}; expected one of {', '.join(SPACES)}")
+    return metadata
+
+
+def collection_hnsw(metadata: Optional[Dict]) -> Dict:
+    """The HNSW settings a collection was created with, from its metadata."""
+    metadata = metadata or {}
+    return {key: metadata.get(key, default) for key, default in CHROMA_DEFAULTS.items()}
+
+
+def without_hnsw(metadata: Optional[Dict]) -> Dict:
+    """A collection's metadata minus its HNSW settings, to copy into a collection built with others."""
+    return {key: value for key, value in (metadata or {}).items() if not key.startswith("hnsw:")}
+
+
+def check_collection(collection) -> Dict:
+    """Warn when a collection was built with other HNSW settings than the configured ones."""
+    built_with = collection_hnsw(collection.metadata)
+    differences = {key: (built_with[key], value) for key, value in hnsw_metadata().items() if built_with[key] != value}
+    if differences:
+        changes = ', '.join(f"{key} {old} -> {new}" for key, (old, new) in differences.items())
+        logger.warning(f"{collection.name} was built with other HNSW settings ({changes}); "
+                       f"apply them with: python rebuild_collection.py")
+    return differences
@@ -0,0 +1,51 @@
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HostSessionPool:
+    """Shares one pooled requests.Session per host and caps concurrent requests to each host."""
+
+    def __init__(self, max_connections_per_host=2):
+        self.max_connections_per_host = max(1, int(max_connections_per_host))
+        self._sessions = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url):
+        """Return the normalized host (netloc) of a URL"""
+        return urlparse(url).netloc.lower()
+
+    def _get_or_create(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.max_connections_per_host,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return session, self._semaphores[host]
+
+    @contextmanager
+    def acquire(self, url):
+        """Yield the session for the URL's host while holding one of its connection slots"""
+        session, semaphore = self._get_or_create(self.host_of(url))
+        with semaphore:
+            yield session
+
+    def close(self):
+        """Close every pooled session"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._semaphores.clear()
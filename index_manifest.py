@@ -0,0 +1,316 @@
+"""
+Index manifest: which version of each cleaned document is in the vector collection.
+
+Step 3 compares it with the cleaned documents (IndexManifest.plan) to embed only new
+and changed documents and to delete the vectors of removed ones. A document's entry
+is written once all of its vectors are committed (IndexRun.finish_document), so an
+interrupted run resumes after the documents it finished.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from cleaned_documents import dropped_positions, read_header
+
+logger = logging.getLogger('index_manifest')
+
+# Bumped when the manifest or the vector metadata it relies on changes; a run with an
+# older manifest checks every document once, like a first run
+MANIFEST_VERSION = 2
+# Kept next to the collection's Chroma files
+MANIFEST_NAME = "index_manifest.json"
+
+
+def document_version(header: Dict, dropped) -> str:
+    """Fingerprint of what Step 3 indexes from a document: its cleaning run and its dedup drops."""
+    payload = json.dumps({'processed_date': header.get('processed_date'), 'dropped': sorted(dropped)})
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+@dataclass
+class IndexPlan:
+    """The cleaned documents sorted by what a run has to do with them."""
+    new: List[Path] = field(default_factory=list)
+    changed: List[Path] = field(default_factory=list)
+    unchanged: List[Path] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)  # Manifest keys whose file is gone
+    headers: Dict[str, Dict] = field(default_factory=dict)
+    versions: Dict[str, str] = field(default_factory=dict)
+    rebuild_reason: Optional[str] = None  # Why every document counts as changed
+
+    @property
+    def to_index(self) -> List[Path]:
+        return self.new + self.changed
+
+    def summary(self) -> Dict:
+        return {
+            'new': len(self.new),
+            'changed': len(self.changed),
+            'unchanged': len(self.unchanged),
+            'removed': len(self.removed),
+        }
+
+
+class IndexManifest:
+    """
+    {document file: entry} for the documents in the collection, stored as JSON next
+    to it. Entries hold the document's version, its source filename and source hash,
+    and its vector count, and the `settings` (embedding model, chunking) it was indexed with.
+    """
+
+    def __init__(self, path: Path, settings: Dict, save_every: int = 20):
+        self.path = path
+        self.settings = settings
+        # Stored in every entry, so an interrupted re-index after a settings change resumes correctly
+        self.settings_key = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.save_every = save_every
+        self.documents: Dict[str, Dict] = {}
+        self.stored_settings: Optional[Dict] = None
+        self.last_run: Dict = {}
+        self.exists = path.exists()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if self.exists:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.documents = data.get('documents', {})
+                self.stored_settings = data.get('settings')
+                self.last_run = data.get('last_run', {})
+                if data.get('version') != MANIFEST_VERSION:
+                    logger.info(f"Index manifest {path} is from an older version; checking every document")
+                    self.last_run = {}
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable index manifest {path}: {e}")
+                self.exists = False
+
+    def plan(self, document_files: List[Path], drops: Optional[Dict[str, Dict]] = None) -> IndexPlan:
+        """Compare the cleaned documents' headers with the manifest."""
+        plan = IndexPlan()
+        if self.exists and self.stored_settings != self.settings:
+            plan.rebuild_reason = f"index settings changed from {self.stored_settings} to {self.settings}"
+        for doc_path in document_files:
+            header = read_header(doc_path)
+            if not header:
+                continue
+            key = doc_path.name
+            plan.headers[key] = header
+            plan.versions[key] = document_version(header, dropped_positions(drops, header) if drops else ())
+            entry = self.documents.get(key)
+            if entry is None:
+                plan.new.append(doc_path)
+            elif entry.get('settings') != self.settings_key or entry['version'] != plan.versions[key]:
+                plan.changed.append(doc_path)
+            else:
+                plan.unchanged.append(doc_path)
+        plan.removed = sorted(set(self.documents) - set(plan.headers))
+        return plan
+
+    def record(self, key: str, entry: Dict) -> None:
+        with self._lock:
+            self.documents[key] = {**entry, 'settings': self.settings_key, 'indexed': datetime.now().isoformat()}
+            self._changed()
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            if self.documents.pop(key, None) is not None:
+                self._changed()
+
+    def _changed(self) -> None:
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self._save()
+
+    def save(self, last_run: Optional[Dict] = None) -> None:
+        with self._lock:
+            if last_run is not None:
+                self.last_run = last_run
+                self._unsaved += 1
+            self._save()
+
+    def _save(self) -> None:
+        if not self._unsaved:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'updated': datetime.now().isoformat(),
+                'settings': self.settings,
+                'last_run': self.last_run,
+                'documents': self.documents,
+            }, f)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+        self.exists = True
+
+
+class IndexRun:
+    """
+    One Step 3 run's bookkeeping of which vectors belong to which document file.
+
+    `store` is the collection seen through its ids: ids_of(document_file), all_ids(),
+    existing_among(ids), delete(ids) and set_document_file(ids, document_file). Every
+    vector records the document file (shard) it belongs to. Its id starts with its
+    source PDF's hash, so a PDF downloaded twice shares vectors, while the shards of
+    one PDF don't.
+
+    Per document file: start_document, then to_embed for its paragraphs in batches
+    (the others are already in the collection), then finish_document once everything
+    to_embed returned is committed.
+    """
+
+    def __init__(self, manifest: IndexManifest, plan: IndexPlan, store):
+        self.manifest = manifest
+        self.plan = plan
+        self.store = store
+        # Until a run has completed with the manifest, every document is checked and
+        # ids no document produces (e.g. indexed before the manifest existed) are swept
+        self.sweep = not manifest.last_run
+        self.to_index = plan.to_index + (plan.unchanged if self.sweep else [])
+        self.existing_ids = store.all_ids() if self.sweep else None
+        self.seen_ids = set()
+        self.skipped = 0
+        self.deleted = 0
+        # Per document file being indexed: its source hash, the ids recorded under it before
+        # this run, the ids it produces now, and those of its unchanged paragraphs that are
+        # recorded under another file (e.g. before the PDF was re-sharded)
+        self._source_hashes: Dict[str, Optional[str]] = {}
+        self._old_ids: Dict[str, set] = {}
+        self._new_ids: Dict[str, set] = {}
+        self._adopted: Dict[str, set] = {}
+        # Re-sharding moves paragraphs between the shards of a PDF, so a shard's stale
+        # vectors are deleted, and the shards recorded, once every shard being indexed
+        # of that PDF is committed
+        self._unfinished: Dict[str, set] = {}
+        self._stale_ids: Dict[str, set] = {}
+        self._finished_entries: Dict[str, Dict[str, Dict]] = {}
+        for path in self.to_index:
+            self._unfinished.setdefault(plan.headers[path.name]['filename'], set()).add(path.name)
+        # Source hash prefix -> {PDF filename: document file} of the documents not read
+        # this run, whose vectors stay; a copy of the PDF under another name keeps the shared ones
+        self._unread_copies: Dict[str, Dict[str, str]] = {}
+        if not self.sweep:
+            for path in plan.unchanged:
+                entry = manifest.documents[path.name]
+                prefix = (entry.get('source_hash') or '')[:16]
+                self._unread_copies.setdefault(prefix, {}).setdefault(entry['filename'], path.name)
+
+    def _copy_keeping(self, id: str, filename: str) -> Optional[str]:
+        """The document file of an unread copy of the PDF (not named `filename`) that uses the vector"""
+        copies = self._unread_copies.get(id.split('-', 1)[0], {})
+        return next((key for name, key in sorted(copies.items()) if name != filename), None)
+
+    def deletable(self, ids: Iterable[str], filename: str) -> set:
+        """The ids, of a document of PDF `filename`, that no document produces any more"""
+        return {i for i in set(ids) - self.seen_ids if self._copy_keeping(i, filename) is None}
+
+    def _release(self, ids: Iterable[str], filename: str) -> None:
+        """Delete the ids no document produces any more, and hand the ones a copy still uses to it"""
+        kept: Dict[str, set] = {}
+        stale = set()
+        for i in set(ids) - self.seen_ids:
+            owner = self._copy_keeping(i, filename)
+            if owner is None:
+                stale.add(i)
+            else:
+                kept.setdefault(owner, set()).add(i)
+        self._delete(stale)
+        for owner, owned in kept.items():
+            self.store.set_document_file(owned, owner)
+
+    def start_document(self, key: str) -> None:
+        self._old_ids[key] = self.store.ids_of(key)
+        self._new_ids[key] = set()
+        self._adopted[key] = set()
+
+    def set_source_hash(self, key: str, source_hash: Optional[str]) -> None:
+        self._source_hashes[key] = source_hash
+
+    def unseen(self, documents: Iterable) -> Iterator:
+        """Documents (with an .id) whose id no document read before produced"""
+        for document in documents:
+            if document.id in self.seen_ids:
+                # Same PDF downloaded twice under different names
+                continue
+            self.seen_ids.add(document.id)
+            yield document
+
+    def _present_among(self, key: str, ids: List[str]) -> set:
+        if self.existing_ids is not None:
+            return {i for i in ids if i in self.existing_ids}
+        old_ids = self._old_ids[key]
+        return {i for i in ids if i in old_ids} | \
+            self.store.existing_among([i for i in ids if i not in old_ids])
+
+    def to_embed(self, key: str, documents: List) -> List:
+        """
+        The documents, a batch of document file `key`'s paragraphs, that aren't in the
+        collection yet. Unchanged paragraphs keep their id and aren't embedded again.
+        """
+        ids = [document.id for document in documents]
+        self._new_ids[key].update(ids)
+        present = self._present_among(key, ids)
+        self._adopted[key] |= present - self._old_ids[key]
+        self.skipped += len(present)
+        return [document for document in documents if document.id not in present]
+
+    def finish_document(self, key: str) -> None:
+        """
+        Once all of a document's vectors are committed: claim its unchanged vectors, and
+        once its PDF's other shards are committed too, delete their stale vectors and
+        record them.
+        """
+        header = self.plan.headers[key]
+        filename = header['filename']
+        adopted = self._adopted.pop(key)
+        if adopted:
+            self.store.set_document_file(adopted, key)
+        self._stale_ids.setdefault(filename, set()).update(self._old_ids.pop(key))
+        self._finished_entries.setdefault(filename, {})[key] = {
+            'version': self.plan.versions[key],
+            'filename': filename,
+            'processed_date': header.get('processed_date'),
+            'source_hash': self._source_hashes.get(key),
+            'vectors': len(self._new_ids.pop(key)),
+        }
+        self._unfinished[filename].discard(key)
+        if self._unfinished[filename]:
+            return
+        self._release(self._stale_ids.pop(filename), filename)
+        for finished_key, entry in self._finished_entries.pop(filename).items():
+            self.manifest.record(finished_key, entry)
+
+    def _delete(self, ids: set) -> None:
+        if ids:
+            self.store.delete(ids)
+            self.deleted += len(ids)
+
+    def removed_ids(self, key: str) -> set:
+        """Vectors of a document whose cleaned file is gone"""
+        return self.deletable(self.store.ids_of(key), self.manifest.documents[key]['filename'])
+
+    def delete_removed(self) -> None:
+        """Delete the vectors of the documents whose cleaned file is gone, and forget them"""
+        for key in self.plan.removed:
+            self._release(self.store.ids_of(key), self.manifest.documents[key]['filename'])
+            self.manifest.forget(key)
+
+    def delete_unseen(self) -> None:
+        """On a sweep, once every document is indexed: delete the ids no document produces"""
+        if self.sweep:
+            self._delete(self.store.all_ids() - self.seen_ids)
+
+    def pending_deletions(self) -> int:
+        """After reading every document without finishing any (a dry run): the vectors a run would delete"""
+        if self.sweep:
+            return len(self.existing_ids - self.seen_ids)
+        return sum(len(self.deletable(ids, self.plan.headers[key]['filename'])) for key, ids in self._old_ids.items()) \
+            + sum(len(self.removed_ids(key)) for key in self.plan.removed)
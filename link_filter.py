@@ -0,0 +1,54 @@
+from urllib.parse import urlparse, parse_qs, urldefrag
+
+
+class LinkFilter:
+    """Cheap, network-free checks that drop search-result links which can't be a wanted PDF."""
+
+    def __init__(self, allowed_domains=None, blocked_domains=None, require_pdf_extension=True):
+        self.allowed_domains = tuple(d.lower().lstrip('*') for d in (allowed_domains or []))
+        self.blocked_domains = tuple(d.lower() for d in (blocked_domains or []))
+        self.require_pdf_extension = require_pdf_extension
+
+    @staticmethod
+    def unwrap(url):
+        """Resolve Google's /url?q=<target> redirect links to their target"""
+        parsed = urlparse(url)
+        if parsed.netloc.endswith('google.com') and parsed.path == '/url':
+            target = parse_qs(parsed.query).get('q') or parse_qs(parsed.query).get('url')
+            if target:
+                return target[0]
+        return url
+
+    @staticmethod
+    def _matches(host, domains):
+        return any(host == d.lstrip('.') or host.endswith(d if d.startswith('.') else '.' + d)
+                   for d in domains)
+
+    def reason_rejected(self, url):
+        """Return why the URL is dropped, or None if it should be fetched"""
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            return "not an http(s) link"
+        host = parsed.netloc.lower().split(':')[0]
+        if self._matches(host, self.blocked_domains):
+            return f"blocked domain {host}"
+        if self.allowed_domains and not self._matches(host, self.allowed_domains):
+            return f"domain {host} not in allow-list"
+        if self.require_pdf_extension and '.pdf' not in parsed.path.lower():
+            return "path does not look like a PDF"
+        return None
+
+    def filter(self, urls):
+        """Unwrap, de-duplicate and filter links; returns (kept, rejected) with rejected as (url, reason)"""
+        kept, rejected, seen = [], [], set()
+        for url in urls:
+            url = urldefrag(self.unwrap(url))[0]
+            if url in seen:
+                continue
+            seen.add(url)
+            reason = self.reason_rejected(url)
+            if reason:
+                rejected.append((url, reason))
+            else:
+                kept.append(url)
+        return kept, rejected
@@ -1,71 +1,262 @@
+import atexit
+import json
 import logging
 import logging.config
+import logging.handlers
+import queue
+import time
 import yaml
 from pathlib import Path
 import os
 from datetime import datetime
 
+LOGGER_NAMES = ('scraper', 'scraper.llm', 'scraper.downloads', 'scraper.errors')
+
+
+class BatchingHandler(logging.handlers.MemoryHandler):
+    """Buffers records for a stream handler and writes them in one batch, flushing the stream once per batch."""
+
+    def __init__(self, target, capacity=100, flush_interval=2.0):
+        super().__init__(capacity, flushLevel=logging.ERROR, target=target, flushOnClose=True)
+        self.setLevel(target.level)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+    def shouldFlush(self, record):
+        return (super().shouldFlush(record)
+                or time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def flush(self):
+        self.acquire()
+        try:
+            target = self.target
+            if target and self.buffer:
+                stream = getattr(target, 'stream', None)
+                if stream is None:
+                    for record in self.buffer:
+                        target.handle(record)
+                else:
+                    target.acquire()
+                    try:
+                        for record in self.buffer:
+                            if target.filter(record):
+                                try:
+                                    stream.write(target.format(record) + target.terminator)
+                                except Exception:
+                                    target.handleError(record)
+                        stream.flush()
+                    finally:
+                        target.release()
+                self.buffer.clear()
+            self._last_flush = time.monotonic()
+        finally:
+            self.release()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record; structured fields passed as extra={'event': {...}} are merged in."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'event', None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _RoutingHandler(logging.Handler):
+    """Runs on the queue listener thread and fans each record out to the handlers its logger had."""
+
+    def __init__(self, routes):
+        super().__init__()
+        self.routes = routes
+
+    def handle(self, record):
+        for handler in self.routes.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+    def handlers(self):
+        seen = set()
+        for handlers in self.routes.values():
+            for handler in handlers:
+                if id(handler) not in seen:
+                    seen.add(id(handler))
+                    yield handler
+
+    def flush_batches(self):
+        for handler in self.handlers():
+            if isinstance(handler, BatchingHandler):
+                handler.flush()
+
+    def close(self):
+        for handler in self.handlers():
+            handler.close()
+        super().close()
+
+
+class _FlushingQueueListener(logging.handlers.QueueListener):
+    """A QueueListener that flushes the batched handlers once the queue has been idle for flush_interval seconds."""
+
+    def __init__(self, log_queue, handler, flush_interval):
+        super().__init__(log_queue, handler)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        if not block:
+            return super().dequeue(block)
+        while True:
+            try:
+                return self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # BatchingHandler only checks its interval when a record arrives
+                for handler in self.handlers:
+                    handler.flush_batches()
+
+
 class ScraperLogger:
     def __init__(self):
         # Create a unique logs directory for each run
         self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
         self.logs_dir = Path(f"logs/{self.run_id}")
         self.logs_dir.mkdir(parents=True, exist_ok=True)
+        self._listener = None
 
         # Load logging configuration
         with open("logging_config.yaml", 'r') as f:
             config = yaml.safe_load(f)
+            options = config.pop('scraper_logger', None) or {}
             # Update log file paths in the config
             for handler in config['handlers'].values():
                 if 'filename' in handler:
                     handler['filename'] = str(self.logs_dir / Path(handler['filename']).name)
             logging.config.dictConfig(config)
 
+        if options.get('json_lines'):
+            self.add_json_lines_sink(self.logs_dir / Path(options.get('json_lines_file', 'events.jsonl')).name)
+        if options.get('queued'):
+            self.start_queue(
+                batch_size=options.get('batch_size', 100),
+                flush_interval=options.get('flush_interval_seconds', 2.0),
+            )
+
         # Initialize different loggers
         self.main_logger = logging.getLogger('scraper')
         self.llm_logger = logging.getLogger('scraper.llm')
         self.downloads_logger = logging.getLogger('scraper.downloads')
         self.error_logger = logging.getLogger('scraper.errors')
 
+    def add_json_lines_sink(self, path):
+        """Also write every scraper event as structured JSON lines"""
+        handler = logging.FileHandler(path, mode='a', encoding='utf-8')
+        handler.setLevel(logging.DEBUG)
+        handler.setFormatter(JsonLinesFormatter())
+        logging.getLogger('scraper').addHandler(handler)
+
+    def start_queue(self, batch_size=100, flush_interval=2.0):
+        """
+        Move all scraper handlers behind a QueueHandler.
+
+        Each record is enqueued once on the calling thread; a QueueListener thread
+        then delivers it to the same handlers the logger hierarchy would have
+        used, writing to disk in batches. A batch is written once it holds
+        batch_size records, on an error, or after flush_interval seconds.
+        """
+        wrapped = {}
+
+        def batched(handler):
+            if id(handler) not in wrapped:
+                if isinstance(handler, logging.StreamHandler):
+                    wrapped[id(handler)] = BatchingHandler(handler, batch_size, flush_interval)
+                else:
+                    wrapped[id(handler)] = handler
+            return wrapped[id(handler)]
+
+        # Resolve the handlers each logger reaches through propagation before rewiring
+        routes = {}
+        for name in LOGGER_NAMES:
+            handlers, current = [], logging.getLogger(name)
+            while current:
+                handlers.extend(h for h in current.handlers if h not in handlers)
+                if not current.propagate:
+                    break
+                current = current.parent
+            routes[name] = [batched(h) for h in handlers]
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        for name in LOGGER_NAMES:
+            scraper_logger = logging.getLogger(name)
+            scraper_logger.handlers = [queue_handler]
+            scraper_logger.propagate = False
+
+        self._listener = _FlushingQueueListener(log_queue, _RoutingHandler(routes), flush_interval)
+        self._listener.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """Drain the log queue and flush buffered records"""
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
     def log_llm_conversation(self, agent_name, prompt, response):
         """Log LLM conversations"""
         self.llm_logger.debug(
             f"\nAgent: {agent_name}\n"
             f"Prompt: {prompt}\n"
             f"Response: {response}\n"
-            f"{'='*50}"
+            f"{'='*50}",
+            extra={'event': {'event': 'llm_conversation', 'agent': agent_name}}
         )
 
     def log_download_attempt(self, url, category):
         """Log when a download is attempted"""
-        self.downloads_logger.info(f"Attempting download - URL: {url}, Category: {category}")
+        self.downloads_logger.info(f"Attempting download - URL: {url}, Category: {category}",
+                                   extra={'event': {'event': 'download_attempt', 'url': url, 'category': category}})
 
     def log_download_success(self, url, filepath):
         """Log successful downloads"""
-        self.downloads_logger.info(f"Successfully downloaded - URL: {url} to {filepath}")
+        self.downloads_logger.info(f"Successfully downloaded - URL: {url} to {filepath}",
+                                   extra={'event': {'event': 'download_success', 'url': url, 'path': filepath}})
+
+    def log_download_skipped(self, url, reason):
+        """Log downloads that were skipped"""
+        self.downloads_logger.info(f"Skipped download - URL: {url}, Reason: {reason}",
+                                   extra={'event': {'event': 'download_skipped', 'url': url, 'reason': reason}})
 
     def log_download_error(self, url, error):
         """Log download errors"""
-        self.error_logger.error(f"Download failed - URL: {url}, Error: {str(error)}")
-        self.downloads_logger.error(f"Download failed - URL: {url}")
+        event = {'event': 'download_error', 'url': url, 'error': str(error)}
+        self.error_logger.error(f"Download failed - URL: {url}, Error: {str(error)}", extra={'event': event})
+        self.downloads_logger.error(f"Download failed - URL: {url}", extra={'event': event})
 
     def log_search_query(self, query):
         """Log search queries"""
-        self.main_logger.info(f"Executing search query: {query}")
+        self.main_logger.info(f"Executing search query: {query}",
+                              extra={'event': {'event': 'search_query', 'query': query}})
 
     def log_validation_result(self, url, is_valid, reason=None):
         """Log PDF validation results"""
+        event = {'event': 'validation', 'url': url, 'valid': is_valid, 'reason': reason}
         if is_valid:
-            self.main_logger.info(f"Validated PDF: {url}")
+            self.main_logger.info(f"Validated PDF: {url}", extra={'event': event})
         else:
-            self.main_logger.warning(f"Invalid PDF: {url} - Reason: {reason}")
+            self.main_logger.warning(f"Invalid PDF: {url} - Reason: {reason}", extra={'event': event})
 
     def log_error(self, error_type, error_message, details=None):
         """Log general errors"""
         self.error_logger.error(
             f"Error Type: {error_type}\n"
             f"Message: {error_message}\n"
-            f"Details: {details if details else 'No additional details'}"
+            f"Details: {details if details else 'No additional details'}",
+            extra={'event': {'event': 'error', 'error_type': error_type, 'details': details}}
         )
 
     def log_stats(self, stats_dict):
@@ -73,4 +264,4 @@ class ScraperLogger:
         stats_message = "\nScraping Statistics:\n" + "\n".join(
             f"{k}: {v}" for k, v in stats_dict.items()
         )
-        self.main_logger.info(stats_message)
+        self.main_logger.info(stats_message, extra={'event': {'event': 'stats', **stats_dict}})
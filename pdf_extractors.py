@@ -0,0 +1,273 @@
+import importlib.util
+import logging
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('pdf_cleaner')
+
+# Tried in this order by "auto"; PyPDF2 is a hard dependency and always last
+EXTRACTOR_PREFERENCE = ("pdfium", "pdfminer", "pypdf2")
+EXTRACTOR_CHOICES = ("auto",) + EXTRACTOR_PREFERENCE
+FALLBACK_EXTRACTOR = "pypdf2"
+
+# A vertical gap larger than this fraction of the previous line's height starts a new paragraph
+PARAGRAPH_GAP_RATIO = 0.7
+
+
+def clean_metadata(items) -> Dict:
+    """Normalize PDF info entries to the PyPDF2 layout: '/lowercase' keys, non-empty string values."""
+    metadata = {}
+    for key, value in items:
+        if isinstance(value, bytes):
+            value = _decode_pdf_string(value)
+        if value is None or not str(value).strip():
+            continue
+        key = str(key).lstrip('/')
+        metadata['/' + key.lower()] = str(value)
+    return metadata
+
+
+def _decode_pdf_string(value: bytes) -> str:
+    if value.startswith(b'\xfe\xff'):
+        return value[2:].decode('utf-16-be', errors='ignore')
+    return value.decode('latin-1', errors='ignore')
+
+
+class ExtractedDocument:
+    """An open PDF as seen by the cleaner: page count, metadata and per-page text."""
+
+    page_count = 0
+    # Set by open_document to the backend that actually opened the file
+    extractor_name: Optional[str] = None
+
+    def metadata(self) -> Dict:
+        return {}
+
+    def page_text(self, index: int) -> str:
+        raise NotImplementedError
+
+    def page_texts(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """Yield (page_index, text, error) for pages [start, end); a failing page doesn't stop the rest."""
+        end = self.page_count if end is None else min(end, self.page_count)
+        for index in range(start, end):
+            try:
+                yield index, self.page_text(index), None
+            except Exception as e:
+                yield index, None, e
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PDFExtractor:
+    """Opens PDFs for text extraction with one backend library."""
+
+    name = ""
+    module = ""
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec(cls.module) is not None
+
+    def open(self, pdf_path: Path) -> ExtractedDocument:
+        raise NotImplementedError
+
+
+class _PyPDF2Document(ExtractedDocument):
+    def __init__(self, pdf_path: Path):
+        import PyPDF2
+
+        self._file = open(pdf_path, 'rb')
+        try:
+            self.reader = PyPDF2.PdfReader(self._file)
+            self.page_count = len(self.reader.pages)
+        except Exception:
+            self._file.close()
+            raise
+
+    def metadata(self) -> Dict:
+        metadata = self.reader.metadata
+        return clean_metadata(metadata.items()) if metadata else {}
+
+    def page_text(self, index: int) -> str:
+        return self.reader.pages[index].extract_text()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PyPDF2Extractor(PDFExtractor):
+    """PyPDF2's extract_text: always available, but slow and often without paragraph breaks."""
+
+    name = "pypdf2"
+    module = "PyPDF2"
+
+    def open(self, pdf_path: Path) -> ExtractedDocument:
+        return _PyPDF2Document(pdf_path)
+
+
+class _PdfiumDocument(ExtractedDocument):
+    def __init__(self, pdf_path: Path):
+        import pypdfium2
+
+        self.pdf = pypdfium2.PdfDocument(str(pdf_path))
+        self.page_count = len(self.pdf)
+
+    def metadata(self) -> Dict:
+        return clean_metadata(self.pdf.get_metadata_dict().items())
+
+    def page_text(self, index: int) -> str:
+        page = self.pdf[index]
+        textpage = page.get_textpage()
+        try:
+            rects = [textpage.get_rect(i) for i in range(textpage.count_rects())]
+            return layout_text((rect, textpage.get_text_bounded(*rect)) for rect in rects)
+        finally:
+            textpage.close()
+            page.close()
+
+    def close(self) -> None:
+        self.pdf.close()
+
+
+def layout_text(lines) -> str:
+    """
+    Join ((left, bottom, right, top), text) line boxes in reading order into page text,
+    with a blank line wherever the vertical gap to the previous line means a new paragraph.
+    """
+    parts: List[str] = []
+    previous = None
+    for (left, bottom, right, top), text in lines:
+        text = text.strip()
+        if not text:
+            continue
+        if previous is not None:
+            prev_bottom, prev_top = previous
+            if prev_bottom <= (bottom + top) / 2 <= prev_top:
+                # Another text run on the same line
+                parts.append(' ')
+            elif top > prev_top:
+                # Jumped back up the page, e.g. to the next column
+                parts.append('\n\n')
+            elif prev_bottom - top > PARAGRAPH_GAP_RATIO * (prev_top - prev_bottom):
+                parts.append('\n\n')
+            else:
+                parts.append('\n')
+        parts.append(text)
+        previous = (bottom, top)
+    return ''.join(parts)
+
+
+class PdfiumExtractor(PDFExtractor):
+    """pypdfium2 (PDFium): fast native extraction; paragraph breaks rebuilt from line gaps."""
+
+    name = "pdfium"
+    module = "pypdfium2"
+
+    def open(self, pdf_path: Path) -> ExtractedDocument:
+        return _PdfiumDocument(pdf_path)
+
+
+class _PdfminerDocument(ExtractedDocument):
+    def __init__(self, pdf_path: Path):
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdftypes import resolve1
+
+        self._file = open(pdf_path, 'rb')
+        try:
+            self.document = PDFDocument(PDFParser(self._file))
+            count = resolve1(self.document.catalog['Pages']).get('Count')
+            self.page_count = int(count) if count is not None else sum(1 for _ in self._pages())
+        except Exception:
+            self._file.close()
+            raise
+
+    def _pages(self):
+        from pdfminer.pdfpage import PDFPage
+        return PDFPage.create_pages(self.document)
+
+    def metadata(self) -> Dict:
+        from pdfminer.pdftypes import resolve1
+
+        metadata = {}
+        for info in self.document.info:
+            metadata.update(clean_metadata((k, resolve1(v)) for k, v in info.items()))
+        return metadata
+
+    def page_texts(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        # pdfminer walks the page tree sequentially, so ranges are read in one pass
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams, LTTextContainer
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+
+        end = self.page_count if end is None else min(end, self.page_count)
+        device = PDFPageAggregator(PDFResourceManager(), laparams=LAParams())
+        interpreter = PDFPageInterpreter(device.rsrcmgr, device)
+        for index, page in enumerate(islice(self._pages(), start, end), start):
+            try:
+                interpreter.process_page(page)
+                # Each layout text box is one paragraph
+                boxes = [box.get_text().strip() for box in device.get_result()
+                         if isinstance(box, LTTextContainer)]
+                yield index, '\n\n'.join(box for box in boxes if box), None
+            except Exception as e:
+                yield index, None, e
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PdfminerExtractor(PDFExtractor):
+    """pdfminer.six layout analysis: one paragraph per detected text box."""
+
+    name = "pdfminer"
+    module = "pdfminer"
+
+    def open(self, pdf_path: Path) -> ExtractedDocument:
+        return _PdfminerDocument(pdf_path)
+
+
+EXTRACTORS = {cls.name: cls for cls in (PdfiumExtractor, PdfminerExtractor, PyPDF2Extractor)}
+
+
+def available_extractors() -> List[str]:
+    return [name for name in EXTRACTOR_PREFERENCE if EXTRACTORS[name].is_available()]
+
+
+def get_extractor(name: str = "auto") -> PDFExtractor:
+    """Return the named backend, the fastest installed one for "auto", or PyPDF2 if it isn't installed."""
+    if name == "auto":
+        return EXTRACTORS[available_extractors()[0]]()
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF extractor: {name}")
+    if not EXTRACTORS[name].is_available():
+        logger.warning(f"PDF extractor {name} is not installed ({EXTRACTORS[name].module}); "
+                       f"falling back to {FALLBACK_EXTRACTOR}")
+        return EXTRACTORS[FALLBACK_EXTRACTOR]()
+    return EXTRACTORS[name]()
+
+
+def open_document(pdf_path: Path, extractor: PDFExtractor) -> ExtractedDocument:
+    """
+    Open a PDF with the extractor, retrying with PyPDF2 if that backend can't parse it.
+
+    The returned document's extractor_name is the backend that opened it.
+    """
+    try:
+        document = extractor.open(pdf_path)
+        document.extractor_name = extractor.name
+    except Exception as e:
+        if extractor.name == FALLBACK_EXTRACTOR:
+            raise
+        logger.warning(f"{extractor.name} could not open {pdf_path} ({e}); falling back to {FALLBACK_EXTRACTOR}")
+        document = EXTRACTORS[FALLBACK_EXTRACTOR]().open(pdf_path)
+        document.extractor_name = FALLBACK_EXTRACTOR
+    return document
@@ -0,0 +1,175 @@
+"""
+Rebuild the pdf_paragraphs collection's HNSW index, after large deletes and upserts or
+to apply changed HNSW settings (hnsw_settings.py, or --m / --construction-ef / ...).
+
+Chroma only marks deleted vectors as deleted in its HNSW graph (Step 3's upserts of
+changed documents delete their old vectors), so after many re-runs the index keeps
+dead entries that cost memory and disk and degrade the graph. The rebuild copies the
+live ids, vectors, documents and metadata, without embedding anything again, into a
+new collection built with the configured settings. Once every vector is copied it
+takes the old one's name; with --keep-old the old one is kept as <name>_pre_rebuild.
+An interrupted rebuild resumes where it stopped. Stop Step 3 and the web app while
+the collections are swapped.
+
+Afterwards the disk space is reclaimed: Chroma leaves the index files of deleted
+collections behind, and its SQLite database doesn't shrink by itself (--no-reclaim
+to skip).
+
+    python rebuild_collection.py --chroma-dir web_app/data/chroma
+    python rebuild_collection.py --m 32 --construction-ef 200 --search-ef 50 --dry-run
+"""
+import argparse
+import logging
+import shutil
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import chromadb
+from tqdm import tqdm
+
+from hnsw_settings import SPACES, collection_hnsw, hnsw_metadata, without_hnsw
+from reembed_collection import COLLECTION_NAME, PAGE_SIZE, collection_ids, swap_collections
+
+logger = logging.getLogger('rebuild_collection')
+
+BATCH_SIZE = 1000
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def orphaned_segments(chroma_dir: Path) -> List[Path]:
+    """Segment directories (named by segment id) that Chroma's database no longer lists."""
+    connection = sqlite3.connect(str(chroma_dir / "chroma.sqlite3"))
+    try:
+        segments = {row[0] for row in connection.execute("SELECT id FROM segments")}
+    finally:
+        connection.close()
+    orphans = []
+    for path in chroma_dir.iterdir():
+        try:
+            uuid.UUID(path.name)
+        except ValueError:
+            continue
+        if path.is_dir() and path.name not in segments:
+            orphans.append(path)
+    return orphans
+
+
+def reclaim_disk(chroma_dir: Path) -> None:
+    """Delete the orphaned segment directories and VACUUM Chroma's database."""
+    for path in orphaned_segments(chroma_dir):
+        logger.info(f"Removing {path.name}, left behind by a deleted collection")
+        shutil.rmtree(path)
+    connection = sqlite3.connect(str(chroma_dir / "chroma.sqlite3"))
+    try:
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+
+def rebuild(client, name: str, settings: Dict, batch_size: int = BATCH_SIZE, keep_old: bool = False,
+            dry_run: bool = False) -> Dict:
+    """Copy collection `name` into a new one built with the HNSW `settings` and swap it in; returns the stats."""
+    source = client.get_collection(name)
+    stats = {'collection': name, 'documents': source.count(),
+             'from': collection_hnsw(source.metadata), 'to': settings}
+
+    target_name = f"{name}__rebuild"
+    try:
+        target = client.get_collection(target_name)
+        if collection_hnsw(target.metadata) != settings:
+            # Left over from a rebuild with other settings
+            if not dry_run:
+                client.delete_collection(target_name)
+            target = None
+    except Exception:
+        target = None
+    done = collection_ids(target) if target is not None else set()
+    stats['already_copied'] = len(done)
+    if dry_run:
+        return stats
+    if target is None:
+        target = client.create_collection(target_name, metadata={**without_hnsw(source.metadata), **settings})
+
+    start = time.perf_counter()
+    copied = 0
+    live = set()
+    with tqdm(total=stats['documents'], initial=len(done), desc=f"Rebuilding {name}") as progress:
+        offset = 0
+        while True:
+            page = source.get(limit=PAGE_SIZE, offset=offset, include=['embeddings', 'documents', 'metadatas'])
+            live.update(page['ids'])
+            rows = [i for i, id in enumerate(page['ids']) if id not in done]
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i:i + batch_size]
+                target.upsert(ids=[page['ids'][j] for j in batch],
+                              embeddings=[page['embeddings'][j] for j in batch],
+                              metadatas=[page['metadatas'][j] for j in batch],
+                              documents=[page['documents'][j] for j in batch])
+                copied += len(batch)
+                progress.update(len(batch))
+            if len(page['ids']) < PAGE_SIZE:
+                break
+            offset += len(page['ids'])
+
+    # Vectors an interrupted rebuild copied that have been deleted from the collection since
+    stale = list(done - live)
+    for i in range(0, len(stale), batch_size):
+        target.delete(ids=stale[i:i + batch_size])
+
+    if target.count() != source.count():
+        raise RuntimeError(f"{target_name} holds {target.count()} documents, {name} {source.count()}; "
+                           f"not swapping (re-run to resume)")
+
+    old_name = f"{name}_pre_rebuild" if keep_old else None
+    swap_collections(client, name, source, target, old_name)
+    if old_name:
+        stats['old_collection'] = old_name
+
+    seconds = time.perf_counter() - start
+    return {
+        **stats,
+        'copied': copied,
+        'seconds': round(seconds, 1),
+        'documents_per_second': round(copied / seconds, 2) if seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chroma-dir", type=Path, default=Path("chroma_db"))
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--space", choices=SPACES, help="distance function (default: HNSW_SPACE)")
+    parser.add_argument("--m", type=int, help="graph links per vector (default: HNSW_M)")
+    parser.add_argument("--construction-ef", type=int, help="default: HNSW_CONSTRUCTION_EF")
+    parser.add_argument("--search-ef", type=int, help="default: HNSW_SEARCH_EF")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--keep-old", action="store_true", help="keep the old collection as <name>_pre_rebuild")
+    parser.add_argument("--no-reclaim", action="store_true", help="leave orphaned index files and the database as they are")
+    parser.add_argument("--dry-run", action="store_true", help="report the current and the new settings")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    client = chromadb.PersistentClient(path=str(args.chroma_dir))
+    settings = hnsw_metadata(args.space, args.m, args.construction_ef, args.search_ef)
+    size_before = directory_bytes(args.chroma_dir)
+    stats = rebuild(client, args.collection, settings, args.batch_size, args.keep_old, args.dry_run)
+    stats['disk_mb_before'] = round(size_before / 1024 / 1024, 2)
+    if args.dry_run:
+        orphans = orphaned_segments(args.chroma_dir)
+        stats['orphaned_mb'] = round(sum(directory_bytes(path) for path in orphans) / 1024 / 1024, 2)
+    else:
+        if not args.no_reclaim:
+            reclaim_disk(args.chroma_dir)
+        stats['disk_mb_after'] = round(directory_bytes(args.chroma_dir) / 1024 / 1024, 2)
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Re-embed the pdf_paragraphs collection with another embedding model.
+
+Ids, documents and metadata are copied from the collection into a new one embedded
+with --model and built with the HNSW settings of hnsw_settings.py. Once every
+document is copied, the new collection takes the old one's name; with --keep-old the
+old one is kept as <name>_old_<model>. An interrupted migration resumes where it
+stopped: documents already in the new collection aren't embedded again. Stop Step 3
+and the web app while the collections are swapped.
+
+    python reembed_collection.py --model sentence-transformers:all-MiniLM-L6-v2
+    python reembed_collection.py --chroma-dir web_app/data/chroma --model ...
+"""
+import argparse
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import chromadb
+from tqdm import tqdm
+
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+from embedding_models import COLLECTION_MODEL_KEY, EMBEDDING_MODEL, collection_model, load_embedder, normalize_spec
+from hnsw_settings import hnsw_metadata, without_hnsw
+
+logger = logging.getLogger('reembed_collection')
+
+COLLECTION_NAME = "pdf_paragraphs"
+PAGE_SIZE = 1000  # Documents read from the old collection per call
+BATCH_SIZE = 64
+
+
+def collection_ids(collection) -> set:
+    ids = set()
+    offset = 0
+    while True:
+        page = collection.get(limit=PAGE_SIZE, offset=offset, include=[])['ids']
+        ids.update(page)
+        if len(page) < PAGE_SIZE:
+            return ids
+        offset += len(page)
+
+
+def model_slug(spec: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_-]+', '-', spec.split(':', 1)[-1]).strip('-_')
+
+
+def swap_collections(client, name: str, source, target, old_name: Optional[str] = None) -> None:
+    """Give `target` the name of `source`, which is renamed to `old_name`, or deleted without one."""
+    if old_name:
+        source.modify(name=old_name)
+    else:
+        client.delete_collection(name)
+    target.modify(name=name)
+
+
+def reembed(client, name: str, model: str, batch_size: int = BATCH_SIZE, keep_old: bool = False,
+            cache: EmbeddingCache = None, dry_run: bool = False) -> Dict:
+    """Migrate collection `name` to `model`; returns the migration stats."""
+    source = client.get_collection(name)
+    source_model = collection_model(source.metadata)
+    target_model = normalize_spec(model)
+    stats = {'collection': name, 'from': source_model, 'to': target_model, 'documents': source.count()}
+    if source_model == target_model:
+        logger.info(f"{name} is already embedded with {target_model}")
+        return {**stats, 'embedded': 0}
+
+    target_name = f"{name}__reembed"
+    metadata = {**without_hnsw(source.metadata), **hnsw_metadata(), COLLECTION_MODEL_KEY: target_model}
+    try:
+        target = client.get_collection(target_name)
+        if collection_model(target.metadata) != target_model:
+            # Left over from a migration to another model
+            if not dry_run:
+                client.delete_collection(target_name)
+            target = None
+    except Exception:
+        target = None
+    done = collection_ids(target) if target is not None else set()
+    stats['already_migrated'] = len(done)
+    if dry_run:
+        return {**stats, 'to_embed': stats['documents'] - len(done)}
+    if target is None:
+        target = client.create_collection(target_name, metadata=metadata)
+
+    embedder = load_embedder(target_model, cache)
+    start = time.perf_counter()
+    embedded = 0
+    with tqdm(total=stats['documents'], initial=len(done), desc=f"Re-embedding with {target_model}") as progress:
+        offset = 0
+        while True:
+            page = source.get(limit=PAGE_SIZE, offset=offset, include=['documents', 'metadatas'])
+            rows = [row for row in zip(page['ids'], page['documents'], page['metadatas']) if row[0] not in done]
+            for i in range(0, len(rows), batch_size):
+                ids, documents, metadatas = zip(*rows[i:i + batch_size])
+                target.upsert(ids=list(ids), embeddings=embedder.embed_documents(list(documents)),
+                              metadatas=list(metadatas), documents=list(documents))
+                embedded += len(ids)
+                progress.update(len(ids))
+            if len(page['ids']) < PAGE_SIZE:
+                break
+            offset += len(page['ids'])
+
+    if target.count() != source.count():
+        raise RuntimeError(f"{target_name} holds {target.count()} documents, {name} {source.count()}; "
+                           f"not swapping (re-run to resume)")
+
+    old_name = f"{name}_old_{model_slug(source_model)}"[:63].rstrip('-_.') if keep_old else None
+    swap_collections(client, name, source, target, old_name)
+    if old_name:
+        stats['old_collection'] = old_name
+
+    seconds = time.perf_counter() - start
+    return {
+        **stats,
+        'embedded': embedded,
+        'seconds': round(seconds, 1),
+        'documents_per_second': round(embedded / seconds, 2) if seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chroma-dir", type=Path, default=Path("chroma_db"))
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="embedding model spec (see embedding_models.py)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--keep-old", action="store_true", help="keep the old collection under another name")
+    parser.add_argument("--no-cache", action="store_true", help="don't use the shared embedding cache")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be migrated")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    client = chromadb.PersistentClient(path=str(args.chroma_dir))
+    cache = None if args.no_cache else EmbeddingCache(DEFAULT_CACHE_PATH)
+    stats = reembed(client, args.collection, args.model, args.batch_size, args.keep_old, cache, args.dry_run)
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
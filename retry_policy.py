@@ -0,0 +1,153 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+class RetryLater(Exception):
+    """Raised by a task to ask the scheduler to run it again after a backoff delay."""
+
+    def __init__(self, reason, delay=None, consume_attempt=True):
+        super().__init__(str(reason))
+        self.delay = delay
+        self.consume_attempt = consume_attempt
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=60.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Per-host breaker: opens after `threshold` consecutive failures and lets one trial through after `cooldown` seconds."""
+
+    def __init__(self, threshold=5, cooldown=300.0):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = float(cooldown)
+        self._failures = {}
+        self._opened_at = {}
+        self._lock = threading.Lock()
+
+    def allow(self, host):
+        """Return False while the host's circuit is open"""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.cooldown:
+                # Half-open: let this request probe the host, keep others out meanwhile
+                self._opened_at[host] = time.monotonic()
+                return True
+            return False
+
+    def retry_after(self, host):
+        """Seconds until the host's circuit may let a request through again"""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - opened_at))
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+
+    def record_failure(self, host):
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self.threshold:
+                self._opened_at[host] = time.monotonic()
+
+    def open_hosts(self):
+        with self._lock:
+            return sorted(self._opened_at)
+
+
+class RetryScheduler:
+    """
+    Runs tasks on an executor and parks the ones that raise RetryLater in a
+    delayed queue, so a backoff never blocks a worker thread.
+
+    Tasks are called as fn(*args, attempt=n). `on_done` is called once per task
+    when it finishes for good, with the task's result or None.
+    """
+
+    def __init__(self, executor, policy, on_done=None, on_error=None):
+        self.executor = executor
+        self.policy = policy
+        self.on_done = on_done
+        self.on_error = on_error
+        self._delayed = []
+        self._counter = itertools.count()
+        self._outstanding = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._timer = threading.Thread(target=self._release_due, daemon=True)
+        self._timer.start()
+
+    def submit(self, fn, *args, attempt=0):
+        with self._cond:
+            self._outstanding += 1
+        self.executor.submit(self._run, fn, args, attempt)
+
+    def _run(self, fn, args, attempt):
+        result = None
+        try:
+            result = fn(*args, attempt=attempt)
+        except RetryLater as e:
+            if not e.consume_attempt or attempt + 1 < self.policy.max_attempts:
+                delay = e.delay if e.delay is not None else self.policy.delay(attempt)
+                next_attempt = attempt + 1 if e.consume_attempt else attempt
+                with self._cond:
+                    heapq.heappush(
+                        self._delayed,
+                        (time.monotonic() + delay, next(self._counter), fn, args, next_attempt),
+                    )
+                    self._cond.notify_all()
+                return
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+        self._finish(result)
+
+    def _finish(self, result):
+        try:
+            if self.on_done:
+                self.on_done(result)
+        finally:
+            with self._cond:
+                self._outstanding -= 1
+                self._cond.notify_all()
+
+    def _release_due(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._delayed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                due_at = self._delayed[0][0]
+                now = time.monotonic()
+                if due_at > now:
+                    self._cond.wait(due_at - now)
+                    continue
+                _, _, fn, args, attempt = heapq.heappop(self._delayed)
+            self.executor.submit(self._run, fn, args, attempt)
+
+    def join(self):
+        """Block until every submitted task (including its retries) has finished"""
+        with self._cond:
+            while self._outstanding:
+                self._cond.wait()
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,200 @@
+import re
+import threading
+import time
+from functools import partial
+from html.parser import HTMLParser
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+from link_filter import LinkFilter
+
+# Result pages are fetched from here; recorded pages keep their hrefs relative to it
+GOOGLE_SEARCH_URL = "https://www.google.com/search"
+
+
+def query_slug(query):
+    """File-system friendly name for a search query"""
+    return re.sub(r'[^a-z0-9]+', '_', query.lower()).strip('_')[:120]
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+
+def extract_links(html):
+    """Return every <a href> in a result page, in document order"""
+    parser = _LinkParser()
+    parser.feed(html)
+    return parser.links
+
+
+class SearchProvider:
+    """Interface the scraper uses to turn a query into candidate PDF links."""
+
+    # How many searches may run at once
+    concurrency = 1
+
+    def start(self):
+        pass
+
+    def search(self, query):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class GoogleSeleniumProvider(SearchProvider):
+    """Scrapes Google result pages through the shared headless browser pool."""
+
+    def __init__(self, pool_size=1, max_uses=25, headless=True, record_dir=None):
+        # Imported here so offline providers work without Selenium installed
+        from browser_pool import BrowserPool
+
+        self.browsers = BrowserPool(size=pool_size, max_uses=max_uses, headless=headless)
+        self.concurrency = self.browsers.size
+        self.record_dir = Path(record_dir) if record_dir else None
+        if self.record_dir:
+            self.record_dir.mkdir(parents=True, exist_ok=True)
+
+    def start(self):
+        self.browsers.start()
+
+    def search(self, query):
+        from selenium.webdriver.common.by import By
+
+        urls = []
+        with self.browsers.driver() as driver:
+            search_url = f"{GOOGLE_SEARCH_URL}?q={query.replace(' ', '+')}+filetype:pdf"
+            driver.get(search_url)
+            if self.record_dir:
+                # Keep the raw page so FixtureSearchProvider can replay it later
+                (self.record_dir / f"{query_slug(query)}.html").write_text(driver.page_source, encoding='utf-8')
+
+            # Extract PDF links
+            links = driver.find_elements(By.TAG_NAME, 'a')
+            for link in links:
+                href = link.get_attribute('href')
+                if href and "pdf" in href:
+                    urls.append(href)
+        return urls
+
+    def close(self):
+        self.browsers.close()
+
+
+class FixtureSearchProvider(SearchProvider):
+    """
+    Replays recorded result pages from `<fixtures_dir>/results/<query_slug>.html`.
+
+    Hrefs are made absolute against the Google result page, as the browser does for
+    live results, so recorded `/url?q=...` redirects reach the scraper's LinkFilter
+    like live ones. With `serve=True` a LocalPDFServer is started over
+    `<fixtures_dir>/pdfs` and every link that resolves to a PDF is rewritten to point at
+    it (https://host/path.pdf -> http://127.0.0.1:port/host/path.pdf), so the whole
+    crawl runs without the network; other links are left for the filter to drop.
+    """
+
+    def __init__(self, fixtures_dir, serve=True, latency_ms=0, concurrency=1):
+        self.fixtures_dir = Path(fixtures_dir)
+        self.results_dir = self.fixtures_dir / "results"
+        self.server = LocalPDFServer(self.fixtures_dir, latency_ms=latency_ms) if serve else None
+        self.concurrency = max(1, int(concurrency))
+
+    def start(self):
+        if self.server:
+            self.server.start()
+
+    def search(self, query):
+        page = self.results_dir / f"{query_slug(query)}.html"
+        if not page.exists():
+            return []
+        urls = [urljoin(GOOGLE_SEARCH_URL, href) for href in extract_links(page.read_text(encoding='utf-8'))]
+        urls = [url for url in urls if "pdf" in url]
+        if self.server:
+            urls = [self.served_url(url) for url in urls]
+        return urls
+
+    def served_url(self, url):
+        """The local server's URL for a link that resolves to a PDF; other links unchanged"""
+        target = LinkFilter.unwrap(url)
+        parsed = urlparse(target)
+        if parsed.scheme not in ('http', 'https') or '.pdf' not in parsed.path.lower():
+            return url
+        return self.server.url_for(target)
+
+    def close(self):
+        if self.server:
+            self.server.close()
+
+
+class _PDFRequestHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def send_head(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalPDFServer:
+    """Threaded HTTP stand-in that serves `<fixtures_dir>/pdfs/<host>/<path>` with an optional per-request latency."""
+
+    def __init__(self, fixtures_dir, host="127.0.0.1", port=0, latency_ms=0):
+        handler = type("PDFRequestHandler", (_PDFRequestHandler,), {"latency": latency_ms / 1000})
+        self.root = Path(fixtures_dir) / "pdfs"
+        self.httpd = ThreadingHTTPServer((host, port), partial(handler, directory=str(self.root)))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, url):
+        parsed = urlparse(url)
+        return f"{self.base_url}/{parsed.netloc}{parsed.path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def create_search_provider(config):
+    """Build the provider named by config['search_settings']['provider']"""
+    search_settings = config.get('search_settings', {})
+    provider = search_settings.get('provider', 'google')
+    if provider == 'google':
+        browser_settings = config.get('browser_settings', {})
+        return GoogleSeleniumProvider(
+            pool_size=browser_settings.get('pool_size', 1),
+            max_uses=browser_settings.get('max_uses_per_driver', 25),
+            headless=browser_settings.get('headless', True),
+            record_dir=search_settings.get('record_dir'),
+        )
+    if provider == 'fixtures':
+        return FixtureSearchProvider(
+            search_settings['fixtures_dir'],
+            serve=search_settings.get('serve_fixtures', True),
+            latency_ms=search_settings.get('latency_ms', 0),
+            concurrency=search_settings.get('concurrency', 1),
+        )
+    raise ValueError(f"Unknown search provider: {provider}")
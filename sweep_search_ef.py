@@ -0,0 +1,159 @@
+"""
+Sweep HNSW search_ef: query latency against recall on a held-out query set.
+
+Holds --queries vectors out of the pdf_paragraphs collection (or embeds the lines of
+--query-file with the collection's model), copies the other vectors into a scratch
+collection built with the HNSW settings of hnsw_settings.py (or --m /
+--construction-ef), and queries it with every --search-ef value. Recall@k is measured
+against exact search over the same vectors; the collection itself isn't changed.
+
+The script charts recall and p50 latency per search_ef and names the smallest value
+reaching --target-recall; set it with HNSW_SEARCH_EF and apply it to the collection
+with rebuild_collection.py.
+
+    python sweep_search_ef.py --chroma-dir web_app/data/chroma --search-ef 10 20 40 80 160 320
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+
+from compact_index import chunk_rows, normalize_rows, read_collection_vectors
+from embedding_models import collection_model, load_embedder
+from hnsw_settings import HNSW_SEARCH_EF, SPACES, hnsw_metadata
+from reembed_collection import COLLECTION_NAME
+
+QUERIES = 200
+TOP_K = 5
+SEARCH_EFS = [10, 20, 40, 80, 160, 320]
+TARGET_RECALL = 0.95
+SCRATCH_COLLECTION = "search_ef_sweep"
+ADD_BATCH = 1000
+CHART_WIDTH = 40
+
+
+def exact_top_k(vectors: np.ndarray, indexed: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Row numbers of each query's k nearest indexed vectors, by the collection's distance."""
+    if space == "cosine":
+        queries = normalize_rows(queries)
+    scores = np.empty((len(queries), len(indexed)), dtype=np.float32)
+    step = chunk_rows(vectors.shape[1])
+    for start in range(0, len(indexed), step):
+        block = np.asarray(vectors[indexed[start:start + step]])
+        if space == "cosine":
+            block = normalize_rows(block)
+        similarity = block @ queries.T
+        if space == "l2":
+            # Ranks like the negative squared distance; the query's own norm is the same for every row
+            similarity = 2 * similarity - (block * block).sum(axis=1)[:, None]
+        scores[:, start:start + step] = similarity.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return indexed[top]
+
+
+def build_scratch(client, ids: List[str], vectors: np.ndarray, indexed: np.ndarray, metadata: Dict):
+    collection = client.create_collection(SCRATCH_COLLECTION, metadata=metadata)
+    for start in range(0, len(indexed), ADD_BATCH):
+        rows = indexed[start:start + ADD_BATCH]
+        collection.add(ids=[ids[row] for row in rows], embeddings=np.asarray(vectors[rows]).tolist())
+    return collection
+
+
+def bar(value: float, scale: float) -> str:
+    return '#' * int(round(CHART_WIDTH * value / scale)) if scale else ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chroma-dir", type=Path, default=Path("chroma_db"))
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--search-ef", type=int, nargs="+", default=SEARCH_EFS)
+    parser.add_argument("--queries", type=int, default=QUERIES, help="collection vectors held out as queries")
+    parser.add_argument("--query-file", type=Path, help="text queries, one per line, instead of held-out vectors")
+    parser.add_argument("-k", type=int, default=TOP_K)
+    parser.add_argument("--space", choices=SPACES, help="default: HNSW_SPACE")
+    parser.add_argument("--m", type=int, help="default: HNSW_M")
+    parser.add_argument("--construction-ef", type=int, help="default: HNSW_CONSTRUCTION_EF")
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=str(args.chroma_dir)).get_collection(args.collection)
+    settings = hnsw_metadata(args.space, args.m, args.construction_ef)
+    space = settings["hnsw:space"]
+    k = args.k
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        ids, vectors = read_collection_vectors(collection, Path(tmp) / "vectors.npy", normalize=False)
+        if args.query_file:
+            texts = [line.strip() for line in args.query_file.read_text(encoding='utf-8').splitlines() if line.strip()]
+            queries = np.asarray(load_embedder(collection_model(collection.metadata)).embed_documents(texts),
+                                 dtype=np.float32)
+            indexed = np.arange(len(ids))
+        else:
+            held_out = np.random.RandomState(args.seed).choice(len(ids), min(args.queries, len(ids) - k), replace=False)
+            queries = np.asarray(vectors[np.sort(held_out)])
+            indexed = np.setdiff1d(np.arange(len(ids)), held_out)
+        truth = exact_top_k(vectors, indexed, queries, k, space)
+        print(f"{len(indexed)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, {settings}")
+
+        scratch_dir = str(Path(tmp) / "chroma")
+        client = chromadb.PersistentClient(path=scratch_dir)
+        start = time.perf_counter()
+        scratch = build_scratch(client, ids, vectors, indexed, settings)
+        print(f"Scratch collection built in {time.perf_counter() - start:.1f}s")
+
+        for search_ef in sorted(set(args.search_ef)):
+            try:
+                scratch.modify(configuration={"hnsw": {"ef_search": search_ef}})
+                # Chroma reads search_ef when it loads the index
+                SharedSystemClient.clear_system_cache()
+                client = chromadb.PersistentClient(path=scratch_dir)
+                scratch = client.get_collection(SCRATCH_COLLECTION)
+            except TypeError:
+                # chromadb < 0.6 fixes search_ef when the collection is created
+                client.delete_collection(SCRATCH_COLLECTION)
+                scratch = build_scratch(client, ids, vectors, indexed, {**settings, "hnsw:search_ef": search_ef})
+            scratch.query(query_embeddings=[queries[0].tolist()], n_results=k, include=[])  # Load the index
+
+            latencies, recalls = [], []
+            for query, relevant in zip(queries, truth):
+                query_start = time.perf_counter()
+                found = scratch.query(query_embeddings=[query.tolist()], n_results=k, include=[])['ids'][0]
+                latencies.append(time.perf_counter() - query_start)
+                recalls.append(len(set(found) & {ids[row] for row in relevant}) / k)
+            results.append({
+                'search_ef': search_ef,
+                f'recall@{k}': round(float(np.mean(recalls)), 3),
+                'query_ms_p50': round(float(np.percentile(latencies, 50)) * 1000, 2),
+                'query_ms_p95': round(float(np.percentile(latencies, 95)) * 1000, 2),
+            })
+        SharedSystemClient.clear_system_cache()
+
+    recall_key = f'recall@{k}'
+    slowest = max(r['query_ms_p50'] for r in results)
+    print(f"{'search_ef':>9}  {recall_key:>9}  {'p50 ms':>7}  {'p95 ms':>7}  recall (#) / p50 latency (=)")
+    for r in results:
+        configured = "  <- HNSW_SEARCH_EF" if r['search_ef'] == HNSW_SEARCH_EF else ""
+        print(f"{r['search_ef']:>9}  {r[recall_key]:>9}  {r['query_ms_p50']:>7}  {r['query_ms_p95']:>7}  "
+              f"{bar(r[recall_key], 1.0)}{configured}")
+        print(f"{'':>39}  {bar(r['query_ms_p50'], slowest).replace('#', '=')}")
+    reaching = [r['search_ef'] for r in results if r[recall_key] >= args.target_recall]
+    if reaching:
+        print(f"Smallest search_ef reaching recall@{k} {args.target_recall}: {reaching[0]}")
+    else:
+        print(f"No search_ef reached recall@{k} {args.target_recall}; try larger values or a larger --m")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'queries': len(queries), 'k': k, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+def load_step(filename: str, module_name: str):
+    """Import one of the "Step N - ..." scripts, whose file names aren't importable."""
+    spec = importlib.util.spec_from_file_location(module_name, REPO_ROOT / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def cleaner():
+    return load_step("Step 2 - PDFs cleaner.py", "pdfs_cleaner")
+
+
+@pytest.fixture(scope="session")
+def embedder():
+    return load_step("Step 3 - DOCs embedding.py", "docs_embedding")
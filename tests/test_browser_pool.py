@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("selenium")
+pytest.importorskip("webdriver_manager")
+
+from browser_pool import BrowserPool  # noqa: E402
+
+
+class FakeDriver:
+    def quit(self):
+        pass
+
+
+def test_failed_launch_gives_its_slot_back(monkeypatch):
+    pool = BrowserPool(size=2)
+    launches = iter([RuntimeError("chrome crashed"), FakeDriver(), FakeDriver()])
+
+    def create():
+        launch = next(launches)
+        if isinstance(launch, Exception):
+            raise launch
+        return launch
+
+    monkeypatch.setattr(pool, "_create_driver", create)
+    with pytest.raises(RuntimeError):
+        pool.start()
+    assert pool._created == 0
+
+    pool.start()
+    assert pool._created == 2
+    with pool.driver(), pool.driver():
+        pass
+    pool.close()
+    assert pool._created == 0
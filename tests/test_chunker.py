@@ -0,0 +1,54 @@
+from chunker import Chunker, split_sentences
+
+
+def numbered_sentences(count: int, start: int = 0):
+    """Five-word sentences that can be told apart: 'Sentence one of part 3.'"""
+    return [f"Sentence {'abcdefghijklmnopqrstuvwxyz'[i % 26]} of part {i}." for i in range(start, start + count)]
+
+
+def test_split_sentences_keeps_abbreviations_and_decimals():
+    text = 'Dr. Lee et al. report a 2.5 fold rise (see Fig. 3). Therapy helped! Did it last? "Yes." Mostly'
+    assert split_sentences(text) == [
+        "Dr. Lee et al. report a 2.5 fold rise (see Fig. 3).",
+        "Therapy helped!",
+        "Did it last?",
+        '"Yes."',
+        "Mostly",
+    ]
+
+
+def test_chunks_end_on_sentences_and_overlap_the_previous_chunk():
+    sentences = numbered_sentences(12)
+    chunks = list(Chunker(chunk_size=20, overlap=10, min_chunk_size=0).chunk(
+        [{"text": " ".join(sentences), "page_number": 1, "position": 0}]))
+
+    assert len(chunks) > 1
+    texts = [split_sentences(chunk.text) for chunk in chunks]
+    for chunk, chunk_sentences in zip(chunks, texts):
+        assert chunk.size == chunk.word_count <= 20
+        assert set(chunk_sentences) <= set(sentences)
+    for previous, following in zip(texts, texts[1:]):
+        # Two five-word sentences fit in the overlap
+        assert following[:2] == previous[-2:]
+    # Apart from the overlap, every sentence is chunked exactly once and in order
+    assert texts[0] + [s for chunk_sentences in texts[1:] for s in chunk_sentences[2:]] == sentences
+    assert [chunk.sentence for chunk in chunks] == [0, 2, 4, 6, 8]
+
+
+def test_chunks_prefer_paragraph_boundaries():
+    paragraphs = [{"text": " ".join(numbered_sentences(2, start)), "page_number": 1 + start // 3, "position": start}
+                  for start in (0, 2, 4, 6)]
+    chunks = list(Chunker(chunk_size=25, overlap=0, min_chunk_size=10).chunk(paragraphs))
+
+    # A third ten-word paragraph would only partly fit, so each chunk holds two whole
+    # paragraphs, merged across the page break
+    assert [chunk.paragraphs for chunk in chunks] == [[[1, 0], [1, 2]], [[2, 4], [3, 6]]]
+    assert chunks[0].text == " ".join(numbered_sentences(2)) + "\n\n" + " ".join(numbered_sentences(2, 2))
+
+
+def test_over_long_sentences_are_cut_to_fit():
+    sentence = " ".join(["word"] * 45) + "."
+    chunks = list(Chunker(chunk_size=20, overlap=5).chunk([{"text": sentence, "page_number": 1, "position": 0}]))
+
+    assert all(chunk.size <= 20 for chunk in chunks)
+    assert sum(chunk.word_count for chunk in chunks) == 45
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from compact_index import CompactIndex, normalize_rows
+
+
+def clustered(rng, centers, count):
+    """Unit vectors scattered around the centers, like embeddings of a few topics."""
+    return normalize_rows(centers[rng.randint(len(centers), size=count)] + 0.5 * rng.randn(count, centers.shape[1]))
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.RandomState(0)
+    centers = rng.randn(20, 64)
+    vectors = clustered(rng, centers, 2000)
+    queries = clustered(rng, centers, 20)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    exact = [{ids[row] for row in np.argsort(-(vectors @ query))[:10]} for query in queries]
+    return ids, vectors, queries, exact
+
+
+def recall(index, queries, exact, rerank=None):
+    found = [{doc_id for doc_id, _ in index.search(query, 10, rerank=rerank)} for query in queries]
+    return np.mean([len(hits & truth) / len(truth) for hits, truth in zip(found, exact)])
+
+
+@pytest.mark.parametrize("quantization, options, approximate_recall", [
+    ("int8", {}, 0.95),
+    # 16 one-byte codes for 64 dimensions are far coarser, but still far above chance (10 of 2000)
+    ("pq", {"subspaces": 16}, 0.3),
+])
+def test_recall_against_exact_search(data, quantization, options, approximate_recall):
+    ids, vectors, queries, exact = data
+    index = CompactIndex.build(ids, vectors, quantization, **options)
+
+    assert recall(index, queries, exact, rerank=0) >= approximate_recall
+    # Re-ranking the candidates with the full vectors recovers the exact results
+    assert recall(index, queries, exact) >= 0.99
+    doc_id, score = index.search(queries[0], 1)[0]
+    assert score == pytest.approx(float(vectors[ids.index(doc_id)] @ queries[0]), abs=1e-5)
+    assert index.memory_bytes() < vectors.nbytes / 3
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_saved_index_gives_the_same_results(data, tmp_path, quantization):
+    ids, vectors, queries, _ = data
+    index = CompactIndex.build(ids, vectors, quantization, subspaces=16, meta={"embedding_model": "test"})
+    expected = [index.search(query, 5) for query in queries]
+    index.save(tmp_path / "compact_index")
+
+    loaded = CompactIndex.load(tmp_path / "compact_index")
+    assert loaded.meta["embedding_model"] == "test"
+    assert loaded.meta["count"] == len(ids)
+    assert [loaded.search(query, 5) for query in queries] == expected
@@ -0,0 +1,64 @@
+import json
+import random
+from pathlib import Path
+
+from corpus_dedup import find_duplicates
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6)) for _ in range(words))
+
+
+def write_document(path: Path, pages) -> Path:
+    """A cleaned .jsonl document; pages is a list of paragraph texts per page."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"filename": path.stem, "processed_date": "2024-01-01"}) + "\n")
+        for page_number, texts in enumerate(pages, 1):
+            for position, text in enumerate(texts):
+                f.write(json.dumps({"text": text, "page_number": page_number, "position": position}) + "\n")
+    return path
+
+
+def dropped(result):
+    return {name: doc["dropped"] for name, doc in result["documents"].items()}
+
+
+def test_near_duplicates_are_grouped_and_distinct_paragraphs_kept(tmp_path):
+    rng = random.Random(0)
+    original = sentence(rng, 100).split()
+    edited = original[:50] + ["changed"] + original[51:]
+    files = [
+        write_document(tmp_path / "a.jsonl", [["Table 3 " + " ".join(original), sentence(rng, 80)]]),
+        # Case, punctuation and digits are folded, so this is an exact duplicate
+        write_document(tmp_path / "b.jsonl", [["TABLE 4: " + " ".join(original).upper() + "!"]]),
+        write_document(tmp_path / "c.jsonl", [[sentence(rng, 80), "Table 3 " + " ".join(edited)]]),
+    ]
+
+    result = find_duplicates(files, boilerplate_min_documents=10, boilerplate_min_pages=10)
+
+    assert dropped(result) == {"b": [[1, 0, "duplicate"]], "c": [[1, 1, "near_duplicate"]]}
+    assert result["stats"]["kept"] == 3
+
+
+def test_boilerplate_needs_the_document_threshold(tmp_path):
+    rng = random.Random(1)
+    footer = "Copyright 2023 The Mental Health Foundation. All rights reserved."
+    files = [write_document(tmp_path / f"doc{i}.jsonl", [[sentence(rng, 40), footer]]) for i in range(3)]
+
+    spread = find_duplicates(files, boilerplate_min_documents=3, boilerplate_min_pages=10)
+    assert dropped(spread) == {f"doc{i}": [[1, 1, "boilerplate"]] for i in range(3)}
+    assert spread["stats"]["boilerplate_groups"] == 1
+
+    # One document short of the threshold, the footer is an ordinary duplicate: the first copy is kept
+    below = find_duplicates(files, boilerplate_min_documents=4, boilerplate_min_pages=10)
+    assert dropped(below) == {"doc1": [[1, 1, "duplicate"]], "doc2": [[1, 1, "duplicate"]]}
+    assert below["stats"]["boilerplate_groups"] == 0
+
+
+def test_boilerplate_on_many_pages_of_one_document(tmp_path):
+    rng = random.Random(2)
+    header = "Guide to anxiety disorders - chapter overview"
+    path = write_document(tmp_path / "guide.jsonl", [[header, sentence(rng, 40)] for _ in range(5)])
+
+    result = find_duplicates([path], boilerplate_min_documents=10, boilerplate_min_pages=5)
+    assert dropped(result) == {"guide": [[page, 0, "boilerplate"] for page in range(1, 6)]}
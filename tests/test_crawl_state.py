@@ -0,0 +1,38 @@
+import sqlite3
+
+from crawl_state import DOWNLOADED, CrawlFrontier
+
+
+def test_queries_sharing_urls_each_keep_their_results(tmp_path):
+    frontier = CrawlFrontier(tmp_path / "crawl_state.db")
+    frontier.record_search("anxiety guide", "treatment", ["https://a.org/1.pdf", "https://b.org/2.pdf"])
+    frontier.mark_downloaded("https://b.org/2.pdf", tmp_path / "2.pdf", 10, "hash")
+    frontier.record_search("anxiety treatment", "treatment",
+                           ["https://c.org/3.pdf", "https://b.org/2.pdf", "https://a.org/1.pdf"])
+
+    assert frontier.urls_for_query("anxiety guide") == ["https://a.org/1.pdf", "https://b.org/2.pdf"]
+    assert frontier.urls_for_query("anxiety treatment") == \
+        ["https://c.org/3.pdf", "https://b.org/2.pdf", "https://a.org/1.pdf"]
+    # A URL found again keeps its status
+    assert frontier.get("https://b.org/2.pdf")["status"] == DOWNLOADED
+
+    frontier.record_search("anxiety guide", "treatment", ["https://d.org/4.pdf"])
+    assert frontier.urls_for_query("anxiety guide") == ["https://d.org/4.pdf"]
+    assert len(frontier.urls_for_query("anxiety treatment")) == 3
+    frontier.close()
+
+
+def test_results_recorded_before_the_join_table_are_kept(tmp_path):
+    path = tmp_path / "crawl_state.db"
+    CrawlFrontier(path).close()
+    conn = sqlite3.connect(str(path))
+    with conn:
+        conn.execute("DROP TABLE query_urls")
+        conn.executemany("INSERT INTO urls (url, query, status, updated_at) VALUES (?, ?, 'found', 'now')",
+                         [("https://a.org/1.pdf", "q1"), ("https://b.org/2.pdf", "q1"), ("https://c.org/3.pdf", "q2")])
+    conn.close()
+
+    frontier = CrawlFrontier(path)
+    assert frontier.urls_for_query("q1") == ["https://a.org/1.pdf", "https://b.org/2.pdf"]
+    assert frontier.urls_for_query("q2") == ["https://c.org/3.pdf"]
+    frontier.close()
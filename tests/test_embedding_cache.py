@@ -0,0 +1,75 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing timestamps, so least-recent use doesn't depend on the clock's resolution."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_vectors_round_trip_as_float32(tmp_path):
+    vectors = [[0.1, 1 / 3, -2.5, 1e-8], [3.4e38, -0.0, 0.5, 7.0]]
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3")
+    cache.put_many("model", ["first", "second"], vectors)
+    cache.close()
+
+    # Reopened from disk: the stored vectors are the float32 roundings of the originals
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3")
+    cached = cache.get_many("model", ["second", "missing", "first"])
+    assert cached[1] is None
+    assert cached[2] == np.asarray(vectors[0], dtype=np.float32).tolist()
+    assert cached[0] == np.asarray(vectors[1], dtype=np.float32).tolist()
+    assert cache.get_many("other model", ["first"]) == [None]
+    assert cache.summary()["entries"] == 2
+    cache.close()
+
+
+def test_get_or_compute_only_embeds_the_misses_once(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3")
+    cache.put_many("model", ["known"], [[1.0, 2.0]])
+    calls = []
+
+    def compute(texts):
+        calls.append(texts)
+        return [[float(len(text)), 0.0] for text in texts]
+
+    assert cache.get_or_compute("model", ["new", "known", "new"], compute) == [[3.0, 0.0], [1.0, 2.0], [3.0, 0.0]]
+    assert calls == [["new"]]
+    assert cache.get_or_compute("model", ["new"], compute) == [[3.0, 0.0]]
+    assert calls == [["new"]]
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=None, max_entries=4)
+    for text in "abcd":
+        cache.put_many("model", [text], [[float(ord(text))]])
+    # Reading "a" makes "b" and "c" the least recently used
+    cache.get_many("model", ["a"])
+    cache.put_many("model", ["e"], [[101.0]])
+
+    # Past the limit, eviction frees down to 90% of it: 3 of the 4 entries
+    assert [text for text, vector in zip("abcde", cache.get_many("model", list("abcde"))) if vector] == ["a", "d", "e"]
+    assert cache.summary()["entries"] == 3
+    assert cache.stats["evicted"] == 2
+    cache.close()
+
+
+def test_eviction_by_size(tmp_path, clock):
+    # Each four-dimensional float32 vector takes 16 bytes
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=64)
+    for text in "abcd":
+        cache.put_many("model", [text], [[1.0] * 4])
+    assert cache.stats["evicted"] == 0
+    cache.put_many("model", ["e"], [[1.0] * 4])
+
+    assert cache.summary()["entries"] == 3
+    assert cache.get_many("model", ["a", "b"]) == [None, None]
+    cache.close()
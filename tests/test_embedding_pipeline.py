@@ -0,0 +1,44 @@
+import time
+
+from adaptive_batcher import AdaptiveBatcher
+from embedding_pipeline import EmbeddingPipeline
+
+
+def items(keys=4, per_key=64):
+    for key in range(keys):
+        for n in range(per_key):
+            yield key, f"{key}-{n}"
+        yield key, None
+
+
+def test_slow_batches_shrink_the_pipeline_batch_size():
+    batcher = AdaptiveBatcher(initial_size=32, min_size=4, max_size=32, max_batch_seconds=0.05)
+    sizes = []
+
+    def embed(batch):
+        sizes.append(len(batch))
+        if len(batch) > 8:
+            time.sleep(0.06)
+        return [[1.0] for _ in batch]
+
+    done = []
+    stats = EmbeddingPipeline(embed, lambda batch, vectors: None, workers=2, batcher=batcher).run(
+        items(), on_key_done=done.append)
+    assert stats['items'] == 256 and not stats['failed_items']
+    assert sorted(done) == [0, 1, 2, 3]
+    assert stats['batch_size'] <= 8
+    assert sizes[0] == 32 and sizes[-1] <= 8
+
+
+def test_failed_attempts_shrink_the_pipeline_batch_size():
+    batcher = AdaptiveBatcher(initial_size=32, min_size=4, max_size=32)
+
+    def embed(batch):
+        if len(batch) > 16:
+            raise TimeoutError("request timed out")
+        return [[1.0] for _ in batch]
+
+    stats = EmbeddingPipeline(embed, lambda batch, vectors: None, workers=1, batcher=batcher,
+                              retry_delay=0).run(items(keys=1, per_key=128))
+    assert stats['batch_size'] <= 16
+    assert stats['items'] + stats['failed_items'] == 128
@@ -0,0 +1,190 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from index_manifest import IndexManifest, IndexRun
+
+SETTINGS = {'embedding_model': 'test'}
+
+
+class FakeStore:
+    """The collection as IndexRun sees it: {id: document file}."""
+
+    def __init__(self):
+        self.vectors = {}
+        self.embedded = 0
+
+    def ids_of(self, document_file):
+        return {i for i, owner in self.vectors.items() if owner == document_file}
+
+    def all_ids(self):
+        return set(self.vectors)
+
+    def existing_among(self, ids):
+        return {i for i in ids if i in self.vectors}
+
+    def delete(self, ids):
+        for i in ids:
+            del self.vectors[i]
+
+    def set_document_file(self, ids, document_file):
+        for i in ids:
+            self.vectors[i] = document_file
+
+    def write(self, key, documents):
+        for document in documents:
+            self.vectors[document.id] = key
+        self.embedded += len(documents)
+
+
+def pid(pdf, paragraph):
+    """An id as Step 3 builds them: the source PDF's hash prefix, then the paragraph"""
+    return f"{pdf:0>16}-{paragraph}"
+
+
+class Corpus:
+    """Cleaned documents on disk (headers only) and the paragraph ids each one produces."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.paragraphs = {}
+
+    def write(self, key, pdf, paragraphs, version="v1", filename=None):
+        header = {'filename': filename or f"{pdf}.pdf", 'processed_date': version, 'record': 'document'}
+        (self.directory / key).write_text(json.dumps(header) + "\n", encoding="utf-8")
+        self.paragraphs[key] = [pid(pdf, p) for p in paragraphs]
+
+    def remove(self, key):
+        (self.directory / key).unlink()
+        del self.paragraphs[key]
+
+    def expected(self):
+        return {i: key for key, ids in self.paragraphs.items() for i in ids}
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    directory = tmp_path / "cleaned"
+    directory.mkdir()
+    return Corpus(directory)
+
+
+def index(corpus, store, manifest_path, stop_after=None):
+    """One Step 3 run; with stop_after, it is interrupted once that many paragraphs are written."""
+    manifest = IndexManifest(manifest_path, SETTINGS)
+    plan = manifest.plan(sorted(corpus.directory.glob("*.jsonl")))
+    run = IndexRun(manifest, plan, store)
+    written = 0
+    for path in run.to_index:
+        key = path.name
+        run.start_document(key)
+        run.set_source_hash(key, corpus.paragraphs[key][0].split('-')[0])
+        documents = list(run.unseen(SimpleNamespace(id=i) for i in corpus.paragraphs[key]))
+        for document in run.to_embed(key, documents):
+            if stop_after is not None and written == stop_after:
+                manifest.save()
+                return run
+            store.write(key, [document])
+            written += 1
+        run.finish_document(key)
+    run.delete_removed()
+    run.delete_unseen()
+    manifest.save(last_run={'finished': 'now'})
+    return run
+
+
+def recorded(manifest_path):
+    return IndexManifest(manifest_path, SETTINGS).documents
+
+
+def test_moved_paragraphs_are_adopted_not_embedded(corpus, tmp_path):
+    store, manifest_path = FakeStore(), tmp_path / "manifest.json"
+    corpus.write("a.pdf.jsonl", "a", range(6))
+    index(corpus, store, manifest_path)
+
+    # Re-sharded: the same paragraphs, split over two files
+    corpus.remove("a.pdf.jsonl")
+    corpus.write("a.pdf.part001.jsonl", "a", range(3), version="v2")
+    corpus.write("a.pdf.part002.jsonl", "a", range(3, 6), version="v2")
+    store.embedded = 0
+    run = index(corpus, store, manifest_path)
+
+    assert store.embedded == 0 and run.deleted == 0
+    assert store.vectors == corpus.expected()
+    assert set(recorded(manifest_path)) == {"a.pdf.part001.jsonl", "a.pdf.part002.jsonl"}
+
+
+def test_changed_document_embeds_new_and_deletes_stale_paragraphs(corpus, tmp_path):
+    store, manifest_path = FakeStore(), tmp_path / "manifest.json"
+    corpus.write("a.pdf.jsonl", "a", range(4))
+    corpus.write("b.pdf.jsonl", "b", range(4))
+    index(corpus, store, manifest_path)
+
+    corpus.write("a.pdf.jsonl", "a", [0, 1, "1b", "2b"], version="v2")
+    store.embedded = 0
+    run = index(corpus, store, manifest_path)
+
+    assert store.embedded == 2 and run.skipped == 2 and run.deleted == 2
+    assert store.vectors == corpus.expected()
+    assert recorded(manifest_path)["a.pdf.jsonl"]["vectors"] == 4
+
+
+def test_removed_document_is_deleted_but_a_copy_keeps_shared_vectors(corpus, tmp_path):
+    store, manifest_path = FakeStore(), tmp_path / "manifest.json"
+    corpus.write("a.pdf.jsonl", "a", range(3))
+    corpus.write("b.pdf.jsonl", "b", range(3))
+    # The same PDF downloaded again under another name produces the same ids, which
+    # are recorded under the file read first
+    corpus.write("b2.pdf.jsonl", "b", range(3), filename="b2.pdf")
+    index(corpus, store, manifest_path)
+    assert store.embedded == 6
+    assert set(store.ids_of("b.pdf.jsonl")) == set(corpus.paragraphs["b.pdf.jsonl"])
+
+    corpus.remove("a.pdf.jsonl")
+    corpus.remove("b.pdf.jsonl")
+    run = index(corpus, store, manifest_path)
+
+    assert run.deleted == 3
+    assert store.vectors == corpus.expected()
+    assert set(recorded(manifest_path)) == {"b2.pdf.jsonl"}
+
+    corpus.remove("b2.pdf.jsonl")
+    index(corpus, store, manifest_path)
+    assert store.vectors == {}
+
+
+def test_partially_embedded_document_resumes_without_re_embedding(corpus, tmp_path):
+    store, manifest_path = FakeStore(), tmp_path / "manifest.json"
+    corpus.write("a.pdf.jsonl", "a", range(4))
+    corpus.write("b.pdf.jsonl", "b", range(4))
+    corpus.write("c.pdf.jsonl", "c", range(4))
+    index(corpus, store, manifest_path, stop_after=6)
+
+    # a is finished and recorded; b is half written and not recorded
+    assert set(recorded(manifest_path)) == {"a.pdf.jsonl"}
+    store.embedded = 0
+    run = index(corpus, store, manifest_path)
+
+    assert store.embedded == 6 and run.skipped == 6 and run.deleted == 0
+    assert store.vectors == corpus.expected()
+    assert set(recorded(manifest_path)) == set(corpus.paragraphs)
+
+
+def test_shards_of_a_pdf_are_recorded_together(corpus, tmp_path):
+    store, manifest_path = FakeStore(), tmp_path / "manifest.json"
+    corpus.write("a.pdf.part001.jsonl", "a", range(3))
+    corpus.write("a.pdf.part002.jsonl", "a", range(3, 6))
+    manifest = IndexManifest(manifest_path, SETTINGS)
+    run = IndexRun(manifest, manifest.plan(sorted(corpus.directory.glob("*.jsonl"))), store)
+
+    run.start_document("a.pdf.part001.jsonl")
+    store.write("a.pdf.part001.jsonl", run.to_embed("a.pdf.part001.jsonl",
+                                                    [SimpleNamespace(id=pid("a", p)) for p in range(3)]))
+    run.finish_document("a.pdf.part001.jsonl")
+    assert manifest.documents == {}
+
+    run.start_document("a.pdf.part002.jsonl")
+    run.finish_document("a.pdf.part002.jsonl")
+    assert set(manifest.documents) == {"a.pdf.part001.jsonl", "a.pdf.part002.jsonl"}
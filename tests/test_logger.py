@@ -0,0 +1,25 @@
+import io
+import logging
+import logging.handlers
+import queue
+import time
+
+from logger import BatchingHandler, _FlushingQueueListener, _RoutingHandler
+
+
+def test_batched_console_flushes_when_idle():
+    stream = io.StringIO()
+    console = logging.StreamHandler(stream)
+    batching = BatchingHandler(console, capacity=100, flush_interval=0.1)
+    log_queue = queue.SimpleQueue()
+    listener = _FlushingQueueListener(log_queue, _RoutingHandler({'scraper': [batching]}), flush_interval=0.1)
+    listener.start()
+    try:
+        logging.handlers.QueueHandler(log_queue).handle(
+            logging.LogRecord('scraper', logging.INFO, __file__, 0, "only record", None, None))
+        deadline = time.monotonic() + 2
+        while "only record" not in stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert "only record" in stream.getvalue()
+    finally:
+        listener.stop()
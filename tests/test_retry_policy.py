@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from retry_policy import RetryLater, RetryPolicy, RetryScheduler
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def test_policy_delays_are_capped_exponential_backoff():
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=5.0)
+    for attempt, ceiling in enumerate([1.0, 2.0, 4.0, 5.0, 5.0]):
+        assert all(0 <= policy.delay(attempt) <= ceiling for _ in range(200))
+
+
+def test_retries_run_in_order_of_their_delay(executor):
+    retried = []
+    lock = threading.Lock()
+
+    def task(name, delay, attempt):
+        if attempt == 0:
+            raise RetryLater("busy", delay=delay)
+        with lock:
+            retried.append(name)
+        return name
+
+    done = []
+    scheduler = RetryScheduler(executor, RetryPolicy(max_attempts=2), on_done=done.append)
+    for name, delay in [("slow", 0.3), ("fast", 0.05), ("medium", 0.15)]:
+        scheduler.submit(task, name, delay)
+    scheduler.join()
+
+    assert retried == ["fast", "medium", "slow"]
+    assert sorted(done) == ["fast", "medium", "slow"]
+
+
+def test_attempts_are_exhausted_unless_the_retry_does_not_consume_one(executor):
+    attempts = {"flaky": [], "throttled": []}
+
+    def flaky(attempt):
+        attempts["flaky"].append(attempt)
+        raise RetryLater("server error", delay=0)
+
+    def throttled(attempt):
+        attempts["throttled"].append(attempt)
+        if len(attempts["throttled"]) < 4:
+            raise RetryLater("circuit open", delay=0, consume_attempt=False)
+        return "downloaded"
+
+    done = []
+    scheduler = RetryScheduler(executor, RetryPolicy(max_attempts=3, base_delay=0), on_done=done.append)
+    scheduler.submit(flaky)
+    scheduler.submit(throttled)
+    scheduler.join()
+
+    assert attempts == {"flaky": [0, 1, 2], "throttled": [0, 0, 0, 0]}
+    # Each task is reported once, a given-up one with None
+    assert sorted(done, key=str) == [None, "downloaded"]
+
+
+def test_join_waits_for_pending_retries_and_failures(executor):
+    errors, done = [], []
+
+    def task(attempt):
+        if attempt == 0:
+            raise RetryLater("later", delay=0.2)
+        raise ValueError("broken")
+
+    scheduler = RetryScheduler(executor, RetryPolicy(max_attempts=2), on_done=done.append, on_error=errors.append)
+    scheduler.submit(task)
+    started = time.monotonic()
+    scheduler.join()
+
+    assert time.monotonic() - started >= 0.2
+    assert done == [None]
+    assert [str(e) for e in errors] == ["broken"]
+    # join() also stops the thread that releases delayed retries
+    scheduler._timer.join(timeout=1)
+    assert not scheduler._timer.is_alive()
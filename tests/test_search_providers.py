@@ -0,0 +1,33 @@
+from link_filter import LinkFilter
+from search_providers import FixtureSearchProvider, query_slug
+
+QUERY = "mental health guidelines"
+RESULT_PAGE = """<html><body>
+<a href="/url?q=https://www.who.int/docs/guide.pdf&amp;sa=U&amp;ved=0">WHO</a>
+<a href="https://example.ac.uk/papers/study.pdf">Study</a>
+<a href="/search?q=mental+health+filetype:pdf&amp;start=10">Next page</a>
+<a href="https://maps.google.com/">Maps</a>
+</body></html>"""
+
+
+def fixtures(tmp_path):
+    (tmp_path / "results").mkdir()
+    (tmp_path / "results" / f"{query_slug(QUERY)}.html").write_text(RESULT_PAGE, encoding="utf-8")
+    return tmp_path
+
+
+def test_recorded_redirects_reach_the_filter_like_live_links(tmp_path):
+    provider = FixtureSearchProvider(fixtures(tmp_path), serve=False)
+    kept, rejected = LinkFilter(blocked_domains=["google.com"]).filter(provider.search(QUERY))
+    assert kept == ["https://www.who.int/docs/guide.pdf", "https://example.ac.uk/papers/study.pdf"]
+    assert [url for url, _ in rejected] == ["https://www.google.com/search?q=mental+health+filetype:pdf&start=10"]
+
+
+def test_served_links_point_at_the_resolved_pdfs(tmp_path):
+    provider = FixtureSearchProvider(fixtures(tmp_path))
+    try:
+        base = provider.server.base_url
+        kept, _ = LinkFilter(blocked_domains=["google.com"]).filter(provider.search(QUERY))
+        assert kept == [f"{base}/www.who.int/docs/guide.pdf", f"{base}/example.ac.uk/papers/study.pdf"]
+    finally:
+        provider.server.httpd.server_close()
@@ -0,0 +1,100 @@
+import json
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+
+def write_pdf(path: Path, pages: int) -> None:
+    """A minimal PDF with one paragraph of text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        stream = f"BT /F1 12 Tf 50 750 Td (The paragraph of page {page + 1} has a few words in it.) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(out)
+
+
+def cleaned(output_dir: Path):
+    documents = {}
+    for path in sorted(output_dir.glob("*.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        documents[path.name] = (records[0]["total_pages"],
+                                [(r["page_number"], r["text"]) for r in records[1:]])
+    return documents
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    input_dir = tmp_path / "downloads"
+    input_dir.mkdir()
+    for name, pages in [("short.pdf", 1), ("medium.pdf", 5), ("long.pdf", 12)]:
+        write_pdf(input_dir / name, pages)
+    (input_dir / "broken.pdf").write_bytes(b"not a pdf")
+    return input_dir
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="checks the workers' calls by forking")
+def test_pool_matches_sequential_cleaning(cleaner, monkeypatch, pdfs, tmp_path):
+    from tqdm import tqdm
+    monkeypatch.setattr(cleaner, "tqdm", tqdm)
+    # Forked workers record their calls in their own copy of the list
+    opened_here = []
+    open_document = cleaner.open_document
+
+    def spy(pdf_path, extractor):
+        opened_here.append(pdf_path)
+        return open_document(pdf_path, extractor)
+
+    monkeypatch.setattr(cleaner, "open_document", spy)
+    cleaner.process_directory(pdfs, tmp_path / "pool", workers=2, pages_per_task=4, extractor_name="pypdf2")
+    # Pages are counted by the workers, so a PDF crashing the parser can't take this process down
+    assert opened_here == []
+    cleaner.process_directory(pdfs, tmp_path / "sequential", workers=1, extractor_name="pypdf2")
+
+    documents = cleaned(tmp_path / "pool")
+    assert documents == cleaned(tmp_path / "sequential")
+    assert {name: (pages, [page for page, _ in paragraphs]) for name, (pages, paragraphs) in documents.items()} == {
+        "short.pdf.jsonl": (1, [1]),
+        "medium.pdf.jsonl": (5, list(range(1, 6))),
+        "long.pdf.jsonl": (12, list(range(1, 13))),
+    }
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_manifest_records_the_fallback_extractor(cleaner, monkeypatch, pdfs, tmp_path, workers):
+    if workers > 1 and multiprocessing.get_start_method() != "fork":
+        pytest.skip("the workers inherit the failing backend by forking")
+    from pdf_extractors import EXTRACTORS
+    from tqdm import tqdm
+    monkeypatch.setattr(cleaner, "tqdm", tqdm)
+
+    def unparseable(self, pdf_path):
+        raise ValueError("unsupported PDF")
+
+    monkeypatch.setattr(EXTRACTORS["pdfium"], "open", unparseable)
+    output_dir = tmp_path / "cleaned"
+    cleaner.process_directory(pdfs, output_dir, workers=workers, pages_per_task=4, extractor_name="pdfium")
+
+    entries = json.loads((output_dir / cleaner.MANIFEST_NAME).read_text(encoding="utf-8"))["files"]
+    assert {Path(source).name: (entry["extractor"], entry["requested_extractor"]) for source, entry in entries.items()} == {
+        name: ("pypdf2", "pdfium") for name in ("short.pdf", "medium.pdf", "long.pdf")
+    }
+    # Requesting the same backend again finds them current rather than re-cleaning every run
+    manifest = cleaner.CleaningManifest(output_dir / cleaner.MANIFEST_NAME, "jsonl", "pdfium")
+    assert all(manifest.is_current(Path(source)) for source in entries)
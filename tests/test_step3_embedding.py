@@ -0,0 +1,135 @@
+"""Step 3 re-runs: after Step 2 re-shards a document, after an interruption and after failed batches."""
+import hashlib
+import json
+import re
+from functools import partial
+from pathlib import Path
+
+import chromadb
+import numpy as np
+import pytest
+from tqdm import tqdm
+
+PAGES = 6
+PARAGRAPHS_PER_PAGE = 4
+BATCH_SIZE = 4  # Divides a document's paragraphs, so no batch spans two documents
+DIMENSION = 32
+
+
+class CountingEmbedder:
+    """Deterministic bag-of-words vectors; counts the texts it embeds, and fails on `fail(text)`."""
+
+    def __init__(self, fail=None):
+        self.embedded = 0
+        self.fail = fail
+
+    def embed_documents(self, texts):
+        if self.fail:
+            for text in texts:
+                self.fail(text)
+        self.embedded += len(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.zeros(DIMENSION, dtype=np.float32)
+        for word in re.findall(r'\w+', text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % DIMENSION] += 1
+        return (vector / max(np.linalg.norm(vector), 1e-9)).tolist()
+
+
+def write_document(cleaner, output_dir: Path, name: str, max_pages_per_shard=None):
+    """Write a cleaned document with Step 2's writer, replacing its previous shards."""
+    for old in output_dir.glob(f"{name}*.jsonl"):
+        old.unlink()
+    writer = cleaner.DocumentWriter(output_dir / "missing" / name, output_dir, total_pages=PAGES,
+                                    max_pages_per_shard=max_pages_per_shard)
+    for page in range(PAGES):
+        for position in range(PARAGRAPHS_PER_PAGE):
+            text = f"{name} page {page} paragraph {position} about sleep stress and coping strategies"
+            writer.write(cleaner.Paragraph(text, page, position, len(text.split()), name))
+    return writer.close()
+
+
+def index(embedder, monkeypatch, cleaned: Path, chroma_dir: Path, workers: int, fail=None):
+    """Run Step 3 on `cleaned` into `chroma_dir`; returns ({id: document_file}, texts embedded)."""
+    model = CountingEmbedder(fail)
+    monkeypatch.setattr(embedder, "load_embedder", lambda spec, cache=None: model)
+    monkeypatch.setattr(embedder, "tqdm", tqdm)
+    monkeypatch.setattr(embedder, "CLEANED_PDFS_DIR", cleaned)
+    monkeypatch.setattr(embedder, "CHROMA_DB_DIR", chroma_dir)
+    monkeypatch.setattr(embedder, "INDEX_MANIFEST_FILE", chroma_dir / "index_manifest.json")
+    monkeypatch.setattr(embedder, "EMBEDDING_CACHE_PATH", chroma_dir.parent / "embedding_cache.sqlite3")
+    monkeypatch.setattr(embedder, "EMBEDDING_WORKERS", workers)
+    monkeypatch.setattr(embedder, "BATCH_SIZE", BATCH_SIZE)
+    monkeypatch.setattr(embedder, "CHUNK_SIZE", 0)
+    monkeypatch.setattr(embedder, "MIN_BATCH_SIZE", BATCH_SIZE)
+    monkeypatch.setattr(embedder, "MAX_BATCH_SIZE", BATCH_SIZE)
+    embedder.embed_all_paragraphs()
+    found = chromadb.PersistentClient(path=str(chroma_dir)).get_collection(embedder.COLLECTION_NAME) \
+        .get(include=['metadatas'])
+    return {i: metadata['document_file'] for i, metadata in zip(found['ids'], found['metadatas'])}, model.embedded
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_resharding_matches_a_fresh_index(cleaner, embedder, monkeypatch, tmp_path, workers):
+    cleaned = tmp_path / "cleaned"
+    write_document(cleaner, cleaned, "manual.pdf")
+    write_document(cleaner, cleaned, "other.pdf")
+    vectors, embedded = index(embedder, monkeypatch, cleaned, tmp_path / "chroma", workers)
+    assert len(vectors) == embedded == 2 * PAGES * PARAGRAPHS_PER_PAGE
+
+    # One shard -> 3-page shards -> 2-page shards, which moves pages from part001 to part002
+    for step, pages_per_shard in enumerate([3, 2]):
+        shards = write_document(cleaner, cleaned, "manual.pdf", max_pages_per_shard=pages_per_shard)
+        assert len(shards) == PAGES // pages_per_shard
+
+        vectors, embedded = index(embedder, monkeypatch, cleaned, tmp_path / "chroma", workers)
+        fresh, _ = index(embedder, monkeypatch, cleaned, tmp_path / f"fresh{step}", workers)
+        # Same paragraphs, so nothing is embedded again; every vector moved to its new shard
+        assert embedded == 0
+        assert vectors == fresh
+
+
+def recorded(chroma_dir: Path):
+    with open(chroma_dir / "index_manifest.json", encoding='utf-8') as f:
+        return set(json.load(f)['documents'])
+
+
+def fail_on(document: str, error):
+    def fail(text):
+        if text.startswith(document):
+            raise error
+    return fail
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_interrupted_run_keeps_finished_documents(cleaner, embedder, monkeypatch, tmp_path, workers):
+    cleaned = tmp_path / "cleaned"
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        write_document(cleaner, cleaned, name)
+    chroma_dir = tmp_path / "chroma"
+    with pytest.raises(KeyboardInterrupt):
+        index(embedder, monkeypatch, cleaned, chroma_dir, workers, fail_on("c.pdf", KeyboardInterrupt()))
+    assert recorded(chroma_dir) == {"a.pdf.jsonl", "b.pdf.jsonl"}
+
+    # Only the unfinished document is embedded again
+    vectors, embedded = index(embedder, monkeypatch, cleaned, chroma_dir, workers)
+    assert embedded <= PAGES * PARAGRAPHS_PER_PAGE
+    assert vectors == index(embedder, monkeypatch, cleaned, tmp_path / "fresh", workers)[0]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_failed_batch_holds_back_only_its_document(cleaner, embedder, monkeypatch, tmp_path, workers):
+    cleaned = tmp_path / "cleaned"
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        write_document(cleaner, cleaned, name)
+    chroma_dir = tmp_path / "chroma"
+    monkeypatch.setattr(embedder, "EmbeddingPipeline", partial(embedder.EmbeddingPipeline, retry_delay=0))
+    index(embedder, monkeypatch, cleaned, chroma_dir, workers, fail_on("b.pdf", ValueError("model error")))
+    assert "b.pdf.jsonl" not in recorded(chroma_dir)
+    assert {"a.pdf.jsonl", "c.pdf.jsonl"} <= recorded(chroma_dir)
+
+    vectors, embedded = index(embedder, monkeypatch, cleaned, chroma_dir, workers)
+    assert 0 < embedded <= PAGES * PARAGRAPHS_PER_PAGE
+    assert recorded(chroma_dir) == {"a.pdf.jsonl", "b.pdf.jsonl", "c.pdf.jsonl"}
+    assert vectors == index(embedder, monkeypatch, cleaned, tmp_path / "fresh", workers)[0]
@@ -8,16 +8,53 @@ import os
 from datetime import datetime
 from pathlib import Path
 
+# Helpers shared with the indexing scripts live at the repository root (on the path via settings.py)
+from embedding_cache import EmbeddingCache
+from embedding_models import (COLLECTION_MODEL_KEY, EMBEDDING_MODEL, load_embedder, normalize_spec,
+                              recorded_model)
+from hnsw_settings import check_collection, hnsw_metadata
+from index_manifest import MANIFEST_NAME
+
+# Chat model, configured independently of the embedding model (see embedding_models.py)
+CHAT_MODEL = os.environ.get("CHAT_MODEL", 'mistral-nemo:12b-instruct-2407-q2_K')
+# Query the quantized index built by compact_index.py, when it is current, instead of
+# loading Chroma's full-precision HNSW index into memory ("off" to disable, and to not
+# import compact_index and numpy at all)
+USE_COMPACT_INDEX = os.environ.get("COMPACT_INDEX", "auto") != "off"
+
+
+def file_mtime(path: Path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
 class TherapistBot:
     def __init__(self, chroma_db_path: str):
         # Initialize Chroma client with persistence
         self.client = chromadb.PersistentClient(path=chroma_db_path)
         
         # Get or create the collection for mental health documents
-        self.collection = self.client.get_or_create_collection(
-            name="pdf_paragraphs",
-            metadata={"hnsw:space": "cosine"}
-        )
+        embedding_model = recorded_model(self.client, "pdf_paragraphs")
+        if embedding_model is None:
+            embedding_model = normalize_spec(EMBEDDING_MODEL)
+            self.collection = self.client.get_or_create_collection(
+                name="pdf_paragraphs",
+                metadata={**hnsw_metadata(), COLLECTION_MODEL_KEY: embedding_model}
+            )
+        else:
+            self.collection = self.client.get_collection(name="pdf_paragraphs")
+            check_collection(self.collection)
+        
+        # Queries are embedded with the model the collection was built with; repeated
+        # queries (e.g. the topic openers) come from the shared cache
+        self.embedding_cache = EmbeddingCache()
+        self.embedder = load_embedder(embedding_model, self.embedding_cache)
+        self.embedding_model = embedding_model
+        self.chroma_db_path = Path(chroma_db_path)
+        self.compact_index = None
+        self._compact_index_signature = None
+        self.refresh_compact_index()
         
         # Initialize conversation memory
         self.conversation_history = []
@@ -44,19 +81,40 @@ class TherapistBot:
         
         Remember: This is a demo session. Be concise and focused."""
         
+    def refresh_compact_index(self):
+        """
+        (Re)load the compact index when Step 3 saved its index manifest or compact_index.py
+        rebuilt the index since the last check; two stat calls per query otherwise.
+        """
+        if not USE_COMPACT_INDEX:
+            return
+        from compact_index import COMPACT_INDEX_DIR, load_if_current
+        directory = self.chroma_db_path / COMPACT_INDEX_DIR
+        signature = (file_mtime(self.chroma_db_path / MANIFEST_NAME), file_mtime(directory / "meta.json"))
+        if signature == self._compact_index_signature:
+            return
+        # Compared with the collection signature recorded in meta.json, without reading every id;
+        # a stale index is dropped, and Chroma answers until compact_index.py rebuilds it
+        self.compact_index = load_if_current(directory, self.collection, self.embedding_model)
+        self._compact_index_signature = signature
+
     def get_embedding(self, text: str) -> List[float]:
-        """Get embeddings using Ollama's Mistral model."""
-        response = ollama.embeddings(
-            model='mistral-nemo:12b-instruct-2407-q2_K',
-            prompt=text
-        )
-        return response['embedding']
+        """Get embeddings from the collection's embedding model, cached on disk."""
+        return self.embedder.embed_query(text)
         
     def get_relevant_context(self, query: str, n_results: int = 2) -> str:
         """Retrieve relevant information from the knowledge base."""
         # Get embedding for the query
         query_embedding = self.get_embedding(query)
         
+        self.refresh_compact_index()
+        if self.compact_index is not None:
+            # Closest ids from the compact index; only their text is read from Chroma
+            ids = [i for i, _ in self.compact_index.search(query_embedding, n_results)]
+            found = self.collection.get(ids=ids, include=['documents'])
+            documents = dict(zip(found['ids'], found['documents']))
+            return "\n".join(documents[i] for i in ids if i in documents)
+        
         # Query the collection
         results = self.collection.query(
             query_embeddings=[query_embedding],
@@ -109,7 +167,7 @@ Advice given: {', '.join(self.given_advice)}
 """
         try:
             response = ollama.generate(
-                model='mistral-nemo:12b-instruct-2407-q2_K',
+                model=CHAT_MODEL,
                 prompt=prompt,
             )
             return response['response'].strip()
@@ -130,7 +188,7 @@ Advice given: {', '.join(self.given_advice)}
         # Generate response
         prompt = self.generate_response(user_input)
         response = ollama.generate(
-            model='mistral-nemo:12b-instruct-2407-q2_K',
+            model=CHAT_MODEL,
             prompt=prompt,
         )
         response_text = response['response']